@@ -0,0 +1,103 @@
+#WORD LISTS WITH STEM AND ENDING PATTERNS
+#Matches words against a set of patterns in time proportional to the length of the word,
+#whatever the number of patterns, e.g. for exceptions to a rule which must also cover the
+#inflected forms of the exceptional words:
+#   exceptions = AffixTrie(['tɛn', 'jɛdn-', '-fɔːn'])
+#   'jɛdnɔm' in exceptions
+#A pattern is a whole word ('tɛn'), a stem followed by any ending ('jɛdn-'), or an ending
+#preceded by anything ('-fɔːn'). Patterns are held in two tries of nested dictionaries,
+#one for the stems and whole words, read from the start of the word, and one for the
+#endings, read backwards from its end. A trie cannot be changed once built, as it may be
+#part of the key of cached transcriptions (see word_cache.py).
+
+import hashlib
+
+#Keys marking the end of a pattern in a trie node (integers, so never a character)
+_WORD = 0
+_STEM = 1
+
+
+class AffixTrie:
+    """Set of word patterns (see above)"""
+
+    def __init__(self, patterns=()):
+        self._prefixes = {}
+        self._suffixes = {}
+        self.patterns = tuple(patterns)
+        for pattern in self.patterns:
+            self._add(pattern)
+
+
+    @classmethod
+    def from_file(cls, path, convert=None):
+        """Reads the patterns of a text file, one per line, ignoring blank lines and
+        comments starting with '#'; each pattern is passed through convert if given"""
+        patterns = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                pattern = line.split('#', 1)[0].strip()
+                if pattern:
+                    patterns.append(convert(pattern) if convert is not None else pattern)
+        return cls(patterns)
+
+
+    def _add(self, pattern):
+        """Adds a pattern to the tries"""
+        any_start = pattern.startswith('-')
+        any_end = pattern.endswith('-') and len(pattern) > 1
+        core = pattern[int(any_start):len(pattern) - int(any_end)]
+        if not core or (any_start and any_end):
+            raise ValueError(f'Invalid word pattern "{pattern}"')
+        if any_start:
+            trie, chars, end = self._suffixes, reversed(core), _STEM
+        else:
+            trie, chars, end = self._prefixes, core, _STEM if any_end else _WORD
+        node = trie
+        for ch in chars:
+            node = node.setdefault(ch, {})
+        node[end] = True
+
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+    def __repr__(self):
+        return f'AffixTrie({len(self.patterns)} patterns, checksum={self.checksum()!r})'
+
+
+    def __eq__(self, other):
+        return isinstance(other, AffixTrie) and sorted(self.patterns) == sorted(other.patterns)
+
+
+    def __hash__(self):
+        return hash(frozenset(self.patterns))
+
+
+    def checksum(self):
+        """Returns a hash of the patterns, which identifies the trie across runs"""
+        return hashlib.sha256('\n'.join(sorted(self.patterns)).encode('utf-8')).hexdigest()[:16]
+
+
+    def __contains__(self, word):
+        #Stems and whole words
+        node = self._prefixes
+        for ch in word:
+            if _STEM in node:
+                return True
+            node = node.get(ch)
+            if node is None:
+                break
+        else:
+            if _WORD in node or _STEM in node:
+                return True
+
+        #Endings
+        node = self._suffixes
+        for ch in reversed(word):
+            node = node.get(ch)
+            if node is None:
+                break
+            if _STEM in node:
+                return True
+        return False
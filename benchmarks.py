@@ -0,0 +1,830 @@
+#BENCHMARKS FOR THE TRANSCRIPTION PIPELINES
+#Run from the repository root, e.g.:
+#   python benchmarks.py cz_voice_assim
+#   python benchmarks.py cz_voice_assim --sizes 1000 100000
+#Running without arguments runs every benchmark with its default sizes
+
+import argparse
+import inspect
+import time
+
+#Sample texts used to build inputs of arbitrary length
+samples = {'be':'Паўночны вецер і сонца спрачаліся, хто з іх дужэйшы, калі ўбачылі падарожніка, які ішоў, захутаўшыся ў цёплы плашч. Яны дамовіліся, што той, хто першы прымусіць падарожніка зняць плашч, будзе лічыцца мацнейшым. Зблізку здаўся дождж, і ўсе сцежкі ў лесе прамоклі.',
+           'bg':'Северният вятър и слънцето спорели кой от двамата е по-силен, когато покрай тях минал пътник, облечен в топло палто. Те се съгласили, че който пръв накара пътника да съблече палтото си, ще бъде смятан за по-силен. Вятърът задухал с всичка сила, но колкото повече духал, толкова по-плътно пътникът се загръщал с палтото си.',
+           'cz':'Severák a Slunce se přeli, kdo z nich je silnější. Právě šel kolem poutník, zahalený v plášti. Shodli se, že ten, kdo první přinutí poutníka svléknout plášť, bude považován za silnějšího. Vždy když foukal, zachumlal se poutník ještě víc do svého pláště.',
+           'es':'El viento del norte y el sol discutían sobre cuál de ellos era el más fuerte, cuando acertó a pasar un viajero envuelto en una capa. Convinieron en que quien antes lograra obligar al viajero a quitarse la capa sería considerado más poderoso.',
+           'gr':'Ο βοριάς και ο ήλιος μάλωναν για το ποιος από τους δυο είναι ο δυνατότερος, όταν έτυχε να περάσει από μπροστά τους ένας ταξιδιώτης που φορούσε κάπα. Όταν τον είδαν, ο βοριάς και ο ήλιος συμφώνησαν ότι όποιος έκανε τον ταξιδιώτη να βγάλει την κάπα του θα θεωρούνταν ο πιο δυνατός.',
+           'sr':'Северни ветар и Сунце су се препирали ко је од њих јачи, када је наишао путник умотан у топао огртач. Договорили су се да ће онај ко први натера путника да скине огртач бити сматран јачим од другог. ВЕСТИ: Влада Србије је данас усвојила нови закон о заштити животне средине.\nЉубав, жеља и ђак џепарац чешће него што се мисли.',
+           'pl':'Północny wiatr i słońce spierali się o to, które z nich jest silniejsze. Właśnie przechodził drogą wędrowiec owinięty w ciepły płaszcz. Uzgodnili, że ten, kto pierwszy zmusi wędrowca do zdjęcia płaszcza, będzie uznany za silniejszego. Wtedy wiatr zaczął dąć z całej siły, ale im mocniej dął, tym szczelniej wędrowiec otulał się płaszczem.'}
+
+
+def repeat_to_size(text, size):
+    """Repeats a sample text (separated by spaces) until it reaches the given number of characters"""
+    reps = size // (len(text) + 1) + 1
+    return ' '.join([text] * reps)[:size]
+
+
+def timed(function, *args, **kwargs):
+    """Calls function(*args, **kwargs) and returns the elapsed wall time in seconds"""
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def report(label, size, seconds):
+    """Prints one line of benchmark output: input size, time and throughput"""
+    throughput = size / seconds / 1e6 if seconds > 0 else float('inf')
+    print(f'{label:<28} {size:>12,} chars {seconds:>10.4f} s {throughput:>8.2f} MB/s')
+
+
+#Reference implementation of Belarusian obstruent assimilation before the linear-time
+#version, inserting palatalization marks into a list of the whole text
+def reference_be_obstruent_assimilation(text):
+    from transcribe_belarusian import be_devoicing_dict, be_obstruents, be_voicing_dict
+    text = list(text)
+    for i in range(len(text)-1,-1,-1):
+        ch = text[i]
+        if ch in be_obstruents:
+            try:
+                if text[i+1] != 'ʲ':
+                    j = i+1
+                else:
+                    j = i+2
+                nxt = text[j]
+                if nxt in be_obstruents:
+                    if nxt != 'v':
+                        if nxt in be_devoicing_dict.keys():
+                            text[i] = be_voicing_dict.get(ch, ch)
+                        else:
+                            text[i] = be_devoicing_dict.get(ch, ch)
+                    try:
+                        if text[j+1] == 'ʲ' and j == i+1 and ch not in ['ʂ', 'ʐ', 'ʧ', 'ʤ']:
+                            text.insert(j, 'ʲ')
+                    except IndexError:
+                        pass
+            except IndexError:
+                pass
+    return ''.join(text)
+
+
+def bench_be_obstruent_assim(sizes=(100_000, 1_000_000, 10_000_000), reference_max=1_000_000):
+    """Belarusian obstruent assimilation on inputs up to 10 MB, compared with the reference
+    implementation (up to reference_max characters) for speed; throughput should stay roughly
+    flat as the input grows (tests/test_belarusian.py checks that both give identical output)"""
+    from transcribe_belarusian import (be2ipa, be_palatalization, be_stress, be_vowel_reduction,
+                                       adjust_soft_vowels, be_final_devoicing, be_obstruent_assimilation)
+    
+    #Obstruent assimilation runs on the output of the first six pipeline steps
+    sample = be_final_devoicing(adjust_soft_vowels(be_vowel_reduction(be_stress(be_palatalization(be2ipa(samples['be']))))))
+    for size in sizes:
+        text = repeat_to_size(sample, size)
+        linear = timed(be_obstruent_assimilation, text)
+        if size <= reference_max:
+            report('reference', size, timed(reference_be_obstruent_assimilation, text))
+        report('be_obstruent_assimilation', size, linear)
+
+
+#Reference implementation of Bulgarian voicing assimilation before the streaming version,
+#prepending each assimilated word to the list of words assimilated so far
+def reference_bg_voicing_assimilation(text):
+    from transcribe_bulgarian import bg_devoicing_dict, bg_obstruents, bg_voiced_obstruents
+    words = text.split()
+    tr = []
+    for j in range(len(words)-1,-1,-1):
+        word = words[j]
+        word_tr = list(word)
+        for i in range(len(word_tr)-1,-1,-1):
+            ch = word_tr[i]
+            if ch in bg_obstruents:
+                if i+1 < len(word_tr):
+                    nxt_ch = word_tr[i+1]
+                elif j+1 < len(words):
+                    nxt_ch = words[j+1][0]
+                else:
+                    word_tr[i] = bg_devoicing_dict.get(ch, ch) if word != 'v' else 'v'
+                    continue
+                if nxt_ch in bg_obstruents and nxt_ch != 'v' and nxt_ch not in bg_voiced_obstruents:
+                    word_tr[i] = bg_devoicing_dict.get(ch, ch)
+        tr.insert(0, ''.join(word_tr))
+    return ' '.join(tr)
+
+
+def bg_voicing_assim_input(size):
+    """Input of Bulgarian voicing assimilation (the output of the first two pipeline steps)
+    of about size characters"""
+    from transcribe_bulgarian import bg2ipa, bg_vowel_reduction
+    return repeat_to_size(bg_vowel_reduction(bg2ipa(samples['bg'])), size)
+
+
+def bench_bg_voicing_assim(sizes=(100_000, 1_000_000, 10_000_000), reference_max=1_000_000):
+    """Bulgarian voicing assimilation on inputs up to 10 MB, compared with the reference
+    implementation (up to reference_max characters) for speed, and peak memory of the
+    streaming version on a stream of as many words (tests/test_bulgarian.py checks that
+    both give identical output)"""
+    import itertools
+    import tracemalloc
+    from transcribe_bulgarian import bg_voicing_assimilation, iter_bg_voicing_assimilation
+    for size in sizes:
+        text = bg_voicing_assim_input(size)
+        if size <= reference_max:
+            report('reference', size, timed(reference_bg_voicing_assimilation, text))
+        report('bg_voicing_assimilation', size, timed(bg_voicing_assimilation, text))
+        
+        #Stream of words generated on the fly, each consumed as soon as it is yielded
+        words = bg_voicing_assim_input(10_000).split()
+        n_words = len(text.split())
+        tracemalloc.start()
+        for word in iter_bg_voicing_assimilation(itertools.islice(itertools.cycle(words), n_words)):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{"streaming peak memory":<28} {n_words:>12,} words {peak / 2**10:>10.1f} KB')
+
+
+def bench_context_rules(sizes=(100_000, 1_000_000, 7_000_000), text_size=70):
+    """Slovak voicing assimilation on a batch of texts of about text_size characters each
+    (7 MB being about a million words), by sk_voice_assim on each text and by its context rules
+    with the pure-Python and (if installed) NumPy backends (tests/test_context_rules.py checks that all
+    give identical output)"""
+    from context_rules import _numpy, apply_rules_batch
+    from transcribe_slovak import sk_g2p, palatalize_sk, final_devoicing, sk_voice_assim, sk_voice_assim_rules
+    
+    #Voicing assimilation runs on the output of the first three pipeline steps
+    sample = final_devoicing(palatalize_sk(sk_g2p(samples['cz'])))
+    backends = ['python', 'numpy'] if _numpy() is not None else ['python']
+    for size in sizes:
+        text = repeat_to_size(sample, size)
+        texts = [' '.join(text[i:i+text_size].split()) for i in range(0, size, text_size)]
+        print(f'{"batch":<28} {len(texts):>12,} texts {len(text.split()):>10,} words')
+        start = time.perf_counter()
+        [sk_voice_assim(text) for text in texts]
+        report('sk_voice_assim', size, time.perf_counter() - start)
+        for backend in backends:
+            start = time.perf_counter()
+            apply_rules_batch(texts, sk_voice_assim_rules, backend=backend)
+            report(f'context rules ({backend})', size, time.perf_counter() - start)
+
+
+#Reference implementation of Czech voicing assimilation before the linear-time version,
+#inserting each segment at the start of the list of the segments which follow it
+def reference_cz_voice_assim(text):
+    from transcribe_czech import cz_devoicing_dict, cz_obstruents, cz_voiceless, cz_voicing_dict
+    tr = []
+    for i in range(len(text)-1,-1,-1):
+        ch = text[i]
+        if ch in cz_obstruents and tr:
+            nxt = tr[0]
+            if (ch, nxt) == ('s', 'ɦ'):
+                tr[0] = 'x'
+            elif nxt in cz_obstruents and nxt not in ['v', 'ř']:
+                if nxt in cz_voiceless:
+                    ch = cz_devoicing_dict.get(ch, ch)
+                else:
+                    ch = cz_voicing_dict.get(ch, ch)
+        tr.insert(0, ch)
+    new_tr = tr[:1]
+    for i in range(1, len(tr)):
+        if tr[i] == 'ř' and tr[i-1] in cz_voiceless:
+            new_tr.append(cz_devoicing_dict['ř'])
+        else:
+            new_tr.append(tr[i])
+    return ''.join(new_tr)
+
+
+def bench_cz_voice_assim(sizes=(1_000, 10_000, 100_000, 1_000_000, 10_000_000, 50_000_000), reference_max=100_000):
+    """Czech voicing assimilation on inputs from 1 KB to 50 MB, compared with the reference
+    implementation (up to reference_max characters); throughput should stay roughly flat
+    as the input grows"""
+    from transcribe_czech import cz_g2p, palatalize_cz, final_devoicing, cz_voice_assim
+
+    #Voicing assimilation runs on the output of the first three pipeline steps
+    sample = final_devoicing(palatalize_cz(cz_g2p(samples['cz'])))
+    for size in sizes:
+        text = repeat_to_size(sample, size)
+        if size <= reference_max:
+            report('reference', size, timed(reference_cz_voice_assim, text))
+        report('cz_voice_assim', size, timed(cz_voice_assim, text))
+
+
+#Reference exception lookup before the affix trie, scanning a list of patterns for each word
+def reference_sk_exception(word, patterns):
+    for pattern in patterns:
+        if pattern.startswith('-'):
+            if word.endswith(pattern[1:]):
+                return True
+        elif pattern.endswith('-'):
+            if word.startswith(pattern[:-1]):
+                return True
+        elif word == pattern:
+            return True
+    return False
+
+
+def bench_sk_exceptions(sizes=(10_000, 100_000, 1_000_000, 10_000_000), patterns=5_000, reference_max=10_000):
+    """Slovak palatalization exception lookups for every word of the text, with thousands of
+    patterns, in an AffixTrie versus a linear scan of the patterns (tests/test_slovak.py checks
+    that both give identical results)"""
+    import random
+    from affix_trie import AffixTrie
+    from transcribe_slovak import sk_g2p
+    rng = random.Random(0)
+    letters = 'abdeiklmnoprstuvz'
+    words = set()
+    while len(words) < patterns:
+        words.add(''.join(rng.choice(letters) for i in range(rng.randint(3, 9))))
+    pattern_list = [[word, word + '-', '-' + word][i % 3] for i, word in enumerate(sorted(words))]
+    exceptions = AffixTrie(pattern_list)
+    sample = sk_g2p('Severný vietor a slnko sa hádali, kto z nich je silnejší. Vtom išiel okolo pocestný zahalený do teplého plášťa.')
+    for size in sizes:
+        text = repeat_to_size(sample, size).split()
+        report('AffixTrie', size, timed(lambda: [word in exceptions for word in text]))
+        if size <= reference_max:
+            report('linear scan (reference)', size, timed(lambda: [reference_sk_exception(word, pattern_list) for word in text]))
+
+
+def bench_transcribe_pl_fast(sizes=(10_000, 100_000, 1_000_000)):
+    """Staged transcribe_pl versus the single-pass transcribe_pl_fast
+    (tests/test_polish.py checks that both give identical output)"""
+    from transcribe_polish import transcribe_pl, transcribe_pl_fast
+    for size in sizes:
+        text = repeat_to_size(samples['pl'], size)
+        staged = timed(transcribe_pl, text)
+        fast = timed(transcribe_pl_fast, text)
+        report('transcribe_pl', size, staged)
+        report('transcribe_pl_fast', size, fast)
+        print(f'{"speedup":<28} {staged / fast:>12.1f}x')
+
+
+def bench_transcribe_stream(sizes=(100_000, 1_000_000, 10_000_000), lang='cz', trace_max=1_000_000):
+    """transcribe_stream on a file of sample lines, with the peak memory allocated while
+    streaming (traced up to trace_max characters, as tracing is slow), which should stay
+    about the same as the file grows (tests/test_languages.py checks the output against
+    the whole-string function on each line)"""
+    import os
+    import tempfile
+    import tracemalloc
+    from languages import transcribe_stream
+
+    def stream(path):
+        with open(path, encoding='utf-8') as f:
+            for tr in transcribe_stream(lang, f):
+                pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'corpus.txt')
+        for size in sizes:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(repeat_to_size(samples[lang] + '\n', size))
+            report('transcribe_stream', size, timed(stream, path))
+            if size <= trace_max:
+                tracemalloc.start()
+                stream(path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f'{"peak memory":<28} {peak / 2**20:>12.2f} MB')
+
+
+def bench_word_cache(sizes=(10_000, 100_000, 1_000_000)):
+    """Uncached transcription versus TranscriptionCache for several languages
+    (tests/test_word_cache.py checks that both give identical output)"""
+    from languages import get_transcriber
+    from word_cache import TranscriptionCache
+    for lang in ['cz', 'es', 'gr', 'pl']:
+        function = get_transcriber(lang)
+        for size in sizes:
+            text = repeat_to_size(samples[lang], size)
+            cache = TranscriptionCache()
+            plain = timed(function, text)
+            cached = timed(cache.transcribe, lang, text)
+            warm = timed(cache.transcribe, lang, text)
+            report(f'transcribe_{lang}', size, plain)
+            report('cached (cold)', size, cached)
+            report('cached (warm)', size, warm)
+            print(f'{"hit rate":<28} {cache.stats()["hit_rate"]:>12.1%}')
+
+
+def bench_lexicon(sizes=(10_000, 100_000, 1_000_000), entries=200_000):
+    """Uncached transcription versus a compiled lexicon of the words of the sample text
+    (tests/test_lexicon.py checks that both give identical output), and the time taken
+    to open a lexicon of many entries"""
+    import os
+    import tempfile
+    from languages import get_transcriber
+    from lexicon import Lexicon, LexiconTranscriptionCache, build_lexicon
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'lexicon.lex')
+        for lang in ['cz', 'pl']:
+            function = get_transcriber(lang)
+            build_lexicon(lang, samples[lang].split(), path)
+            for size in sizes:
+                text = repeat_to_size(samples[lang], size)
+                cache = LexiconTranscriptionCache(path, max_entries=None)
+                plain = timed(function, text)
+                cold = timed(cache.transcribe, lang, text)
+                report(f'transcribe_{lang}', size, plain)
+                report('lexicon', size, cold)
+                cache.lexicon.close()
+
+        #Synthetic Slovak words, which transcribe quickly
+        words = [f'slovo{i}' for i in range(entries)]
+        start = time.perf_counter()
+        build_lexicon('sk', words, path)
+        print(f'{"build " + format(entries, ","):<28} {time.perf_counter() - start:>10.4f} s')
+        start = time.perf_counter()
+        lexicon = Lexicon(path)
+        print(f'{"open " + format(entries, ","):<28} {time.perf_counter() - start:>10.4f} s')
+        start = time.perf_counter()
+        for word in words[:100_000]:
+            lexicon.lookup(word)
+        print(f'{"100,000 lookups":<28} {time.perf_counter() - start:>10.4f} s')
+        lexicon.close()
+
+
+#Ukrainian sample text with stress marked, from which a stress lexicon is built
+uk_stressed = 'Півні́чний ві́тер дув з усіє́ї си́ли, а́ле чим ду́жче він дув, тим щильні́ше ку́тався мандрівни́к у своє́ пальто́.'
+
+
+def bench_stress_lexicon(sizes=(100_000, 1_000_000, 10_000_000)):
+    """Accentuation of unaccented Ukrainian text from a stress lexicon, in tokens per
+    second, and transcribe_uk with the lexicon (tests/test_stress_lexicon.py checks that it
+    gives the same output as the accented text)"""
+    import os
+    import tempfile
+    from stress_lexicon import StressLexicon, build_stress_lexicon, stress_mark
+    from transcribe_ukrainian import transcribe_uk
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stress.lex')
+        build_stress_lexicon(uk_stressed.replace(',', '').replace('.', '').split(), path)
+        lexicon = StressLexicon(path)
+        for size in sizes:
+            #Without the last word, which may be cut short
+            accented = repeat_to_size(uk_stressed, size).rsplit(' ', 1)[0]
+            text = accented.replace(stress_mark, '')
+            tokens = len(text.split())
+            seconds = timed(lexicon.accentuate, text)
+            report('accentuate', size, seconds)
+            print(f'{"tokens per second":<28} {tokens / seconds / 1e6:>12.2f} M')
+            if size <= 1_000_000:
+                report('transcribe_uk (lexicon)', size, timed(transcribe_uk, text, stress_lexicon=lexicon))
+        lexicon.close()
+
+
+def bench_persistent_cache(sizes=(10_000, 100_000, 1_000_000)):
+    """Uncached transcription versus PersistentTranscriptionCache with an empty file and
+    with the file left by a previous run (as by a nightly job) (tests/test_persistent_cache.py
+    checks that all give identical output)"""
+    import os
+    import tempfile
+    from languages import get_transcriber
+    from persistent_cache import PersistentTranscriptionCache
+    for lang in ['cz', 'es', 'gr', 'pl']:
+        function = get_transcriber(lang)
+        for size in sizes:
+            text = repeat_to_size(samples[lang], size)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'cache.sqlite')
+                plain = timed(function, text)
+                with PersistentTranscriptionCache(path) as cache:
+                    cold = timed(cache.transcribe, lang, text)
+                with PersistentTranscriptionCache(path) as cache:
+                    warm = timed(cache.transcribe, lang, text)
+                    disk_hit_rate = cache.stats()['disk_hit_rate']
+            report(f'transcribe_{lang}', size, plain)
+            report('persistent (empty file)', size, cold)
+            report('persistent (next run)', size, warm)
+            print(f'{"disk hit rate":<28} {disk_hit_rate:>12.1%}')
+
+
+def bench_transcribe_corpus(sizes=(100_000, 1_000_000)):
+    """Sequential transcribe_pl over the lines of a corpus versus transcribe_corpus
+    with a process pool (tests/test_corpus.py checks that both give identical output
+    in the same order)"""
+    from corpus import transcribe_corpus
+    from transcribe_polish import transcribe_pl
+    sentences = [sentence + '.' for sentence in samples['pl'].split('. ')]
+    for size in sizes:
+        lines = [sentences[i % len(sentences)] for i in range(size // 80)]
+        start = time.perf_counter()
+        sequential = [transcribe_pl(line) for line in lines]
+        report('transcribe_pl (lines)', size, time.perf_counter() - start)
+        stats = {}
+        start = time.perf_counter()
+        pooled = list(transcribe_corpus('pl', lines, stats=stats))
+        report('transcribe_corpus', size, time.perf_counter() - start)
+        for pid, worker in stats['workers'].items():
+            print(f'{"  worker " + str(pid):<28} {worker["chars"]:>12,} chars {worker["seconds"]:>10.4f} s {worker["chars_per_second"] / 1e6:>8.2f} MB/s')
+
+
+#Reference implementation of transcribe_es before the compiled SpanishTranscriber,
+#applying the dialect features with separate substitutions on every call
+def reference_transcribe_es(text, yeismo=True, distincion=True, ceceo=False):
+    import re
+    from transcribe_spanish import es2ipa, es_allophony, fix_y, mark_stress, voicing_assimilation
+    text = es2ipa(text)
+    if yeismo == True:
+        text = re.sub('ʎ', 'ʝ', text)
+    text = es_allophony(text)
+    text = re.sub('β', 'β̞', text)
+    text = re.sub('ð', 'ð̞', text)
+    text = re.sub('ɣ', 'ɣ̞', text)
+    text = fix_y(text)
+    text = mark_stress(text)
+    if distincion == False:
+        text = re.sub('θ', 's', text)
+    if ceceo == True:
+        text = re.sub('s', 's̄', text)
+        text = re.sub('θ', 's̄', text)
+    return voicing_assimilation(text)
+
+
+def bench_spanish_transcriber(sizes=(10_000, 100_000, 1_000_000)):
+    """Reference transcribe_es versus SpanishTranscriber for each dialect, over the sentences
+    of a text (tests/test_spanish.py checks that both give identical output, also when
+    shared between threads)"""
+    from transcribe_spanish import SpanishTranscriber
+    dialects = [dict(), dict(distincion=False), dict(ceceo=True), dict(yeismo=False)]
+    for size in sizes:
+        sentences = [sentence + '.' for sentence in repeat_to_size(samples['es'], size).split('. ')]
+        for dialect in dialects:
+            transcriber = SpanishTranscriber(**dialect)
+            reference = timed(lambda: [reference_transcribe_es(sentence, **dialect) for sentence in sentences])
+            compiled = timed(lambda: [transcriber(sentence) for sentence in sentences])
+            label = ', '.join(f'{key}={value}' for key, value in dialect.items()) or 'default'
+            report(f'reference ({label})', size, reference)
+            report(f'compiled ({label})', size, compiled)
+            print(f'{"speedup":<28} {reference / compiled:>12.1f}x')
+
+
+def bench_spanish_variants(sizes=(10_000, 100_000, 1_000_000)):
+    """One transcribe_es call, a call per dialect and transcribe_es_variants for all dialects
+    (tests/test_spanish.py checks that the variants are identical to the separate calls)"""
+    from transcribe_spanish import es_dialects, transcribe_es, transcribe_es_variants
+    for size in sizes:
+        text = repeat_to_size(samples['es'].replace('viento', 'viento llamado'), size)
+        single = timed(transcribe_es, text)
+        separate = timed(lambda: {dialect:transcribe_es(text, *dialect) for dialect in es_dialects})
+        variants = timed(transcribe_es_variants, text)
+        report('transcribe_es', size, single)
+        report(f'transcribe_es x {len(es_dialects)}', size, separate)
+        report('transcribe_es_variants', size, variants)
+        print(f'{"relative to one call":<28} {variants / single:>12.1f}x')
+
+
+#Reference implementations of the Spanish allophony stages before the single-pass context rules,
+#with one whole-text substitution per pair of segments
+def reference_es_allophony(text):
+    import re
+    from transcribe_spanish import nasal_assimilation, nasals, pause_punctuation, voiced_obstruent_allophones
+    for fricative in voiced_obstruent_allophones:
+        allophone = voiced_obstruent_allophones[fricative]
+        for nasal in nasals:
+            text = re.sub(f'{nasal}{fricative}', f'{nasal}{allophone}', text)
+            text = re.sub(f'{nasal}\\s+{fricative}', f'{nasal} {allophone}', text)
+    text = re.sub('lð', 'ld', text)
+    text = re.sub('l\\s+ð', 'l d', text)
+    text = text.split()
+    for i in range(len(text)):
+        word = list(text[i])
+        if word[0] in voiced_obstruent_allophones:
+            if i == 0 or text[i-1][-1] in pause_punctuation:
+                word[0] = voiced_obstruent_allophones[word[0]]
+        text[i] = ''.join(word)
+    text = list(' '.join(text))
+    for i in range(len(text)-1):
+        if text[i] in nasals and text[i+1] in nasal_assimilation:
+            text[i] = nasal_assimilation[text[i+1]]
+    return re.sub('l(?=ʧ)', 'lʲ', ''.join(text))
+
+
+#The voiced fricatives are substituted first, the only order in which the substitutions
+#never voice a run of the same fricative, like the single-pass voicing_assimilation
+def reference_voicing_assimilation(text):
+    import re
+    from transcribe_spanish import voiced_consonants
+    for voiceless, voiced in zip(['f', 'θ', 's'], ['v', 'ð', 'z']):
+        for voiced_consonant in [voiced] + sorted(voiced_consonants - {voiced}):
+            text = re.sub(f'{voiceless}(?={voiced_consonant})', voiced, text)
+    return text
+
+
+def bench_spanish_allophony(sizes=(1_000, 100_000, 1_000_000)):
+    """Whole-text substitutions versus the single-pass es_allophony and voicing_assimilation,
+    on the input each stage receives in transcribe_es (tests/test_spanish.py checks that
+    both give identical output)"""
+    from transcribe_spanish import SpanishTranscriber, es2ipa, es_allophony, voicing_assimilation
+    transcriber = SpanishTranscriber()
+    for size in sizes:
+        text = repeat_to_size(samples['es'], size)
+        stages = [('allophony', reference_es_allophony, es_allophony, es2ipa(text)),
+                  ('voicing', reference_voicing_assimilation, voicing_assimilation,
+                   transcriber.dialect_rewriter(transcriber.stressed_ipa(text)))]
+        for name, reference, function, stage_input in stages:
+            repeats = max(1, 100_000 // size)
+            before = timed(lambda: [reference(stage_input) for _ in range(repeats)]) / repeats
+            after = timed(lambda: [function(stage_input) for _ in range(repeats)]) / repeats
+            report(f'{name} (reference)', size, before)
+            report(name, size, after)
+            print(f'{"speedup":<28} {before / after:>12.1f}x')
+
+
+#Reference implementations of the basic IPA conversion of each language before the
+#compiled rewriters, calling re.sub once per key of each mapping dictionary
+def reference_rewrite(mappings, text):
+    import re
+    for mapping in mappings:
+        for pattern in mapping:
+            text = re.sub(pattern, mapping[pattern], text)
+    return text
+
+
+def reference_front_end(lang, text):
+    if lang == 'cz':
+        from transcribe_czech import cz_digraphs, czech_ipa
+        return ' '.join([reference_rewrite([cz_digraphs, czech_ipa, {'X':'x'}], word) for word in text.lower().split()])
+    elif lang == 'sk':
+        from transcribe_slovak import sk_digraphs, slovak_ipa
+        return reference_rewrite([sk_digraphs, slovak_ipa], text.lower()).lower()
+    elif lang == 'gr':
+        from transcribe_greek import greek_digraphs, greek_ipa
+        return reference_rewrite([greek_digraphs, greek_ipa], text.lower())
+    elif lang == 'es':
+        from transcribe_spanish import spanish_digraphs, spanish_ipa, spanish_trigraphs
+        return ' '.join([reference_rewrite([spanish_trigraphs, spanish_digraphs, spanish_ipa], word).lower()
+                         for word in text.lower().split()])
+
+
+def bench_gr_stream(sizes=(100_000, 1_000_000, 5_000_000), whole_max=1_000_000):
+    """transcribe_gr on whole texts (up to whole_max characters) versus transcribe_gr_stream
+    on the lines of a text generated on the fly, with the peak memory of the stream
+    (tests/test_greek.py checks that both give the same words)"""
+    import itertools
+    import tracemalloc
+    from transcribe_greek import transcribe_gr, transcribe_gr_stream
+    lines = [sentence + '.' for sentence in samples['gr'].split('. ')]
+    for size in sizes:
+        n_lines = size // (sum(map(len, lines)) // len(lines))
+        if size <= whole_max:
+            text = ' '.join(itertools.islice(itertools.cycle(lines), n_lines))
+            report('transcribe_gr', size, timed(transcribe_gr, text))
+        start = time.perf_counter()
+        for word in transcribe_gr_stream(itertools.islice(itertools.cycle(lines), n_lines)):
+            pass
+        report('transcribe_gr_stream', size, time.perf_counter() - start)
+        tracemalloc.start()
+        for word in transcribe_gr_stream(itertools.islice(itertools.cycle(lines), n_lines)):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{"streaming peak memory":<28} {size:>12,} chars {peak / 2**10:>10.1f} KB')
+
+
+def bench_profiling(sizes=(10_000, 100_000), calls=1_000_000):
+    """Time taken by the transcription pipelines with stage profiling disabled, enabled,
+    and enabled with memory tracking, and the overhead of calling a disabled stage"""
+    import profiling
+    from languages import get_transcriber
+
+    #Overhead per call of a disabled stage, compared to calling the undecorated function
+    def identity(text):
+        return text
+    decorated = profiling.stage(identity)
+    undecorated = timed(lambda: [identity('') for _ in range(calls)])
+    disabled = timed(lambda: [decorated('') for _ in range(calls)])
+    print(f'{"disabled stage overhead":<28} {(disabled - undecorated) / calls * 1e9:>10.0f} ns per call')
+
+    for lang in ['cz', 'es', 'gr', 'pl']:
+        function = get_transcriber(lang)
+        for size in sizes:
+            text = repeat_to_size(samples[lang], size)
+            report(f'transcribe_{lang}', size, timed(function, text))
+            with profiling.profiling():
+                report('profiled', size, timed(function, text))
+            with profiling.profiling(memory=True):
+                report('profiled (memory)', size, timed(function, text))
+
+
+def bench_rewriter(sizes=(10_000, 100_000, 1_000_000)):
+    """Basic IPA conversion with one re.sub call per mapping key versus the compiled rewriters
+    (tests/test_rewriter.py checks that both give identical output)"""
+    from transcribe_czech import cz_g2p
+    from transcribe_greek import gr2ipa
+    from transcribe_slovak import sk_g2p
+    from transcribe_spanish import es2ipa
+    samples['sk'] = samples['cz']
+    for lang, function in [('cz', cz_g2p), ('es', es2ipa), ('gr', gr2ipa), ('sk', sk_g2p)]:
+        for size in sizes:
+            text = repeat_to_size(samples[lang], size)
+            start = time.perf_counter()
+            expected = reference_front_end(lang, text)
+            reference = time.perf_counter() - start
+            compiled = timed(function, text)
+            report(f'{function.__name__} (reference)', size, reference)
+            report(function.__name__, size, compiled)
+            print(f'{"speedup":<28} {reference / compiled:>12.1f}x')
+
+
+#Reference implementation of gr2ipa as a longest-match scan of the Greek tables
+def longest_match_gr2ipa(text):
+    import re
+    from transcribe_greek import greek_digraphs, greek_ipa
+    table = dict(greek_ipa, **greek_digraphs)
+    regex = re.compile('|'.join(re.escape(key) for key in sorted(table, key=len, reverse=True)))
+    return regex.sub(lambda match: table[match.group()], text.lower())
+
+
+def random_greek_text(rng, length):
+    """Random text of the given number of tokens, drawn from the keys of the Greek tables
+    (in lower and upper case), other Greek and Latin letters, punctuation and spaces"""
+    from transcribe_greek import greek_digraphs, greek_ipa
+    tokens = list(greek_digraphs) + list(greek_ipa)
+    tokens += [token.upper() for token in tokens] + list('ΰάέ́ΆΈab., \n')
+    return ''.join(rng.choice(tokens) for _ in range(length))
+
+
+def bench_gr2ipa(sizes=(10_000, 100_000, 1_000_000)):
+    """gr2ipa versus the re.sub reference and the longest-match reference (tests/test_greek.py
+    checks that all three give identical output on random texts built from the Greek tables)"""
+    from transcribe_greek import gr2ipa
+    for size in sizes:
+        text = repeat_to_size(samples['gr'], size)
+        report('gr2ipa (re.sub)', size, timed(reference_front_end, 'gr', text))
+        report('gr2ipa (longest match)', size, timed(longest_match_gr2ipa, text))
+        report('gr2ipa', size, timed(gr2ipa, text))
+
+
+#Reference implementation of the Serbian script conversion before the precompiled engine,
+#converting each word with one regex substitution per character and digraph
+def reference_serbian_conversion(text, to_latin):
+    import re
+    from serbian_cyrillic_latin_converter import (cyrillic_latin_dict, latin_cyrillic_dict,
+                                                  latin_digraph_dict, palatal_segs, word_is_caps)
+    transcribed = []
+    for line in text.split('\n'):
+        for word in line.split() + ['\n']:
+            if to_latin:
+                tr_word = ''.join([cyrillic_latin_dict.get(ch, ch) for ch in word])
+                for seg in palatal_segs:
+                    tr_word = re.sub(seg, palatal_segs[seg], tr_word)
+            else:
+                tr_word = word
+                for digraph in latin_digraph_dict:
+                    tr_word = re.sub(digraph, latin_digraph_dict[digraph], tr_word)
+                for ch in latin_cyrillic_dict:
+                    tr_word = re.sub(ch, latin_cyrillic_dict[ch], tr_word)
+            if word_is_caps(word) == True:
+                tr_word = tr_word.upper()
+            transcribed.append(tr_word)
+    return ' '.join(transcribed)
+
+
+def bench_serbian_conversion(sizes=(100_000, 1_000_000, 2_000_000)):
+    """Serbian script conversion in both directions versus the reference implementation,
+    with the speedup over it (about 20x or more from 1 MB)"""
+    from serbian_cyrillic_latin_converter import convert_to_cyrillic, convert_to_latin
+    for size in sizes:
+        cyrillic = repeat_to_size(samples['sr'], size)
+        latin = convert_to_latin(cyrillic)
+        for label, function, text, to_latin in [('convert_to_latin', convert_to_latin, cyrillic, True),
+                                                ('convert_to_cyrillic', convert_to_cyrillic, latin, False)]:
+            reference = timed(reference_serbian_conversion, text, to_latin)
+            engine = timed(function, text)
+            report(f'{label} (reference)', len(text), reference)
+            report(label, len(text), engine)
+            print(f'{"speedup":<28} {reference / engine:>12.1f}x')
+
+
+def bench_serbian_stream(sizes=(1_000_000, 10_000_000, 30_000_000)):
+    """Streaming Serbian script conversion; peak memory (measured in a second,
+    traced run) should stay roughly constant as the input grows"""
+    import io
+    import os
+    import tracemalloc
+    from serbian_cyrillic_latin_converter import convert_stream
+    for size in sizes:
+        text = repeat_to_size(samples['sr'], size)
+        with open(os.devnull, 'w', encoding='utf-8') as outfile:
+            seconds = timed(convert_stream, io.StringIO(text), outfile, 'cyrillic')
+            infile = io.StringIO(text)
+            tracemalloc.start()
+            convert_stream(infile, outfile, 'cyrillic')
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        report('convert_stream', size, seconds)
+        print(f'{"peak memory":<28} {peak / 2**20:>12.1f} MB')
+
+
+def bench_serbian_detection(sizes=(100_000, 1_000_000, 10_000_000)):
+    """Serbian script detection counting every character versus the sampled detect_script,
+    checking that both detect the same script"""
+    from serbian_cyrillic_latin_converter import (ScriptDetector, convert_to_latin, detect_script,
+                                                  script_counts)
+    for size in sizes:
+        #Latin text with a Cyrillic majority, to be converted to Latin
+        cyrillic = repeat_to_size(samples['sr'], size * 2 // 3)
+        text = convert_to_latin(cyrillic)[:size - len(cyrillic)] + ' ' + cyrillic
+        detector = ScriptDetector()
+        start = time.perf_counter()
+        detector.cyrillic_count, detector.latin_count = script_counts(text)
+        full = detector.majority()
+        report('full count', size, time.perf_counter() - start)
+        report('detect_script', size, timed(detect_script, text))
+        assert detect_script(text) == full == 'cyrillic'
+
+
+#First word transcribed by bench_cold_start in each language
+cold_start_words = {'be':'мова', 'bg':'език', 'cz':'jazyk', 'es':'lengua', 'gr':'γλώσσα',
+                    'nahuatl':'tlahtōlli', 'pl':'język', 'sk':'jazyk', 'sr':'језик', 'uk':'мова'}
+
+
+def bench_segment_arrays(sizes=(100_000, 1_000_000, 10_000_000)):
+    """Conversion of Belarusian IPA text to and from arrays of segment IDs, and the final
+    stages of transcribe_be on the arrays (tests/test_phones.py checks that decoding
+    gives back the text)"""
+    from phones import decode, encode
+    from transcribe_belarusian import (be2ipa, be_palatalization, be_stress, be_vowel_reduction,
+                                       adjust_soft_vowels, be_final_devoicing_ids, be_obstruent_assimilation_ids)
+    
+    #The arrays are built from the output of the first five pipeline steps
+    sample = adjust_soft_vowels(be_vowel_reduction(be_stress(be_palatalization(be2ipa(samples['be'])))))
+    for size in sizes:
+        text = repeat_to_size(sample, size)
+        start = time.perf_counter()
+        ids = encode(text)
+        report('encode', size, time.perf_counter() - start)
+        report('be_final_devoicing_ids', size, timed(be_final_devoicing_ids, ids))
+        report('be_obstruent_assim_ids', size, timed(be_obstruent_assimilation_ids, ids))
+        start = time.perf_counter()
+        decode(ids)
+        report('decode', size, time.perf_counter() - start)
+
+
+def bench_cold_start(budget=1.0):
+    """Time taken by a fresh interpreter to import the language registry and transcribe
+    a first word in one language (well under a quarter of a second on a typical machine).
+    Languages over budget seconds are reported as FAIL, and the benchmarks then exit
+    with a non-zero status"""
+    import os
+    import subprocess
+    import sys
+    code = ('import time; start = time.perf_counter(); from languages import get_transcriber; '
+            'get_transcriber({lang!r})({word!r}); print(time.perf_counter() - start)')
+    over = []
+    for lang, word in cold_start_words.items():
+        result = subprocess.run([sys.executable, '-c', code.format(lang=lang, word=word)],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+        seconds = float(result.stdout.split()[-1])
+        print(f'{"cold start " + lang:<28} {seconds:>10.4f} s{"  FAIL" if seconds > budget else ""}')
+        if seconds > budget:
+            over.append(lang)
+    if over:
+        sys.exit(f'cold start over the budget of {budget} s: {", ".join(over)}')
+
+
+benchmarks = {'be_obstruent_assim':bench_be_obstruent_assim,
+              'bg_voicing_assim':bench_bg_voicing_assim,
+              'cold_start':bench_cold_start,
+              'context_rules':bench_context_rules,
+              'cz_voice_assim':bench_cz_voice_assim,
+              'gr2ipa':bench_gr2ipa,
+              'gr_stream':bench_gr_stream,
+              'lexicon':bench_lexicon,
+              'persistent_cache':bench_persistent_cache,
+              'profiling':bench_profiling,
+              'rewriter':bench_rewriter,
+              'segment_arrays':bench_segment_arrays,
+              'serbian_conversion':bench_serbian_conversion,
+              'serbian_detection':bench_serbian_detection,
+              'serbian_stream':bench_serbian_stream,
+              'sk_exceptions':bench_sk_exceptions,
+              'spanish_allophony':bench_spanish_allophony,
+              'spanish_transcriber':bench_spanish_transcriber,
+              'spanish_variants':bench_spanish_variants,
+              'stress_lexicon':bench_stress_lexicon,
+              'transcribe_corpus':bench_transcribe_corpus,
+              'transcribe_pl_fast':bench_transcribe_pl_fast,
+              'transcribe_stream':bench_transcribe_stream,
+              'word_cache':bench_word_cache}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run transcription benchmarks')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f'benchmarks to run (default: all): {", ".join(benchmarks)}')
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        help='input sizes in characters, overriding the defaults (where applicable)')
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error(f'unknown benchmark "{name}"')
+
+    for name in args.names or benchmarks:
+        print(f'# {name}')
+        if args.sizes and 'sizes' in inspect.signature(benchmarks[name]).parameters:
+            benchmarks[name](sizes=args.sizes)
+        else:
+            benchmarks[name]()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#COMPILED READ-ONLY TABLES
+#Byte string keys and values (e.g. words and their transcriptions) compiled into a file
+#which is memory-mapped when read: opening a table takes only as long as reading its header
+#whatever its size, and all processes reading the same file share its pages.
+#Used by lexicon.py and stress_lexicon.py.
+#
+#File format (all integers little-endian):
+#   magic number, length of the JSON header (uint32), JSON header
+#   hash table of table_size slots, each a CRC-32 of a key and the offset + 1 of its
+#   record in the data section (uint32 each; offset 0 is an empty slot), probed linearly
+#   data section: records of the length of the key and of the value (uint16 each),
+#   the key and the value
+
+import json
+import mmap
+import struct
+from zlib import crc32
+
+magic = b'G2PLEX\x00\x01'
+_slot = struct.Struct('<II')
+_record = struct.Struct('<HH')
+
+
+def write_table(path, header, records):
+    """Writes the dictionary records, of byte string keys and values, to a file in the
+    compiled format, with the given header dictionary"""
+    #Hash table at most half full, so that probe sequences stay short
+    table_size = 8
+    while table_size < 2 * len(records):
+        table_size *= 2
+    mask = table_size - 1
+    table = [(0, 0)] * table_size
+    data = bytearray()
+    for key, value in records.items():
+        if len(key) > 0xFFFF or len(value) > 0xFFFF:
+            raise ValueError(f'Entry too long for a compiled table: {key[:50]}...')
+        h = crc32(key)
+        i = h & mask
+        while table[i][1]:
+            i = (i + 1) & mask
+        table[i] = (h, len(data) + 1)
+        data += _record.pack(len(key), len(value)) + key + value
+        if len(data) >= 2**32:
+            raise ValueError('Compiled table too large')
+
+    header = json.dumps(dict(header, entries=len(records), table_size=table_size), ensure_ascii=False).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(magic + struct.pack('<I', len(header)) + header)
+        f.write(b''.join(_slot.pack(h, offset) for h, offset in table))
+        f.write(data)
+
+
+class MappedTable:
+    """Read-only memory-mapped file written by write_table, giving the value of each
+    byte string key. The header dictionary of the file is given by the header attribute"""
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+
+    def _open(self):
+        """Maps the file and reads its header"""
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(magic)] != magic:
+            raise ValueError(f'{self.path} is not a compiled table')
+        header_size = struct.unpack_from('<I', self._map, len(magic))[0]
+        start = len(magic) + 4
+        self.header = json.loads(self._map[start:start + header_size].decode('utf-8'))
+        self._mask = self.header['table_size'] - 1
+        self._table = start + header_size
+        self._data = self._table + self.header['table_size'] * _slot.size
+
+
+    def __getstate__(self):
+        #Each process maps the file itself
+        state = self.__dict__.copy()
+        del state['_map']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+    def __len__(self):
+        return self.header['entries']
+
+
+    def close(self):
+        self._map.close()
+
+
+    def get(self, key):
+        """Returns the value of a byte string key, or None if it is not in the table"""
+        h = crc32(key)
+        i = h & self._mask
+        table = self._map
+        while True:
+            slot_hash, offset = _slot.unpack_from(table, self._table + i * _slot.size)
+            if not offset:
+                return None
+            if slot_hash == h:
+                start = self._data + offset - 1
+                key_size, value_size = _record.unpack_from(table, start)
+                start += _record.size
+                if table[start:start + key_size] == key:
+                    return table[start + key_size:start + key_size + value_size]
+            i = (i + 1) & self._mask
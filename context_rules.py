@@ -0,0 +1,262 @@
+#NEIGHBOUR-CONDITIONED RULES ON SEGMENT ARRAYS
+#Rules of the form "change X when the neighbouring segment has property Y", such as final
+#devoicing or voicing assimilation to a following obstruent, applied to arrays of segment IDs
+#(see phones.py). The language modules give their rules as lists of ContextRules, e.g.
+#   sk_voice_assim_rules = [ContextRule(sk_devoicing_dict, target=..., after=...), ...]
+#which are applied either by a loop in pure Python (apply_rules) or, if NumPy is installed,
+#with shifted arrays and lookup tables over a whole batch of texts at once (apply_rules_numpy):
+#   apply_rules_batch(texts, sk_voice_assim_rules)
+#Both give identical results. apply_rules_batch collapses the whitespace of each text to single
+#spaces, as the string stages do; transcribe_sk(text, backend=...) runs two of its stages this way,
+#and transcribe_pl, transcribe_cz and transcribe_be one each.
+#The rules of a list are applied simultaneously: every condition is tested on the input array,
+#and each segment is changed by the first rule it matches.
+
+from array import array
+from phones import BOUNDARY_ID, SegmentTable, decode, encode, longest_prefix, segment_id, segment_map, segments
+
+
+def _numpy():
+    """Returns the numpy module, or None if it is not installed
+    (imported only when needed, as importing it takes longer than any language module)"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class ContextRule:
+    """Rule changing each target segment by the change mapping (see phones.segment_map) if the
+    previous segment satisfies before(segment) and the following one after(segment).
+    change may also be a function returning the changed segment, for changes which a mapping
+    of prefixes cannot express; target must then be given.
+    target, before, after and skip are functions of a segment: by default the targets are the
+    segments changed by the mapping, and segments for which skip(segment) is True (e.g.
+    punctuation) are passed over when looking for the neighbours (for the previous one only
+    if skip_before == True). Beyond either end of the array the neighbour is the word boundary ' '"""
+
+    def __init__(self, change, target=None, before=None, after=None, skip=None, skip_before=True):
+        if callable(change):
+            self.changes = SegmentTable(lambda segment: segment_id(change(segment)))
+        else:
+            self.changes = segment_map(change)
+        if target is None:
+            def target(segment):
+                prefix = longest_prefix(segment, change)
+                return prefix is not None and change[prefix] != prefix
+        self.targets = SegmentTable(target)
+        self.before = SegmentTable(before) if before is not None else None
+        self.after = SegmentTable(after) if after is not None else None
+        self.skips = SegmentTable(skip) if skip is not None else None
+        self.skip_before = skip_before
+        self._arrays = {}
+
+    def neighbour(self, ids, i, step):
+        """Returns the ID of the neighbour of the segment at index i of the array
+        (the previous one if step == -1, the following one if step == 1)"""
+        j = i + step
+        if self.skips is not None and (step == 1 or self.skip_before):
+            while 0 <= j < len(ids) and self.skips[ids[j]]:
+                j += step
+        if 0 <= j < len(ids):
+            return ids[j]
+        return BOUNDARY_ID
+
+    def lookup(self, name, n):
+        """Returns one of the tables of the rule as a NumPy array covering the segment IDs
+        below n, built again only when new segments have been encoded"""
+        np = _numpy()
+        cached = self._arrays.get(name)
+        if cached is None or len(cached) < n:
+            table = getattr(self, name)
+            if name == 'changes':
+                cached = np.array([table[i] for i in range(n)], dtype=np.uint32)
+            else:
+                cached = np.array([bool(table[i]) for i in range(n)], dtype=bool)
+            self._arrays[name] = cached
+        return cached
+
+
+def apply_rules(ids, rules):
+    """Applies a list of ContextRules to an array of segment IDs in pure Python,
+    returning the new array"""
+    tr = array('I', ids)
+    n = len(ids)
+    
+    #Rules of which each segment is a target, most segments being the target of none
+    candidates = {}
+    for i, seg in enumerate(ids):
+        try:
+            targeting = candidates[seg]
+        except KeyError:
+            targeting = candidates[seg] = [rule for rule in rules if rule.targets[seg]]
+        for rule in targeting:
+            
+            #Check the neighbours, the adjacent segments unless the rule skips some segments
+            if rule.before is not None:
+                if rule.skips is None or not rule.skip_before:
+                    prev = ids[i-1] if i > 0 else BOUNDARY_ID
+                else:
+                    prev = rule.neighbour(ids, i, -1)
+                if not rule.before[prev]:
+                    continue
+            if rule.after is not None:
+                if rule.skips is None:
+                    nxt = ids[i+1] if i+1 < n else BOUNDARY_ID
+                else:
+                    nxt = rule.neighbour(ids, i, 1)
+                if not rule.after[nxt]:
+                    continue
+            tr[i] = rule.changes[seg]
+            break
+    return tr
+
+
+def _neighbours(np, ids, skips, step):
+    """Returns the array of the IDs of the neighbours of each segment of a NumPy array
+    of segment IDs, given the skip table of a rule (or None)"""
+    n = len(ids)
+
+    #The word boundary is appended to the array, so that it is at both index n and index -1
+    extended = np.append(ids, np.uint32(BOUNDARY_ID))
+    if skips is None:
+        return extended[np.arange(n) + step]
+
+    #Index of the nearest segment which is not skipped, in either direction
+    positions = np.arange(n)
+    kept = ~skips[ids]
+    if step == 1:
+        first_kept = np.minimum.accumulate(np.where(kept, positions, n)[::-1])[::-1]
+        indices = np.append(first_kept[1:], n)
+    else:
+        last_kept = np.maximum.accumulate(np.where(kept, positions, -1))
+        indices = np.concatenate(([-1], last_kept[:-1]))
+    return extended[indices]
+
+
+def apply_rules_numpy(ids, rules):
+    """Applies a list of ContextRules to an array of segment IDs with NumPy,
+    returning the new array"""
+    np = _numpy()
+    if np is None:
+        raise ImportError('apply_rules_numpy requires NumPy; use apply_rules instead')
+    ids = np.frombuffer(array('I', ids), dtype=np.uint32)
+    return array('I', _apply_rules_numpy(np, ids, rules).tobytes())
+
+
+def _apply_rules_numpy(np, ids, rules):
+    """Applies a list of ContextRules to a NumPy array of segment IDs"""
+    n = len(segments)
+    tr = ids.copy()
+    pending = np.ones(len(ids), dtype=bool)
+    for rule in rules:
+        changed = rule.lookup('targets', n)[ids] & pending
+        skips = rule.lookup('skips', n) if rule.skips is not None else None
+        if rule.before is not None:
+            changed &= rule.lookup('before', n)[_neighbours(np, ids, skips if rule.skip_before else None, -1)]
+        if rule.after is not None:
+            changed &= rule.lookup('after', n)[_neighbours(np, ids, skips, 1)]
+        tr[changed] = rule.lookup('changes', n)[ids[changed]]
+        pending &= ~changed
+    return tr
+
+
+#Tables of the NumPy conversion between texts and arrays of segment IDs; 'code_ids' gives
+#the segment ID of each code point seen so far (see the note on the registry in phones.py)
+_numpy_tables = {}
+
+
+def _code_tables(np):
+    """Returns the NumPy tables of the whitespace and joining characters (those which
+    phones.segment_regex joins to the preceding character), indexed by code point"""
+    if 'space' not in _numpy_tables:
+        space = np.zeros(0x110000, dtype=bool)
+        space[[code for code in range(0x3001) if chr(code).isspace()]] = True
+        joining = np.zeros(0x110000, dtype=bool)
+        joining[0x300:0x370] = True
+        joining[[ord(ch) for ch in 'ʲʷʰː']] = True
+        _numpy_tables['space'] = space
+        _numpy_tables['joining'] = joining
+        _numpy_tables['code_ids'] = np.full(0x110000, 0xFFFFFFFF, dtype=np.uint32)
+    return _numpy_tables['space'], _numpy_tables['joining'], _numpy_tables['code_ids']
+
+
+def encode_numpy(text):
+    """Returns the NumPy array of segment IDs of a text, the same as phones.encode"""
+    np = _numpy()
+    
+    #Tie bars join segments across any character, which is left to the regular expression
+    if '\u0361' in text:
+        return np.frombuffer(encode(text), dtype=np.uint32)
+    space, joining, code_ids = _code_tables(np)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    
+    #A segment starts at each character which is not joined to the preceding one
+    joined = np.zeros(len(codes), dtype=bool)
+    joined[1:] = joining[codes[1:]] & ~space[codes[:-1]]
+    starts = np.flatnonzero(~joined)
+    lengths = np.diff(np.append(starts, len(codes)))
+    
+    #Segments of one character are looked up by their code point
+    ids = code_ids[codes[starts]]
+    for code in np.unique(codes[starts][ids == 0xFFFFFFFF]):
+        code_ids[code] = segment_id(chr(code))
+    ids = code_ids[codes[starts]]
+    
+    #Segments of two or three characters are looked up by their code points packed into
+    #one integer, each distinct segment only once; longer segments one by one
+    several = np.flatnonzero(lengths > 1)
+    packed = several[lengths[several] <= 3]
+    keys = np.zeros(len(packed), dtype=np.uint64)
+    for offset in range(3):
+        present = lengths[packed] > offset
+        code = codes[np.minimum(starts[packed] + offset, len(codes) - 1)]
+        keys = (keys << np.uint64(21)) | np.where(present, code, 0).astype(np.uint64)
+    distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    distinct_ids = np.array([segment_id(text[starts[k]:starts[k]+lengths[k]]) for k in packed[first]], dtype=np.uint32)
+    ids[packed] = distinct_ids[inverse]
+    for k in several[lengths[several] > 3]:
+        ids[k] = segment_id(text[starts[k]:starts[k]+lengths[k]])
+    return ids
+
+
+def decode_numpy(ids):
+    """Returns the text of a NumPy array of segment IDs, the same as phones.decode"""
+    np = _numpy()
+    
+    #Code points of all segments, with the offset and length of each segment
+    #(replaced together, as other threads may be reading them)
+    n, codes, offsets, lengths = _numpy_tables.get('segments', (0, None, None, None))
+    if n != len(segments):
+        current = segments[:]
+        lengths = np.array([len(segment) for segment in current], dtype=np.int64)
+        codes = np.frombuffer(''.join(current).encode('utf-32-le'), dtype=np.uint32)
+        offsets = np.cumsum(lengths) - lengths
+        _numpy_tables['segments'] = (len(current), codes, offsets, lengths)
+    
+    #Gather the code points of the segments of the array, in order
+    counts = lengths[ids]
+    ends = np.cumsum(counts)
+    positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(offsets[ids] - (ends - counts), counts)
+    return codes[positions].tobytes().decode('utf-32-le')
+
+
+def apply_rules_batch(texts, rules, backend=None):
+    """Applies a list of ContextRules to each of a batch of texts, returning the list of
+    new texts. All whitespace of each text is collapsed, as by the string stages the rules
+    mirror: runs of whitespace, line breaks included, become single spaces, and leading and
+    trailing whitespace is removed. backend is 'numpy', 'python', or None to use NumPy if installed"""
+    if backend is None:
+        backend = 'numpy' if _numpy() is not None else 'python'
+    if backend not in ['numpy', 'python']:
+        raise ValueError(f'unknown backend "{backend}"')
+    texts = [' '.join(text.split()) for text in texts]
+    if not texts:
+        return []
+
+    #The texts are separated by line breaks, which are word boundaries to the rules
+    text = '\n'.join(texts)
+    if backend == 'numpy':
+        return decode_numpy(_apply_rules_numpy(_numpy(), encode_numpy(text), rules)).split('\n')
+    return decode(apply_rules(encode(text), rules)).split('\n')
@@ -0,0 +1,145 @@
+#CORPUS-SCALE BATCH TRANSCRIPTION
+#Transcribes an iterable of texts (e.g. the lines of a corpus file) with a process pool,
+#yielding the transcriptions in input order:
+#   stats = {}
+#   with open('corpus.txt') as f:
+#       for tr in transcribe_corpus('pl', f, workers=8, stats=stats):
+#           ...
+#Texts are never split: chunks sent to the workers consist of whole texts, so chunk
+#boundaries fall only at line boundaries and rules crossing word boundaries within
+#a text still see all of its words. With cache_path, the workers share a persistent
+#word cache in that file (see persistent_cache.py)
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from languages import get_transcriber, transcribe_line
+
+#Persistent cache of each cache file opened by the current process; in worker
+#processes the caches stay open until the process exits
+_caches = {}
+
+
+def _transcribe_chunk(lang, texts, options, cache_path=None):
+    """Transcribes a list of texts in a worker process; returns the process ID,
+    the time spent, the number of characters, the transcriptions and the numbers of
+    words found in memory and on disk and transcribed by the persistent cache (or None)"""
+    if cache_path is None:
+        function = get_transcriber(lang)
+    else:
+        from persistent_cache import PersistentTranscriptionCache
+        if cache_path not in _caches:
+            _caches[cache_path] = PersistentTranscriptionCache(cache_path)
+        cache = _caches[cache_path]
+        before = (cache.hits, cache.disk_hits, cache.misses)
+        def function(text, **options):
+            return cache.transcribe(lang, text, **options)
+    start = time.perf_counter()
+    tr = [transcribe_line(function, text, options) for text in texts]
+    cache_stats = None
+    if cache_path is not None:
+        cache.flush()
+        cache_stats = (cache.hits - before[0], cache.disk_hits - before[1], cache.misses - before[2])
+    return os.getpid(), time.perf_counter() - start, sum(len(text) for text in texts), tr, cache_stats
+
+
+def _chunks(texts, chunk_size):
+    """Groups texts into lists of whole texts of about chunk_size characters"""
+    chunk = []
+    size = 0
+    for text in texts:
+        chunk.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def _add_stats(stats, pid, seconds, chars, n_texts, cache_stats):
+    """Adds the work done on one chunk to the statistics of its worker"""
+    worker = stats['workers'].setdefault(pid, {'chunks':0, 'texts':0, 'chars':0, 'seconds':0.0})
+    worker['chunks'] += 1
+    worker['texts'] += n_texts
+    worker['chars'] += chars
+    worker['seconds'] += seconds
+    worker['chars_per_second'] = worker['chars'] / worker['seconds'] if worker['seconds'] > 0 else 0.0
+    if cache_stats is not None:
+        for name, count in zip(['cache_hits', 'cache_disk_hits', 'cache_misses'], cache_stats):
+            worker[name] = worker.get(name, 0) + count
+
+
+def transcribe_corpus(lang, texts, workers=None, chunk_size=100000, stats=None, cache_path=None, **options):
+    """Transcribes each text of the iterable texts with the transcription function
+    of language lang and the given options, yielding the transcriptions in input order.
+    Texts are grouped into chunks of about chunk_size characters, which are sent to
+    a pool of worker processes (by default one per CPU; with workers=1 texts are
+    transcribed in the current process). At most two chunks per worker are in flight,
+    so the iterable is consumed lazily.
+    If a dictionary is given as stats, it is filled with the number of chunks, texts
+    and characters, the busy time and the throughput (characters per second) of each
+    worker under stats['workers'], and, once all texts are transcribed, the totals under stats['total'].
+    If cache_path is given, words are looked up in and saved to the persistent cache
+    in that file, and the cache hits and misses are added to the statistics.
+    As with transcribe_stream, line breaks at the end of the texts are removed, and
+    texts without letters give empty transcriptions (see languages.transcribe_line)."""
+    get_transcriber(lang)
+    return _transcribe_corpus(lang, texts, workers, chunk_size, stats, cache_path, options)
+
+
+def _transcribe_corpus(lang, texts, workers, chunk_size, stats, cache_path, options):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if stats is None:
+        stats = {}
+    stats['workers'] = {}
+    start = time.perf_counter()
+    chars = n_texts = 0
+
+    if workers == 1:
+        try:
+            for chunk in _chunks(texts, chunk_size):
+                pid, seconds, chunk_chars, tr, cache_stats = _transcribe_chunk(lang, chunk, options, cache_path)
+                _add_stats(stats, pid, seconds, chunk_chars, len(chunk), cache_stats)
+                chars += chunk_chars
+                n_texts += len(chunk)
+                yield from tr
+        finally:
+            #Close the persistent cache opened in this process, also if the transcriptions
+            #are not all read (the workers' caches are flushed after each chunk)
+            if cache_path in _caches:
+                _caches.pop(cache_path).close()
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            chunks = _chunks(texts, chunk_size)
+            while True:
+                #Keep the workers busy without reading the whole iterable at once
+                while len(pending) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append((len(chunk), pool.submit(_transcribe_chunk, lang, chunk, options, cache_path)))
+                if not pending:
+                    break
+                chunk_texts, future = pending.popleft()
+                pid, seconds, chunk_chars, tr, cache_stats = future.result()
+                _add_stats(stats, pid, seconds, chunk_chars, chunk_texts, cache_stats)
+                chars += chunk_chars
+                n_texts += chunk_texts
+                yield from tr
+
+    seconds = time.perf_counter() - start
+    stats['total'] = {'texts':n_texts,
+                      'chars':chars,
+                      'seconds':seconds,
+                      'chars_per_second':chars / seconds if seconds > 0 else 0.0}
+    if cache_path is not None:
+        for name in ['cache_hits', 'cache_disk_hits', 'cache_misses']:
+            stats['total'][name] = sum(worker.get(name, 0) for worker in stats['workers'].values())
+        lookups = stats['total']['cache_hits'] + stats['total']['cache_disk_hits'] + stats['total']['cache_misses']
+        stats['total']['cache_hit_rate'] = (lookups - stats['total']['cache_misses']) / lookups if lookups else 0.0
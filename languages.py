@@ -0,0 +1,94 @@
+#REGISTRY OF G2P LANGUAGES
+#Maps language codes to the transcription function of each language module;
+#language modules are only imported when the language is first used.
+#transcribe_stream transcribes an iterable of texts of any length one text at a time:
+#   with open('corpus.txt') as f:
+#       for tr in transcribe_stream('pl', f):
+#           ...
+
+import importlib
+
+#Module and function name of the transcription function of each language
+transcriber_names = {'be':('transcribe_belarusian', 'transcribe_be'),
+                     'bg':('transcribe_bulgarian', 'transcribe_bg'),
+                     'cz':('transcribe_czech', 'transcribe_cz'),
+                     'es':('transcribe_spanish', 'transcribe_es'),
+                     'gr':('transcribe_greek', 'transcribe_gr'),
+                     'nahuatl':('transcribe_nahuatl', 'transcribe_nahuatl'),
+                     'pl':('transcribe_polish', 'transcribe_pl'),
+                     'sk':('transcribe_slovak', 'transcribe_sk'),
+                     'sr':('serbian_cyrillic_latin_converter', 'convert_text'),
+                     'uk':('transcribe_ukrainian', 'transcribe_uk')}
+
+#Transcription functions of the languages used so far
+transcribers = {}
+
+
+def get_transcriber(lang):
+    """Returns the transcription function for the language code lang,
+    importing its module on first use"""
+    try:
+        return transcribers[lang]
+    except KeyError:
+        pass
+    try:
+        module, function = transcriber_names[lang]
+    except KeyError:
+        raise ValueError(f'Unsupported language "{lang}"; use one of: {", ".join(transcriber_names)}')
+    transcribers[lang] = getattr(importlib.import_module(module), function)
+    return transcribers[lang]
+
+
+def transcribe_stream(lang, texts, cache=None, **options):
+    """Transcribes each text of the iterable texts (e.g. the lines of a file, or sentences)
+    with the transcription function of language lang and the given options, yielding the
+    transcriptions as the texts arrive, so that only one text is held in memory at a time.
+    Line breaks at the end of the texts are removed first, and texts without letters give
+    empty transcriptions (see transcribe_line); otherwise each transcription is that of the
+    whole-string function. For Serbian script conversion without a source_script, the script
+    is detected once over the stream (as by serbian_cyrillic_latin_converter.convert_stream),
+    texts being held back only until it is decided.
+    cache is an optional TranscriptionCache (see word_cache.py) to transcribe the texts with"""
+    function = get_transcriber(lang)
+    if cache is not None:
+        def function(text, **options):
+            return cache.transcribe(lang, text, **options)
+    if lang == 'sr' and options.get('source_script') is None and not options.get('per_paragraph'):
+        return _sr_stream(function, texts, options)
+    return _stream(function, texts, options)
+
+
+def _stream(function, texts, options):
+    for text in texts:
+        yield transcribe_line(function, text, options)
+
+
+def _sr_stream(function, texts, options):
+    from serbian_cyrillic_latin_converter import ScriptDetector
+    detector = ScriptDetector()
+    held = []
+    for text in texts:
+        if detector.script is None:
+            #Texts are counted as if separated by spaces
+            if detector.update(text + ' ') is None:
+                held.append(text)
+                continue
+            for held_text in held:
+                yield transcribe_line(function, held_text, dict(options, source_script=detector.script))
+            held = []
+        yield transcribe_line(function, text, dict(options, source_script=detector.script))
+    
+    #Texts with no Cyrillic or Latin characters read the same in either script
+    script = detector.finish() or 'latin'
+    for held_text in held:
+        yield transcribe_line(function, held_text, dict(options, source_script=script))
+
+
+def transcribe_line(function, text, options):
+    """Transcribes a text (e.g. a line of a file) with the transcription function and the
+    dictionary of options, removing its line break first; texts without letters (blank lines,
+    numbers, punctuation) give empty transcriptions"""
+    text = text.rstrip('\r\n')
+    if not any(ch.isalpha() for ch in text):
+        return ''
+    return function(text, **options)
@@ -0,0 +1,133 @@
+#COMPILED PRONUNCIATION LEXICONS
+#Transcriptions of a known vocabulary can be computed once and compiled into a read-only
+#binary file (see compiled_table.py), which is memory-mapped when used: opening a lexicon
+#of millions of words takes only as long as reading its header, each lookup touches only
+#a few pages, and all processes using the same file share its pages in the operating
+#system's file cache.
+#Usage:
+#   build_lexicon('pl', words, 'pl.lex', stress=False)
+#   cache = LexiconTranscriptionCache('pl.lex')
+#   cache.transcribe('pl', text, stress=False)
+#Words missing from the lexicon (and texts transcribed with other options) fall back to
+#the rules of the language, with the same output as the transcribe_* functions.
+#Keys are a word and its boundary context (see word_cache.py) separated by null
+#characters, and values the transcriptions, UTF-8 encoded.
+
+from compiled_table import MappedTable, write_table
+from languages import get_transcriber
+from persistent_cache import module_version
+from word_cache import TranscriptionCache, bind_options, language_contexts, transcribe_in_context
+
+#Boundary contexts for which the transcription of each word is compiled by default:
+#words in the middle of a text have no context in most languages, but are followed by
+#a space in Nahuatl
+default_contexts = {'nahuatl':[('', ' '), ('', '')]}
+
+
+def _key(word, context):
+    """Returns the encoded key of a word in a (prefix, suffix) context"""
+    return '\0'.join([word, context[0], context[1]]).encode('utf-8')
+
+
+def build_lexicon(lang, words, path, contexts=None, **options):
+    """Transcribes each word of the iterable words with the transcription function of
+    language lang and the given options, and writes the compiled lexicon to path.
+    contexts is the list of (prefix, suffix) boundary contexts to transcribe each word in
+    (see default_contexts). Returns the number of entries"""
+    function = get_transcriber(lang)
+    if lang not in language_contexts:
+        raise ValueError(f'Language "{lang}" has no word-level transcription')
+    word_contexts, prepare, keep_whitespace = language_contexts[lang]
+    if contexts is None:
+        contexts = default_contexts.get(lang, [('', '')])
+    options = bind_options(function, options)
+
+    #Transcribe each distinct word, as it is looked up by the cache
+    records = {}
+    for word in words:
+        word = word.strip().lower()
+        if prepare is not None and word:
+            word = prepare(word)
+        if not word or len(word.split()) != 1:
+            continue
+        
+        #Words producing no output are never looked up
+        found = word_contexts([word], ['', ''], options)
+        if found is None or found[0] is None:
+            continue
+        for context in contexts:
+            key = _key(word, context)
+            if key not in records:
+                records[key] = transcribe_in_context(function, word, context, options, keep_whitespace).encode('utf-8')
+
+    write_table(path, {'lang':lang, 'options':repr(tuple(options.items())), 'version':module_version(lang)}, records)
+    return len(records)
+
+
+class Lexicon(MappedTable):
+    """Read-only memory-mapped lexicon compiled by build_lexicon. Unless check_version
+    is False, a ValueError is raised if the rules of the language have changed since
+    the lexicon was built"""
+
+    def __init__(self, path, check_version=True):
+        self.check_version = check_version
+        super().__init__(path)
+
+
+    def _open(self):
+        """Maps the file and checks that it was built with the current rules"""
+        super()._open()
+        self.lang = self.header['lang']
+        self.options = self.header['options']
+        if self.check_version and self.header['version'] != module_version(self.lang):
+            raise ValueError(f'{self.path} was built with other rules of language "{self.lang}"; rebuild it')
+
+
+    def __contains__(self, word):
+        return self.lookup(word) is not None
+
+
+    def lookup(self, word, context=('', '')):
+        """Returns the transcription of a lowercased word in a (prefix, suffix) context,
+        or None if it is not in the lexicon"""
+        tr = self.get(_key(word, context))
+        if tr is None:
+            return None
+        return tr.decode('utf-8')
+
+
+class LexiconTranscriptionCache(TranscriptionCache):
+    """TranscriptionCache which looks up words missing from memory in the compiled
+    lexicon at path, transcribing them with the rules of the language only if they are
+    not in the lexicon. The memory limits are those of TranscriptionCache"""
+
+    def __init__(self, path, max_entries=100000, max_bytes=64*2**20, check_version=True):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes)
+        self.lexicon = Lexicon(path, check_version=check_version)
+        self.lexicon_hits = 0
+
+
+    def _load(self, key):
+        lang, options_key, word, prefix, suffix = key
+        if lang != self.lexicon.lang or repr(options_key) != self.lexicon.options:
+            return None
+        tr = self.lexicon.lookup(word, (prefix, suffix))
+        if tr is not None:
+            self.lexicon_hits += 1
+        return tr
+
+
+    def clear(self):
+        """Removes all entries from memory and resets the statistics"""
+        super().clear()
+        self.lexicon_hits = 0
+
+
+    def stats(self):
+        """Returns a dictionary of cache statistics: hits are words found in memory,
+        lexicon_hits words found in the lexicon, and misses words transcribed"""
+        stats = super().stats()
+        lookups = self.hits + self.lexicon_hits + self.misses
+        stats['lexicon_hits'] = self.lexicon_hits
+        stats['hit_rate'] = (self.hits + self.lexicon_hits) / lookups if lookups else 0.0
+        return stats
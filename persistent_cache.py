@@ -0,0 +1,205 @@
+#PERSISTENT ON-DISK TRANSCRIPTION CACHE
+#A TranscriptionCache (see word_cache.py) backed by a SQLite file, so that word
+#transcriptions are kept across runs and shared by all processes using the same file.
+#Entries are keyed by language, options, word, boundary context and a hash of the
+#source code of the language module and the modules it uses: whenever the rules of a
+#language change, its old entries are simply no longer found (prune() deletes them).
+#Usage:
+#   with PersistentTranscriptionCache('transcriptions.sqlite') as cache:
+#       cache.transcribe('pl', text, stress=False)
+#       cache.stats()
+#The file is opened in write-ahead logging mode, so that any number of processes can read
+#it while one of them writes; new entries are written in batches of batch_size entries
+#and when the cache is flushed or closed. Caches which are not closed explicitly are closed
+#when they are garbage collected or, at the latest, when the interpreter exits.
+
+import atexit
+import hashlib
+import importlib
+import inspect
+import os
+import sqlite3
+import sys
+import weakref
+from languages import transcriber_names
+import word_cache
+from word_cache import TranscriptionCache
+
+#Seconds a process waits for another process writing to the file before giving up
+lock_timeout = 60
+
+_repo_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def _repo_modules(module, found):
+    """Adds module and all modules of this repository which it uses to the dictionary found"""
+    if module.__name__ in found:
+        return
+    path = getattr(module, '__file__', None)
+    if path is None or os.path.dirname(os.path.abspath(path)) != _repo_dir:
+        return
+    found[module.__name__] = module
+    for value in vars(module).values():
+        if inspect.ismodule(value):
+            _repo_modules(value, found)
+        else:
+            used = sys.modules.get(getattr(value, '__module__', None) or '')
+            if used is not None:
+                _repo_modules(used, found)
+
+
+#Version hash of each language
+_versions = {}
+
+#Caches with a connection open, closed at exit
+_open_caches = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_caches():
+    for cache in list(_open_caches):
+        cache.close()
+
+
+def module_version(lang):
+    """Returns a hash of the source code of the module of language lang, of the modules
+    of this repository which it uses and of word_cache.py (which gives the boundary contexts)"""
+    try:
+        return _versions[lang]
+    except KeyError:
+        pass
+    modules = {}
+    _repo_modules(importlib.import_module(transcriber_names[lang][0]), modules)
+    modules['word_cache'] = word_cache
+    digest = hashlib.sha256()
+    for name in sorted(modules):
+        with open(modules[name].__file__, 'rb') as f:
+            digest.update(name.encode() + b'\0' + f.read() + b'\0')
+    _versions[lang] = digest.hexdigest()[:16]
+    return _versions[lang]
+
+
+class PersistentTranscriptionCache(TranscriptionCache):
+    """TranscriptionCache which looks up words missing from memory in the SQLite file
+    at path and saves new transcriptions to it, batch_size entries at a time.
+    The memory limits are those of TranscriptionCache."""
+
+    def __init__(self, path, batch_size=1000, max_entries=100000, max_bytes=64*2**20):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes)
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.disk_hits = 0
+        self._connection = None
+        self._pid = None
+        self.connection()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __del__(self):
+        #Attributes are missing if __init__ failed
+        if getattr(self, '_connection', None) is not None or getattr(self, 'pending', None):
+            self.close()
+
+
+    def __getstate__(self):
+        #The connection cannot be shared with other processes, which open their own
+        state = self.__dict__.copy()
+        state['_connection'] = state['_pid'] = None
+        return state
+
+
+    def connection(self):
+        """Returns the connection to the SQLite file of the current process, opening it if needed"""
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=lock_timeout)
+            self._pid = os.getpid()
+            _open_caches.add(self)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            with self._connection:
+                self._connection.execute('''CREATE TABLE IF NOT EXISTS transcriptions
+                                            (lang TEXT, version TEXT, options TEXT, word TEXT,
+                                             prefix TEXT, suffix TEXT, tr TEXT,
+                                             PRIMARY KEY (lang, version, options, word, prefix, suffix))
+                                            WITHOUT ROWID''')
+        return self._connection
+
+
+    def _row(self, key):
+        """Returns the values of the key columns of the table for a cache key"""
+        lang, options_key, word, prefix, suffix = key
+        return lang, module_version(lang), repr(options_key), word, prefix, suffix
+
+
+    def _load(self, key):
+        row = self.connection().execute('''SELECT tr FROM transcriptions WHERE lang=? AND version=?
+                                           AND options=? AND word=? AND prefix=? AND suffix=?''',
+                                        self._row(key)).fetchone()
+        if row is None:
+            return None
+        self.disk_hits += 1
+        return row[0]
+
+
+    def _store(self, key, tr):
+        self.pending.append(self._row(key) + (tr,))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+
+    def flush(self):
+        """Writes the new entries to the file"""
+        if not self.pending:
+            return
+        with self.connection() as connection:
+            connection.executemany('INSERT OR IGNORE INTO transcriptions VALUES (?, ?, ?, ?, ?, ?, ?)', self.pending)
+        self.pending = []
+
+
+    def close(self):
+        """Writes the new entries to the file and closes it"""
+        self.flush()
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = self._pid = None
+
+
+    def prune(self):
+        """Deletes the entries saved by other versions of the language modules;
+        returns the number of entries deleted"""
+        self.flush()
+        with self.connection() as connection:
+            deleted = 0
+            for (lang,) in connection.execute('SELECT DISTINCT lang FROM transcriptions').fetchall():
+                if lang in transcriber_names:
+                    deleted += connection.execute('DELETE FROM transcriptions WHERE lang=? AND version!=?',
+                                                  (lang, module_version(lang))).rowcount
+                else:
+                    deleted += connection.execute('DELETE FROM transcriptions WHERE lang=?', (lang,)).rowcount
+        return deleted
+
+
+    def clear(self):
+        """Removes all entries from memory (not from the file) and resets the statistics"""
+        super().clear()
+        self.disk_hits = 0
+
+
+    def stats(self):
+        """Returns a dictionary of cache statistics: hits are words found in memory,
+        disk_hits words found in the file, and misses words transcribed"""
+        stats = super().stats()
+        lookups = self.hits + self.disk_hits + self.misses
+        stats['disk_hits'] = self.disk_hits
+        stats['hit_rate'] = (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        stats['disk_hit_rate'] = self.disk_hits / (self.disk_hits + self.misses) if self.disk_hits + self.misses else 0.0
+        stats['pending'] = len(self.pending)
+        return stats
@@ -0,0 +1,217 @@
+#PHONE INVENTORY SHARED BY ALL LANGUAGES
+#Every IPA segment used by the transcription modules has an integer ID, shared by all
+#languages, and each language module describes its natural classes with a PhoneInventory,
+#which gives every segment a bitmask of its features in that language:
+#   pl_phones = PhoneInventory('pl', {VOWEL:pl_vowels, OBSTRUENT:pl_obstruents, ...})
+#   pl_phones.mask('b') & OBSTRUENT
+#   pl_phones.has('b', OBSTRUENT | VOICED)   #all of the features
+#   pl_phones.segments(VOICELESS | VOWEL)    #segments with any of the features
+#The masks can also be looked up by segment ID (mask_table), for rule engines working
+#on arrays of segment IDs rather than strings (see SEGMENT ARRAYS below).
+
+import re
+import threading
+from array import array
+
+#Features
+VOWEL = 1 << 0
+CONSONANT = 1 << 1
+OBSTRUENT = 1 << 2
+VOICED = 1 << 3
+VOICELESS = 1 << 4
+NASAL = 1 << 5
+PLOSIVE = 1 << 6
+FRICATIVE = 1 << 7
+AFFRICATE = 1 << 8
+PALATALIZABLE = 1 << 9
+
+#Diacritics and boundaries, which are not segments of their own but are tested like them
+STRESS = 1 << 10          #ˈ
+SYLLABIC_MARK = 1 << 11   #combining syllabic diacritic
+BOUNDARY = 1 << 12        #space between words
+
+feature_names = {VOWEL:'vowel',
+                 CONSONANT:'consonant',
+                 OBSTRUENT:'obstruent',
+                 VOICED:'voiced',
+                 VOICELESS:'voiceless',
+                 NASAL:'nasal',
+                 PLOSIVE:'plosive',
+                 FRICATIVE:'fricative',
+                 AFFRICATE:'affricate',
+                 PALATALIZABLE:'palatalizable',
+                 STRESS:'stress',
+                 SYLLABIC_MARK:'syllabic mark',
+                 BOUNDARY:'boundary'}
+
+#ID of each segment, and the segment of each ID.
+#Note that the registry grows with every distinct segment (character with its diacritics)
+#ever encoded and is never pruned, as do the SegmentTables below and the code point table
+#of context_rules.py: a long-running process fed arbitrary text keeps an entry for each
+#distinct segment it has seen, however rarely
+segment_ids = {}
+segments = []
+
+#Lock held while giving a new segment its ID, so that threads never give two segments one ID
+_segment_lock = threading.Lock()
+
+#Inventory of each language, by language code
+inventories = {}
+
+
+def segment_id(segment):
+    """Returns the ID of a segment, giving it a new ID if it has none yet"""
+    try:
+        return segment_ids[segment]
+    except KeyError:
+        pass
+    with _segment_lock:
+        #Another thread may have given the segment its ID in the meantime
+        try:
+            return segment_ids[segment]
+        except KeyError:
+            #The segment is added before its ID, which other threads may read without the lock
+            segments.append(segment)
+            segment_ids[segment] = len(segments) - 1
+            return segment_ids[segment]
+
+
+class PhoneInventory:
+    """Features of the segments of one language, given as a dictionary of the segments
+    having each feature (or combination of features)"""
+
+    def __init__(self, language, classes):
+        self.language = language
+        self.features = {}
+        for features, members in classes.items():
+            for segment in members:
+                segment_id(segment)
+                self.features[segment] = self.features.get(segment, 0) | features
+        self._classes = {}
+        self._id_masks = None
+        inventories[language] = self
+
+    def mask(self, segment):
+        """Returns the feature bitmask of a segment (0 for unknown segments)"""
+        return self.features.get(segment, 0)
+
+    def has(self, segment, features):
+        """Returns True if the segment has all of the given features"""
+        return self.features.get(segment, 0) & features == features
+
+    def segments(self, features):
+        """Returns the set of segments having any of the given features"""
+        try:
+            return self._classes[features]
+        except KeyError:
+            members = frozenset(segment for segment, mask in self.features.items() if mask & features)
+            return self._classes.setdefault(features, members)
+
+    def mask_table(self):
+        """Returns the list of the feature bitmask of each segment ID"""
+        return [self.features.get(segment, 0) for segment in segments]
+
+    def id_masks(self):
+        """Returns a SegmentTable of the feature bitmask of each segment ID; segments not
+        in the inventory have the features of their longest prefix in it, e.g. /tʲ/ those of /t/"""
+        if self._id_masks is None:
+            def prefix_mask(segment):
+                prefix = longest_prefix(segment, self.features)
+                return self.features[prefix] if prefix is not None else 0
+            self._id_masks = SegmentTable(prefix_mask)
+        return self._id_masks
+
+    def describe(self, segment):
+        """Returns the names of the features of a segment"""
+        mask = self.mask(segment)
+        return [name for feature, name in feature_names.items() if mask & feature]
+
+    def __repr__(self):
+        return f'PhoneInventory({self.language!r}, {len(self.features)} segments)'
+
+
+#SEGMENT ARRAYS
+#A text can also be held as an array of segment IDs, in which each segment is a base
+#character together with its combining diacritics, modifier letters (ʲ, ʷ, ʰ, ː) and any
+#character joined to it by a tie bar, so that e.g. /ɖ͡ʐ/, /tʲ/ and /ʁ̥/ are single segments
+#which stages can transform without splitting them. Spaces between words are the
+#segment BOUNDARY_ID. The array is converted back to an IPA string only at the end:
+#   ids = encode(text)
+#   ids = stage_on_ids(ids)
+#   text = decode(ids)
+BOUNDARY_ID = segment_id(' ')
+segment_regex = re.compile('\\s|.(?:\u0361.|[\u0300-\u036fʲʷʰː])*', re.DOTALL)
+
+
+def split_segments(text):
+    """Returns the list of segments of a text"""
+    return segment_regex.findall(text)
+
+
+def encode(text):
+    """Returns the array of segment IDs of a text"""
+    found = segment_regex.findall(text)
+    try:
+        return array('I', map(segment_ids.__getitem__, found))
+    
+    #Give IDs to the new segments, in the order in which they occur
+    except KeyError:
+        for segment in found:
+            if segment not in segment_ids:
+                segment_id(segment)
+        return array('I', map(segment_ids.__getitem__, found))
+
+
+def decode(ids):
+    """Returns the text of an array of segment IDs"""
+    return ''.join(map(segments.__getitem__, ids))
+
+
+def iter_word_spans(ids):
+    """Yields the (start, end) indices of each word of an array of segment IDs,
+    i.e. of each run of segments between word boundaries"""
+    start = 0
+    n = len(ids)
+    while start <= n:
+        try:
+            end = ids.index(BOUNDARY_ID, start)
+        except ValueError:
+            end = n
+        if end > start:
+            yield start, end
+        start = end + 1
+
+
+def longest_prefix(segment, table):
+    """Returns the longest prefix of a segment which is a key of the table
+    (None if there is none), e.g. /t/ for /tʲ/"""
+    for end in range(len(segment), 0, -1):
+        if segment[:end] in table:
+            return segment[:end]
+    return None
+
+
+class SegmentTable(dict):
+    """Dictionary of a value for each segment ID, computed from the segment with
+    the given function when the ID is first looked up, so that the table also covers
+    segments which are only encoded later on"""
+
+    def __init__(self, function):
+        super().__init__()
+        self.function = function
+
+    def __missing__(self, i):
+        value = self[i] = self.function(segments[i])
+        return value
+
+
+def segment_map(mapping):
+    """Returns a SegmentTable of the ID of the segment to which each segment ID is changed
+    by a mapping of segments (e.g. a devoicing dictionary), applied to the longest prefix
+    of the segment in the mapping, so that e.g. {'z':'s'} changes /zʲ/ to /sʲ/"""
+    def change(segment):
+        prefix = longest_prefix(segment, mapping)
+        if prefix is None:
+            return segment_ids[segment]
+        return segment_id(mapping[prefix] + segment[len(prefix):])
+    return SegmentTable(change)
@@ -0,0 +1,198 @@
+#PER-STAGE PROFILING OF THE TRANSCRIPTION PIPELINES
+#Each stage of the transcription pipelines is decorated with @stage. When profiling is
+#enabled, every call of a stage records its wall time, its input and output size in
+#characters and, optionally, the peak memory it allocates:
+#   with profiling(memory=True):
+#       transcribe_es(text)
+#   print_stats()
+#   export_json('stages.json')
+#   export_pstats('stages.prof') #readable with pstats.Stats('stages.prof') or snakeviz
+#When profiling is disabled (the default), a stage only checks one global flag before calling the function.
+#Stages nested in other stages (e.g. the stages of transcribe_es) are timed separately,
+#and their time is excluded from the own time of the enclosing stage. Stages may be profiled
+#in several threads at once, but memory peaks are those of the whole process.
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+enabled = False
+track_memory = False
+
+#Whether enable() started tracemalloc, so that disable() stops it only then
+_started_tracing = False
+
+#Statistics of each stage called so far, by stage name
+stage_stats = {}
+
+#(file name, line number, function name) of each stage, identifying it in pstats
+stage_keys = {}
+
+#Stages currently running in each thread: [name, start time, time spent in nested stages,
+#traced memory at start, peak memory of nested stages and before them]
+_local = threading.local()
+
+#Lock held while adding to the statistics
+_stats_lock = threading.Lock()
+
+
+def _new_stats():
+    return {'calls':0, 'seconds':0.0, 'own_seconds':0.0, 'chars_in':0, 'chars_out':0,
+            'peak_bytes':0, 'callers':{}}
+
+
+def stage(function):
+    """Decorator recording the calls of a pipeline stage while profiling is enabled;
+    the stage is named after the module and function name"""
+    name = f'{function.__module__}.{function.__qualname__}'
+    code = function.__code__
+    stage_keys[name] = (code.co_filename, code.co_firstlineno, function.__name__)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+        return _profiled_call(name, function, args, kwargs)
+    return wrapper
+
+
+def _running():
+    """Returns the list of the stages running in the current thread"""
+    try:
+        return _local.running
+    except AttributeError:
+        _local.running = []
+        return _local.running
+
+
+def _profiled_call(name, function, args, kwargs):
+    """Calls a stage function, recording its statistics"""
+    running = _running()
+    memory = False
+    if track_memory:
+        import tracemalloc
+        memory = tracemalloc.is_tracing()
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        
+        #Keep the peak reached so far by the enclosing stage, before it is reset
+        if running:
+            running[-1][4] = max(running[-1][4], peak)
+        start_memory = current
+        tracemalloc.reset_peak()
+    else:
+        start_memory = 0
+    frame = [name, time.perf_counter(), 0.0, start_memory, 0]
+    running.append(frame)
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        running.pop()
+        seconds = time.perf_counter() - frame[1]
+        if memory:
+            peak = max(tracemalloc.get_traced_memory()[1], frame[4])
+        else:
+            peak = 0
+        
+        #The text is the first string argument (the second of a method)
+        text = next((arg for arg in args if isinstance(arg, str)), None)
+
+        with _stats_lock:
+            stats = stage_stats.setdefault(name, _new_stats())
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['own_seconds'] += seconds - frame[2]
+            stats['peak_bytes'] = max(stats['peak_bytes'], peak - start_memory)
+            if text is not None:
+                stats['chars_in'] += len(text)
+
+            #Pass the time and memory peak on to the enclosing stage
+            if running:
+                caller = running[-1]
+                caller[2] += seconds
+                caller[4] = max(caller[4], peak)
+                stats['callers'][caller[0]] = stats['callers'].get(caller[0], 0) + 1
+    if isinstance(result, str):
+        with _stats_lock:
+            stats['chars_out'] += len(result)
+    return result
+
+
+def enable(memory=False):
+    """Enables profiling of all stages; if memory == True, also records the peak memory
+    allocated by each stage (with tracemalloc, which slows down the stages considerably)"""
+    global enabled, track_memory, _started_tracing
+    enabled = True
+    track_memory = memory
+    if memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+
+
+def disable():
+    """Disables profiling, keeping the statistics recorded so far; tracemalloc is
+    stopped only if enable() started it"""
+    global enabled, track_memory, _started_tracing
+    if _started_tracing:
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _started_tracing = False
+    enabled = False
+    track_memory = False
+
+
+def reset():
+    """Clears the statistics recorded so far"""
+    stage_stats.clear()
+
+
+@contextmanager
+def profiling(memory=False):
+    """Context manager enabling profiling (after clearing previous statistics) within its block"""
+    reset()
+    enable(memory=memory)
+    try:
+        yield stage_stats
+    finally:
+        disable()
+
+
+def get_stats():
+    """Returns a copy of the statistics of each stage called so far, by stage name"""
+    return {name:{key:(dict(value) if isinstance(value, dict) else value) for key, value in stats.items()}
+            for name, stats in stage_stats.items()}
+
+
+def print_stats(sort='own_seconds'):
+    """Prints a table of the statistics of each stage, sorted by the given statistic"""
+    print(f'{"stage":<45} {"calls":>8} {"seconds":>10} {"own":>10} {"chars in":>12} {"chars out":>12} {"peak MB":>8}')
+    for name, stats in sorted(stage_stats.items(), key=lambda item: item[1][sort], reverse=True):
+        print(f'{name:<45} {stats["calls"]:>8} {stats["seconds"]:>10.4f} {stats["own_seconds"]:>10.4f} '
+              f'{stats["chars_in"]:>12,} {stats["chars_out"]:>12,} {stats["peak_bytes"] / 2**20:>8.1f}')
+
+
+def export_json(path):
+    """Writes the statistics of each stage to a JSON file"""
+    import json
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(get_stats(), f, indent=2)
+
+
+def export_pstats(path):
+    """Writes the statistics of each stage to a file in the format of cProfile,
+    which can be loaded with pstats.Stats(path)"""
+    import marshal
+    profile = {}
+    for name, stats in stage_stats.items():
+        callers = {}
+        for caller, calls in stats['callers'].items():
+            #Time per caller is not recorded separately, so it is shared out by number of calls
+            share = calls / stats['calls']
+            callers[stage_keys[caller]] = (calls, calls, stats['own_seconds'] * share, stats['seconds'] * share)
+        profile[stage_keys[name]] = (stats['calls'], stats['calls'], stats['own_seconds'], stats['seconds'], callers)
+    with open(path, 'wb') as f:
+        marshal.dump(profile, f)
@@ -0,0 +1,56 @@
+#MULTI-PATTERN REWRITING
+#Applies an ordered list of literal replacement rules, with the same result as applying
+#each rule to the whole text in turn (like a loop calling re.sub once per key of a mapping
+#dictionary), compiled once at load time:
+#   rewrite = Rewriter(list(digraphs.items()) + list(single_characters.items()))
+#   text = rewrite(text)
+#Consecutive single-character rules which do not affect each other's output are grouped
+#into one translation table, converting a short string (e.g. a single word) in one scan.
+#Longer texts are rewritten with one str.replace call per rule, each of which scans the
+#text in C much faster than a single regex scan calling back into Python at every match.
+
+
+def interferes(earlier, later):
+    """Returns True if the single-character rule later would give a different result
+    when applied simultaneously with the earlier rule rather than after it"""
+    return later[0] == earlier[0] or later[0] in earlier[1]
+
+
+class Rewriter:
+    """Compiled ordered list of (pattern, replacement) rules with literal patterns"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+        #Group the rules into steps: single multi-character rules, and runs of consecutive
+        #single-character rules, starting a new run at each rule which interferes with
+        #a rule of the current run
+        self.steps = []
+        for rule in self.rules:
+            if rule[0] == '':
+                raise ValueError('Empty pattern in rewrite rules')
+            if len(rule[0]) > 1:
+                self.steps.append([rule])
+            elif (self.steps and len(self.steps[-1][0][0]) == 1
+                  and not any(interferes(earlier, rule) for earlier in self.steps[-1])):
+                self.steps[-1].append(rule)
+            else:
+                self.steps.append([rule])
+        self._tables = [str.maketrans(dict(step)) if len(step[0][0]) == 1 else None
+                        for step in self.steps]
+
+    def __call__(self, text):
+        """Applies the rules to text"""
+        for step, table in zip(self.steps, self._tables):
+
+            #Translating a string costs about as much per character as one str.replace call
+            #costs in total, so translation tables are used for strings shorter than their number of rules
+            if table is not None and len(text) < len(step):
+                text = text.translate(table)
+            else:
+                for pattern, replacement in step:
+                    text = text.replace(pattern, replacement)
+        return text
+
+    def __repr__(self):
+        return f'Rewriter({len(self.rules)} rules in {len(self.steps)} steps)'
@@ -1,7 +1,14 @@
 #AUTOMATIC SERBIAN LATIN-CYRILLIC SCRIPT CONVERSION
 #Written by Philip Georgis (2020)
 
+import argparse
+import io
+import math
 import re
+import sys
+from collections import Counter
+from rewriter import Rewriter
+from profiling import stage
 
 
 #DICTIONARIES OF CYRILLIC/LATIN CHARACTER EQUIVALENCIES 
@@ -189,6 +196,34 @@ latin_digraph_dict = {'LJ':'Љ',
                       'Qu':'Кв',
                       'qu':'кв'}
 
+#PRECOMPILED CONVERSION ENGINE
+#Each direction is a compiled Rewriter (see rewriter.py), converting the single characters
+#of a word with a translation table. Words are converted independently of each other,
+#so each distinct word of a text is converted only once.
+
+#Palatalized segments with equivalents in Serbo-Croatian,
+#after conversion of single characters to Latin
+palatal_segs = {"N’":'Nj', #Нь --> N’ --> Nj
+                "n’":'nj', #нь --> n’ --> nj
+                "L’":'Lj', #Ль --> L’ --> Lj
+                "l’":'lj', #ль --> l’ --> lj
+                "Č’":'Ć', #Чь --> Č’ --> Ć
+                "č’":'ć', #чь --> č’ --> ć
+                'C’':'Ć', #Ць --> C’ --> Ć
+                'c’':'ć', #ць --> c’ --> ć
+                "Dz’":'Đ', #Дзь --> Dz’ --> Đ
+                "dz’":'đ' #дзь --> dz’ --> đ
+                }
+
+#Cyrillic to Latin: single characters, then palatalized segments
+cyrillic_latin_rewriter = Rewriter(list(cyrillic_latin_dict.items()) + list(palatal_segs.items()))
+
+#Latin to Cyrillic: digraphs, then single characters
+#(two-character keys of latin_cyrillic_dict are all converted as digraphs first)
+latin_cyrillic_rewriter = Rewriter(list(latin_digraph_dict.items())
+                                   + [(ch, latin_cyrillic_dict[ch]) for ch in latin_cyrillic_dict if len(ch) == 1])
+
+
 def word_is_caps(word):
     """Returns True if a word consists of all uppercase letters (all caps)"""
     if word == word.upper():
@@ -197,162 +232,482 @@ def word_is_caps(word):
         return False
 
 
-def convert_to_latin(cyrillic_text):
-    """Converts a Serbian Cyrillic text to Serbian Latin script"""
+def cyrillic_word_to_latin(word):
+    """Converts a single Serbian Cyrillic word to Latin"""
+    #Convert single characters, then non-Serbian Cyrillic palatalized segments into Serbian equivalents
+    tr_word = cyrillic_latin_rewriter(word)
     
-    #Split text by lines
-    cyrillic_text = cyrillic_text.split('\n')
+    #If the original word was all uppercase, ensure that transcribed
+    #word is also all uppercase (e.g. <ЉУБАВ> --> <LjUBAV> --> <LJUBAV>)
+    if word_is_caps(word) == True:
+        tr_word = tr_word.upper()
     
-    #Segment the text into words, add a new line character
-    cyrillic_text = [line.split() + ['\n'] for line in cyrillic_text]
+    return tr_word
+
+
+def latin_word_to_cyrillic(word):
+    """Converts a single Serbian Latin word to Cyrillic"""
+    
+    #Convert two-character sequences first, then single characters
+    tr_word = latin_cyrillic_rewriter(word)
+    
+    #If original word was fully uppercase, ensure that the transcribed word is also
+    #(e.g. <XI> --> <КсИ> --> <КСИ>)
+    if word_is_caps(word) == True:
+        tr_word = tr_word.upper()
+    
+    return tr_word
+
+
+class WordConversions(dict):
+    """Dictionary of the conversions of the words of a text,
+    converting each word with convert_word when first looked up"""
+    
+    def __init__(self, convert_word):
+        self.convert_word = convert_word
+    
+    def __missing__(self, word):
+        tr_word = self.convert_word(word)
+        self[word] = tr_word
+        return tr_word
+
+
+def convert_words(text, convert_word):
+    """Segments the text into words, adding a new line character after each line,
+    and converts each word with convert_word"""
+    words = []
+    for line in text.split('\n'):
+        words.extend(line.split())
+        words.append('\n')
     
-    #Iterate through lines and words and transcribe each individually
-    transcribed = []
-    for line in cyrillic_text:
-        for word in line:
-            #Check whether the original word is all uppercase
-            all_caps = word_is_caps(word)
-            
-            #Iterate through the characters of the word and transcribe each into Latin
-            tr_word = []
-            for ch in word:
-                tr_word.append(cyrillic_latin_dict.get(ch, ch))
-            
-            #Join the characters of the transcribed word
-            tr_word = ''.join(tr_word)
-            
-            #Palatalized segments with equivalents in Serbo-Croatian
-            #Will already be partially converted to Latin characters
-            palatal_segs = {"N’":'Nj', #Нь --> N’ --> Nj
-                            "n’":'nj', #нь --> n’ --> nj
-                            "L’":'Lj', #Ль --> L’ --> Lj
-                            "l’":'lj', #ль --> l’ --> lj
-                            "Č’":'Ć', #Чь --> Č’ --> Ć
-                            "č’":'ć', #чь --> č’ --> ć
-                            'C’':'Ć', #Ць --> C’ --> Ć
-                            'c’':'ć', #ць --> c’ --> ć
-                            "Dz’":'Đ', #Дзь --> Dz’ --> Đ
-                            "dz’":'đ' #дзь --> dz’ --> đ
-                            }
-            
-            #Convert non-Serbian Cyrillic palatalized segments into Serbian equivalents
-            for seg in palatal_segs:
-                tr_word = re.sub(seg, palatal_segs[seg], tr_word)
-            
-            #If the original word was all uppercase, ensure that transcribed
-            #word is also all uppercase
-            if all_caps == True:
-                tr_word = tr_word.upper()
-            
-            #Add fully transcribed word to list of transcribed words
-            transcribed.append(tr_word)
-            
     #Return the words of the converted text joined by white spaces
-    return ' '.join(transcribed)
+    return ' '.join(map(WordConversions(convert_word).__getitem__, words))
+
 
+@stage
+def convert_to_latin(cyrillic_text):
+    """Converts a Serbian Cyrillic text to Serbian Latin script"""
+    return convert_words(cyrillic_text, cyrillic_word_to_latin)
 
+
+@stage
 def convert_to_cyrillic(latin_text):
     """Converts a Serbian Latin text to Serbian Cyrillic script"""
+    return convert_words(latin_text, latin_word_to_cyrillic)
+
+
+
+#Keys for specifying the source script
+cyrillic_script_keys = ['cyrillic', 'cyr', 'c', 'ćirilica', 'ć', 'ћирилица', 'ћир', 'ћ']
+latin_script_keys = ['latin', 'lat', 'l', 'latinica', 'латиница', 'лат', 'л']
+
+
+def script_counts(text):
+    """Returns the numbers of Cyrillic and Latin characters in the text,
+    counting the characters of each distinct word once"""
+    cyrillic_count, latin_count = 0, 0
+    for word, n in Counter(text.split()).items():
+        for ch in word:
+            if ch in cyrillic_latin_dict:
+                cyrillic_count += n
+            elif ch in latin_cyrillic_dict:
+                latin_count += n
+    return cyrillic_count, latin_count
+
+
+def script_keys():
+    """Returns the recognized source script keys, for error messages"""
+    cyrillic_keys = ', '.join([f'"{key}"' for key in cyrillic_script_keys])
+    latin_keys = ', '.join([f'"{key}"' for key in latin_script_keys])
+    return f'Cyrillic: {cyrillic_keys}\nLatin: {latin_keys}'
+
+
+def script_error():
+    """Prints the recognized source script keys after an error"""
+    print(script_keys())
+
+
+class ScriptDetectionError(ValueError, TypeError):
+    """Raised when the source script of a text cannot be detected
+    (also a TypeError, which was raised before)"""
+    
+    def __init__(self):
+        super().__init__(f'unable to determine source script of text! Please specify:\n{script_keys()}')
+
+
+#SCRIPT DETECTION
+#Text is read in blocks of detection_block_size characters, taking the difference between the
+#numbers of Cyrillic and Latin characters in each block as a sample. Once at least
+#detection_min_blocks blocks are read, the script is decided as soon as the mean difference is
+#significantly different from zero: mean / (standard deviation / sqrt(blocks)) > detection_z (p < 0.001),
+#or else after detection_max_blocks blocks as the script of the majority of the characters read.
+#detect_script (used by convert_text) samples blocks across the whole text, whereas
+#convert_stream reads them from the start of the text: THE TWO MAY DETECT DIFFERENT SCRIPTS
+#when the beginning of a text is mostly in one script and the rest in the other
+detection_z = 3.29
+detection_block_size = 256
+detection_min_blocks = 16
+detection_max_blocks = 4096
+
+
+class ScriptDetector:
+    """Sequential test of whether a text is mostly written in Cyrillic or Latin script"""
+    
+    def __init__(self):
+        self.cyrillic_count = 0
+        self.latin_count = 0
+        self.blocks = 0
+        self.diff_sum = 0
+        self.diff_squares = 0
+        self.script = None
+        self.rest = ''
+    
+    def add_block(self, block):
+        """Counts the script characters of one block of text; returns the script
+        ('cyrillic' or 'latin') once it is decided, else None"""
+        cyrillic_count, latin_count = script_counts(block)
+        self.cyrillic_count += cyrillic_count
+        self.latin_count += latin_count
+        diff = cyrillic_count - latin_count
+        self.blocks += 1
+        self.diff_sum += diff
+        self.diff_squares += diff**2
+        if self.blocks >= detection_min_blocks and self.diff_sum != 0:
+            variance = (self.diff_squares - self.diff_sum**2 / self.blocks) / (self.blocks - 1)
+            if self.diff_sum**2 / self.blocks > detection_z**2 * variance:
+                self.script = self.majority()
+        if self.script is None and self.blocks >= detection_max_blocks:
+            self.script = self.majority()
+        return self.script
     
-    #Split text by lines
-    latin_text = latin_text.split('\n')
+    def update(self, text):
+        """Counts the script characters of the next piece of text, block by block,
+        until the script is decided; returns the script once decided, else None.
+        Blocks continue across pieces, the rest of the last piece being kept for the next"""
+        text = self.rest + text
+        i = 0
+        while self.script is None and len(text) - i >= detection_block_size:
+            self.add_block(text[i:i+detection_block_size])
+            i += detection_block_size
+        self.rest = text[i:] if self.script is None else ''
+        return self.script
     
-    #Segment the text into words, add a new line character
-    latin_text = [line.split() + ['\n'] for line in latin_text]
+    def finish(self):
+        """Counts the rest of the text given to update; returns the script if decided,
+        else the script of the majority of characters (None if tied)"""
+        if self.rest and self.script is None:
+            self.add_block(self.rest)
+        self.rest = ''
+        return self.script or self.majority()
     
-    #Iterate through lines and words and transcribe each individually
+    def majority(self):
+        """Returns the script of the majority of characters counted so far, or None if tied"""
+        if self.cyrillic_count > self.latin_count:
+            return 'cyrillic'
+        elif self.latin_count > self.cyrillic_count:
+            return 'latin'
+        return None
+
+
+@stage
+def detect_script(text):
+    """Returns the script ('cyrillic' or 'latin') of the majority of characters of the text,
+    or None if neither is. Blocks are sampled evenly across the text until either script
+    is significantly in the majority, so usually only a small part of the text is read.
+    Note that convert_stream, which cannot look ahead, reads blocks from the start of the
+    text instead, so the two may detect different scripts in a text of which the first part
+    is mostly in the other script than the rest."""
+    detector = ScriptDetector()
+    n_blocks = -(-len(text) // detection_block_size)
+    
+    #Visit blocks with a stride close to the golden ratio of the number of blocks
+    #(coprime to it, so that every block is visited once), spreading the sample across the text
+    stride = max(1, round(n_blocks * 0.618))
+    while math.gcd(stride, n_blocks) > 1:
+        stride += 1
+    for i in range(n_blocks):
+        start = (i * stride) % n_blocks * detection_block_size
+        if detector.add_block(text[start:start+detection_block_size]) is not None:
+            return detector.script
+    
+    #Without a significant difference, fall back to the majority of the characters read
+    return detector.majority()
+
+
+def paragraph_scripts(scripts):
+    """Replaces undecided scripts (None) of paragraphs by the script of the previous paragraph,
+    or of the first decided paragraph for leading ones"""
+    decided = [script for script in scripts if script is not None]
+    if not decided:
+        return scripts
+    script = decided[0]
+    filled = []
+    for paragraph_script in scripts:
+        if paragraph_script is not None:
+            script = paragraph_script
+        filled.append(script)
+    return filled
+
+
+def word_converter(source_script):
+    """Returns the function converting single words from the source script"""
+    if source_script.lower() in cyrillic_script_keys:
+        return cyrillic_word_to_latin
+    elif source_script.lower() in latin_script_keys:
+        return latin_word_to_cyrillic
+    raise ValueError(f'unrecognized script key "{source_script}". Please use one of the recognized keys:\n{script_keys()}')
+
+
+@stage
+def convert_paragraphs(text):
+    """Converts each paragraph of the text (separated by blank lines) from its own detected script"""
+    
+    #Segment the text into paragraphs of lines of words; blank lines end a paragraph
+    paragraphs = [[]]
+    for line in text.split('\n'):
+        words = line.split()
+        if words and paragraphs[-1] and not paragraphs[-1][-1]:
+            paragraphs.append([])
+        paragraphs[-1].append(words)
+    
+    scripts = paragraph_scripts([detect_script(' '.join([' '.join(line) for line in paragraph]))
+                                 for paragraph in paragraphs])
+    if None in scripts:
+        raise ScriptDetectionError
+    
+    #Convert each word from the script of its paragraph, adding a new line character after each line
+    conversions = {script:WordConversions(word_converter(script)) for script in set(scripts)}
     transcribed = []
-    for line in latin_text:
-        for word in line:
-            tr_word = word[:]
-            
-            #Check if the word is all uppercase
-            all_caps = word_is_caps(word)
-            
-            #Convert two-character sequences to Cyrillic first
-            for digraph in latin_digraph_dict:
-                tr_word = re.sub(digraph, latin_digraph_dict[digraph], tr_word)
-                
-            #Then convert remaining single characters to Cyrillic
-            for ch in latin_cyrillic_dict:
-                tr_word = re.sub(ch, latin_cyrillic_dict[ch], tr_word)
-                        
-            #Join together the transcribed characters
-            tr_word = ''.join(tr_word)
-            
-            #If original word was fully uppercase, ensure that the transcribed word is also
-            if all_caps == True:
-                tr_word = tr_word.upper()
-            
-            #Add fully transcribed word to list of transcribed words
-            transcribed.append(tr_word)
-            
-    #Return the words of the converted text joined by white spaces
+    for paragraph, script in zip(paragraphs, scripts):
+        for words in paragraph:
+            transcribed.extend(map(conversions[script].__getitem__, words))
+            transcribed.append('\n')
     return ' '.join(transcribed)
 
 
-
-def convert_text(text, source_script=None):
+@stage
+def convert_text(text, source_script=None, per_paragraph=False):
     """Converts text automatically in either direction"""
-    """If source_script is unspecified (= None), the source script will be detected automatically"""
+    """If source_script is unspecified (= None), the source script will be detected automatically,
+    for each paragraph (separated by blank lines) separately if per_paragraph == True"""
     
-    #Keys for specifying the source script
-    cyrillic = ['cyrillic', 'cyr', 'c', 'ćirilica', 'ć', 'ћирилица', 'ћир', 'ћ']
-    latin = ['latin', 'lat', 'l', 'latinica', 'латиница', 'лат', 'л']
-    cyrillic_keys = ', '.join([f'"{key}"' for key in cyrillic])
-    latin_keys = ', '.join([f'"{key}"' for key in latin])
+    #Nothing to convert
+    if text == '':
+        return ''
     
     #Try to automatically detect the source script if none is specified
     if source_script == None:
-        
-        #Determine proportions of characters belonging to each script
-        cyrillic_count, latin_count = 0, 0
-        count = len(text)
-        for ch in text:
-            if ch in cyrillic_latin_dict:
-                cyrillic_count += 1
-            elif ch in latin_cyrillic_dict:
-                latin_count += 1
-        cyrillic_count /= count
-        latin_count /= count
+        if per_paragraph == True:
+            return convert_paragraphs(text)
         
         #Set the source as the script representing the majority of characters
-        if cyrillic_count > latin_count:
-            source = 'cyrillic'
-        elif latin_count > cyrillic_count:
-            source = 'latin'
+        source = detect_script(text)
         
         #If proportions of Latin and Cyrillic characters in text are equal, raise an error
-        else:
-            print('Error: unable to determine source script of text! Please specify:')
-            print(f'Cyrillic: {cyrillic_keys}')
-            print(f'Latin: {latin_keys}')
-            raise TypeError
+        if source is None:
+            raise ScriptDetectionError
     
     #Otherwise use user-specified source script
     else:
         source = source_script
     
     #Convert the text according to specified or detected source script
-    if source.lower() in cyrillic:
+    if source.lower() in cyrillic_script_keys:
         return convert_to_latin(text)
     
-    elif source.lower() in latin:
+    elif source.lower() in latin_script_keys:
         return convert_to_cyrillic(text)
     
     else:
         print('Error: unrecognized script key. Please use one of the recognized keys:')
-        print(f'Cyrillic: {cyrillic_keys}')
-        print(f'Latin: {latin_keys}')
+        script_error()
 
 
+#STREAMING CONVERSION
+#Converts files of any size in bounded memory, preserving whitespace exactly
 
+#Maximum number of distinct words whose conversions are kept by convert_stream
+stream_memo_size = 100000
 
-def main():
-    text = input('Enter Serbo-Croatian text below:\n')
-    print('\n')
-    print(convert_text(text))
+whitespace_regex = re.compile(r'(\s+)')
+
+#Whitespace including a blank line, separating paragraphs
+paragraph_break_regex = re.compile(r'(\n[^\S\n]*\n\s*)')
+
+#Characters which may continue a digraph or palatalized segment begun by the character before them
+stream_continuations = set('JjŽžUuЗзЬь’')
+
+
+def stream_cut(text):
+    """Returns the position at which to cut text of a stream which has no spaces between
+    words: if it is whitespace, after its last line break if it holds a blank line and else
+    before it, so as not to split a paragraph break; otherwise near its end but not inside
+    a digraph. Such 'words' (of over chunk_size characters) are converted piece by piece"""
+    if text.isspace():
+        i = text.rfind('\n')
+        if '\n' in text[:i]:
+            return i + 1
+    else:
+        i = len(text) - 1
+        while i > 0 and text[i] in stream_continuations:
+            i -= 1
+    return i if i > 0 else len(text)
+
+
+def convert_stream(infile, outfile, source_script=None, chunk_size=2**20, per_paragraph=False):
+    """Reads text from the file object infile in chunks of about chunk_size characters
+    and writes its conversion to outfile as it goes, preserving the original whitespace.
+    If source_script is unspecified (= None), the source script is detected as the text
+    is read, for each paragraph (separated by blank lines) separately if per_paragraph == True;
+    text is held back only until the script of its paragraph is decided, which happens
+    after at most detection_max_blocks blocks (see ScriptDetector). Blocks are read from
+    the start of the text, so the script detected may differ from that of convert_text,
+    which samples the whole text (see detect_script); give source_script to be sure.
+    Returns the source script (of the last paragraph)."""
+    conversions = {}
     
+    def write(text, script):
+        """Converts text from script and writes it to outfile"""
+        if script not in conversions:
+            conversions[script] = WordConversions(word_converter(script))
+        words = conversions[script]
+        if len(words) > stream_memo_size:
+            words.clear()
+        parts = whitespace_regex.split(text)
+        parts[::2] = map(words.__getitem__, parts[::2])
+        outfile.write(''.join(parts))
+    
+    if source_script is not None:
+        word_converter(source_script)
+    script = source_script
+    detector = ScriptDetector()
+    held = []
+    held_size = 0
+    unconverted = False
+    pending = ''
+    while True:
+        chunk = infile.read(chunk_size)
+        
+        #Keep a word cut at the end of the chunk, and the whitespace before it,
+        #for the next chunk (looking for the cut in the new chunk only)
+        if chunk:
+            i = len(chunk)
+            while i > 0 and not chunk[i-1].isspace():
+                i -= 1
+            while i > 0 and chunk[i-1].isspace():
+                i -= 1
+            if i > 0:
+                text, pending = pending + chunk[:i], chunk[i:]
+            else:
+                text, pending = '', pending + chunk
+            
+            #Text without spaces between words (e.g. a long run of whitespace or of binary
+            #data) is passed on in pieces once it outgrows the chunk size
+            if len(pending) > chunk_size:
+                i = stream_cut(pending)
+                text, pending = text + pending[:i], pending[i:]
+        else:
+            text, pending = pending, ''
         
-main()
+        if source_script is not None:
+            write(text, script)
+        else:
+            pieces = paragraph_break_regex.split(text) if per_paragraph == True else [text]
+            for k, piece in enumerate(pieces):
+                #Paragraph text: convert it once the script of the paragraph is decided
+                if k % 2 == 0:
+                    if detector.script is None and detector.update(piece) is not None:
+                        script = detector.script
+                        for held_text in held:
+                            write(held_text, script)
+                        held = []
+                    if detector.script is None:
+                        held.append(piece)
+                        held_size += len(piece)
+                    else:
+                        write(piece, script)
+                
+                #Paragraph break: an undecided paragraph takes the script of the majority of its
+                #characters, or else that of the previous paragraph (or of the next decided one)
+                else:
+                    if detector.script is None:
+                        script = detector.finish() or script
+                        if script is not None:
+                            for held_text in held:
+                                write(held_text, script)
+                            held = []
+                            held_size = 0
+                    if held:
+                        held.append(piece)
+                        held_size += len(piece)
+                    else:
+                        outfile.write(piece)
+                    detector = ScriptDetector()
+            
+            #Text held back for too long without any script decided, which has no Cyrillic
+            #or Latin characters (e.g. only numbers), is the same in either script
+            if held_size > detection_max_blocks * detection_block_size and script_counts(''.join(held)) == (0, 0):
+                unconverted = unconverted or bool(''.join(held).strip())
+                outfile.write(''.join(held))
+                held = []
+                held_size = 0
+        
+        if not chunk:
+            break
+    
+    #End of the text
+    if held or unconverted:
+        script = detector.finish() or script
+        if script is None:
+            if unconverted or ''.join(held).strip():
+                raise ScriptDetectionError
+            outfile.write(''.join(held))
+        else:
+            for held_text in held:
+                write(held_text, script)
+    return script
+
 
+def main():
+    parser = argparse.ArgumentParser(description='Converts Serbo-Croatian text between Cyrillic and Latin script, preserving whitespace')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='input file (default: standard input)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='output file (default: standard output)')
+    parser.add_argument('-s', '--source', choices=cyrillic_script_keys + latin_script_keys,
+                        help='source script (default: detected automatically)')
+    parser.add_argument('--chunk-size', type=int, default=2**20,
+                        help='number of characters read at a time')
+    parser.add_argument('-p', '--per-paragraph', action='store_true',
+                        help='detect the source script of each paragraph (separated by blank lines) separately')
+    args = parser.parse_args()
+    
+    #Files are read and written without translating line endings
+    if args.input == '-':
+        if sys.stdin.isatty():
+            print('Enter Serbo-Croatian text below (end with Ctrl-D):', file=sys.stderr)
+        infile = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    else:
+        infile = open(args.input, encoding='utf-8', newline='')
+    if args.output == '-':
+        outfile = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='', write_through=True)
+    else:
+        outfile = open(args.output, 'w', encoding='utf-8', newline='')
+    
+    #An error message is printed to standard error if the source script cannot be detected
+    try:
+        convert_stream(infile, outfile, args.source, args.chunk_size, args.per_paragraph)
+    except ScriptDetectionError as error:
+        print(f'Error: {error}', file=sys.stderr)
+        sys.exit(1)
+    finally:
+        #Standard input and output are detached from rather than closed
+        for f, name in [(infile, args.input), (outfile, args.output)]:
+            if name == '-':
+                f.detach()
+            else:
+                f.close()
+    
+        
+if __name__ == '__main__':
+    main()
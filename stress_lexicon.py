@@ -0,0 +1,144 @@
+#STRESS LEXICONS FOR AUTOMATIC ACCENTUATION
+#Vowel reduction in Ukrainian, Belarusian and Bulgarian needs the stress of each word to be
+#marked with the combining acute accent, which ordinary text lacks. A stress lexicon built
+#from a list of accented words (e.g. <голова́>) adds the accent to each word of a text which
+#is not already accented, before the text is converted to IPA:
+#   build_stress_lexicon(accented_words, 'uk_stress.lex')
+#   stress = StressLexicon('uk_stress.lex')
+#   transcribe_uk(text, stress_lexicon=stress)
+#The lexicon is a compiled table (see compiled_table.py), so it is memory-mapped and
+#shared by all processes using it; recently seen tokens are also kept in memory.
+#Keys are the lowercased words without accents and values the positions of the accents in
+#the word, as arrays of uint16, since the accent follows the stressed vowel.
+
+import hashlib
+import re
+from array import array
+from compiled_table import MappedTable, write_table
+from profiling import stage
+
+stress_mark = '́'
+
+#Number of distinct tokens of which the accented form is kept in memory
+memo_size = 2**16
+
+#A token is split into leading punctuation, the word itself and trailing punctuation
+_token_regex = re.compile(r'(\W*)(.*?)(\W*)', re.DOTALL)
+_whitespace_regex = re.compile(r'(\s+)')
+
+
+def _stress_positions(word):
+    """Returns the word without accents and the positions of its accents in that word"""
+    positions = []
+    plain = []
+    for ch in word:
+        if ch == stress_mark:
+            positions.append(len(plain))
+        else:
+            plain.append(ch)
+    return ''.join(plain), positions
+
+
+def build_stress_lexicon(words, path):
+    """Compiles the stress lexicon of the iterable of accented words to path; for words
+    spelled alike but stressed differently, the first one is kept. Returns the number of entries"""
+    records = {}
+    for word in words:
+        word = word.strip().lower()
+        if stress_mark not in word:
+            continue
+        plain, positions = _stress_positions(word)
+        key = plain.encode('utf-8')
+        if key not in records:
+            records[key] = array('H', positions).tobytes()
+    
+    #Checksum of the contents, which distinguishes lexicons in the keys of the word caches
+    digest = hashlib.sha256()
+    for key, value in records.items():
+        digest.update(key + b'\0' + value + b'\0')
+    write_table(path, {'stress_mark':stress_mark, 'checksum':digest.hexdigest()[:16]}, records)
+    return len(records)
+
+
+class StressLexicon(MappedTable):
+    """Read-only memory-mapped stress lexicon compiled by build_stress_lexicon"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._memo = {}
+
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_memo'] = {}
+        return state
+
+
+    def __repr__(self):
+        return f'StressLexicon(checksum={self.header["checksum"]!r})'
+
+
+    def __eq__(self, other):
+        return isinstance(other, StressLexicon) and self.header['checksum'] == other.header['checksum']
+
+
+    def __hash__(self):
+        return hash(self.header['checksum'])
+
+
+    def __contains__(self, word):
+        return self.get(word.lower().encode('utf-8')) is not None
+
+
+    def stress(self, word):
+        """Returns the positions of the accents of a word without accents, or None if
+        it is not in the lexicon"""
+        positions = self.get(word.lower().encode('utf-8'))
+        if positions is None:
+            return None
+        return array('H', positions).tolist()
+
+
+    def _accentuate_word(self, token):
+        """Adds the accent to a word with any punctuation around it, unless it is
+        already accented or not in the lexicon"""
+        if stress_mark in token or not token:
+            return token
+        leading, word, trailing = _token_regex.fullmatch(token).groups()
+        positions = self.stress(word)
+        if positions is None or len(word.lower()) != len(word):
+            return token
+        for position in reversed(positions):
+            word = word[:position] + stress_mark + word[position:]
+        return leading + word + trailing
+
+
+    def _accentuate_token(self, token):
+        """Adds the accent to the words of a token without spaces, which may
+        contain other whitespace (e.g. line breaks)"""
+        return ''.join([self._accentuate_word(part) for part in _whitespace_regex.split(token)])
+
+
+    def accentuate(self, text):
+        """Adds the accent to each word of the text which is in the lexicon and
+        not already accented, preserving case, punctuation and whitespace"""
+        memo = self._memo
+        tokens = text.split(' ')
+        try:
+            return ' '.join([memo[token] for token in tokens])
+        except KeyError:
+            pass
+        
+        #Accentuate the new tokens, forgetting the old ones if there are too many
+        new = set(tokens).difference(memo)
+        if len(memo) + len(new) > memo_size:
+            memo.clear()
+        for token in new:
+            memo[token] = self._accentuate_token(token)
+        return ' '.join([memo[token] for token in tokens])
+
+
+@stage
+def add_stress(text, stress_lexicon):
+    """Marks the stress of the words of the text found in the stress lexicon"""
+    return stress_lexicon.accentuate(text)
@@ -0,0 +1,43 @@
+import random
+import unittest
+from benchmarks import reference_be_obstruent_assimilation, repeat_to_size, samples
+from transcribe_belarusian import (be2ipa, be_palatalization, be_stress, be_vowel_reduction,
+                                   adjust_soft_vowels, be_final_devoicing, be_obstruent_assimilation)
+
+
+def assimilation_input(text):
+    """Output of the pipeline steps before obstruent assimilation"""
+    return be_final_devoicing(adjust_soft_vowels(be_vowel_reduction(be_stress(be_palatalization(be2ipa(text))))))
+
+
+class TestBelarusianObstruentAssimilation(unittest.TestCase):
+
+    def test_reference_equivalence(self):
+        text = repeat_to_size(assimilation_input(samples['be']), 5_000)
+        self.assertEqual(be_obstruent_assimilation(text), reference_be_obstruent_assimilation(text))
+
+        #Random words of the letters of the sample (without initial or doubled soft signs)
+        rng = random.Random(0)
+        letters = sorted(set(samples['be'].lower()) - set(' ,.'))
+        initials = [ch for ch in letters if ch != 'ь']
+        def word():
+            return (rng.choice(initials) + ''.join(rng.choice(letters) for _ in range(rng.randint(1, 6)))).replace('ьь', 'ь')
+        for _ in range(2_000):
+            text = assimilation_input(' '.join(word() for _ in range(rng.randint(1, 4))))
+            self.assertEqual(be_obstruent_assimilation(text), reference_be_obstruent_assimilation(text), text)
+
+
+    def test_rules(self):
+        #Voicing spreads leftwards through a cluster; /v/ does not trigger it
+        self.assertEqual(be_obstruent_assimilation('zt'), 'st')
+        self.assertEqual(be_obstruent_assimilation('sdb'), 'zdb')
+        self.assertEqual(be_obstruent_assimilation('zv'), 'zv')
+
+        #Palatalization spreads to the previous obstruent, except the hard /ʂ, ʐ, ʧ, ʤ/
+        self.assertEqual(be_obstruent_assimilation('stʲ'), 'sʲtʲ')
+        self.assertEqual(be_obstruent_assimilation('ʂtʲ'), 'ʂtʲ')
+        self.assertEqual(be_obstruent_assimilation(''), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
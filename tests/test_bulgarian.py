@@ -0,0 +1,41 @@
+import itertools
+import random
+import unittest
+from benchmarks import bg_voicing_assim_input, reference_bg_voicing_assimilation
+from transcribe_bulgarian import bg_obstruents, bg_voicing_assimilation, iter_bg_voicing_assimilation
+
+
+class TestBulgarianVoicingAssimilation(unittest.TestCase):
+
+    def test_reference_equivalence(self):
+        text = bg_voicing_assim_input(5_000)
+        self.assertEqual(bg_voicing_assimilation(text), reference_bg_voicing_assimilation(text))
+        rng = random.Random(0)
+        segments = bg_obstruents + ['a', 'r', ' ', ' ']
+        for _ in range(2_000):
+            text = ''.join(rng.choice(segments) for _ in range(rng.randint(1, 10)))
+            self.assertEqual(bg_voicing_assimilation(text), reference_bg_voicing_assimilation(text), text)
+
+
+    def test_stream(self):
+        #Words are yielded one word behind the input, from a generator of any length
+        words = bg_voicing_assim_input(1_000).split()
+        stream = iter_bg_voicing_assimilation(itertools.cycle(words))
+        self.assertEqual(list(itertools.islice(stream, len(words) - 1)),
+                         bg_voicing_assimilation(' '.join(words * 2)).split()[:len(words) - 1])
+        self.assertEqual(list(iter_bg_voicing_assimilation([])), [])
+
+
+    def test_rules(self):
+        #Obstruents are devoiced before voiceless obstruents, also across words, and at the end
+        #of the text; /v/ does not trigger devoicing and is kept as a final preposition
+        self.assertEqual(bg_voicing_assimilation('zt'), 'st')
+        self.assertEqual(bg_voicing_assimilation('vs dom'), 'fs dom')
+        self.assertEqual(bg_voicing_assimilation('v kota'), 'f kota')
+        self.assertEqual(bg_voicing_assimilation('grad'), 'grat')
+        self.assertEqual(bg_voicing_assimilation('v'), 'v')
+        self.assertEqual(bg_voicing_assimilation('ot dom'), 'ot dom')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import random
+import unittest
+from benchmarks import samples
+from context_rules import ContextRule, _numpy, apply_rules, apply_rules_batch, apply_rules_numpy
+from phones import decode, encode
+import transcribe_belarusian as be
+import transcribe_czech as cz
+import transcribe_polish as pl
+import transcribe_slovak as sk
+
+backends = ['python', 'numpy'] if _numpy() is not None else ['python']
+
+
+def random_texts(letters, common, count, seed=0):
+    """Random texts of letters and common words, with punctuation and mixed whitespace"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(common) if rng.random() < 0.25 else
+                 ''.join(rng.choice(letters) for _ in range(rng.randint(1, 8))) + rng.choice(['', '', '', ',', '.', '!'])
+                 for _ in range(rng.randint(1, 10))]
+        texts.append(''.join(word + rng.choice([' ', ' ', '  ', '\n', '\t']) for word in words))
+    return texts
+
+
+#Input of each stage given as context rules (the output of the pipeline steps before it),
+#the stage itself and its rules
+def pl_input(text):
+    return pl.pl_finaldevoicing(pl.nasalv_allophony(pl.pl_palatalization(pl.polish_g2p(text)), final_denasal=True))
+
+
+def sk_input(text):
+    return sk.palatalize_sk(sk.sk_g2p(text))
+
+
+def cz_input(text):
+    return cz.palatalize_cz(cz.cz_g2p(text))
+
+
+def be_input(text):
+    return be.adjust_soft_vowels(be.be_vowel_reduction(be.be_stress(be.be_palatalization(be.be2ipa(text)))))
+
+
+stages = {'pl':(pl_input, pl.voicing_assim1, pl.pl_voicing_assim1_rules,
+                'aąbcćdeęfghijklłmnńoóprsśtuwyzźż', ['w', 'z', 'dż', 'rz', 'chrząszcz', 'wódź', 'cz']),
+          'sk_final':(sk_input, sk.final_devoicing, sk.sk_final_devoicing_rules,
+                      'aáäbcčdďeéfghiíjklĺľmnňoóôpqrŕsštťuúvwxyýzž', ['v', 'jeden', 'vták', 'kde']),
+          'sk_assim':(lambda text: sk.final_devoicing(sk_input(text)), sk.sk_voice_assim, sk.sk_voice_assim_rules,
+                      'aáäbcčdďeéfghiíjklĺľmnňoóôpqrŕsštťuúvwxyýzž', ['v', 'jeden', 'vták', 'kde']),
+          'cz':(cz_input, cz.final_devoicing, cz.cz_final_devoicing_rules,
+                'aábcčdďeéěfghiíjklmnňoópqrřsštťuúůvwxyýzž', ['sh', 'v', 'z', 'tři', 'kdo', 'vždy']),
+          'be':(be_input, be.be_final_devoicing, be.be_final_devoicing_rules,
+                'абвгдеёжзійклмнопрстуўфхцчшыэюя', ['в', 'зг', 'дзь', 'ць'])}
+
+
+class TestContextRules(unittest.TestCase):
+
+    def test_string_stages(self):
+        for name, (prepare, function, rules, letters, common) in stages.items():
+            texts = []
+            for text in random_texts(letters, common, 1_000):
+                #(the first steps of transcribe_be raise an IndexError on some random words)
+                try:
+                    texts.append(prepare(text))
+                except IndexError:
+                    pass
+            expected = [' '.join(function(text).split()) for text in texts]
+            for backend in backends:
+                self.assertEqual(apply_rules_batch(texts, rules, backend=backend), expected, (name, backend))
+
+
+    def test_pipelines(self):
+        for lang, function in [('pl', pl.transcribe_pl), ('sk', sk.transcribe_sk),
+                               ('cz', cz.transcribe_cz), ('be', be.transcribe_be)]:
+            text = samples['cz'] if lang == 'sk' else samples[lang]
+            for backend in backends:
+                self.assertEqual(function(text, backend=backend), function(text), (lang, backend))
+
+        #Polish affricates change only in their last character, as in voicing_assim1
+        for backend in backends:
+            self.assertEqual(pl.transcribe_pl('dżdżysty', backend=backend), pl.transcribe_pl('dżdżysty'))
+        with self.assertRaises(ValueError):
+            cz.transcribe_cz(samples['cz'], backend='gpu')
+
+
+    @unittest.skipIf(_numpy() is None, 'NumPy is not installed')
+    def test_backends(self):
+        ids = encode(pl_input(samples['pl']))
+        self.assertEqual(apply_rules_numpy(ids, pl.pl_voicing_assim1_rules), apply_rules(ids, pl.pl_voicing_assim1_rules))
+
+
+    def test_rules(self):
+        #Rules of a list apply simultaneously, each segment changed by the first rule it matches
+        rules = [ContextRule({'a':'b'}, after=lambda segment: segment == 'a'),
+                 ContextRule({'a':'c'})]
+        for backend in backends:
+            self.assertEqual(apply_rules_batch(['aaa', ' a\n\na '], rules, backend=backend), ['bbc', 'c c'])
+
+        #A change function applies to the targets only
+        rules = [ContextRule(lambda segment: segment.upper(), target=lambda segment: segment[0] == 't')]
+        self.assertEqual(decode(apply_rules(encode('ta tʲo'), rules)), 'Ta Tʲo')
+        self.assertEqual(apply_rules_batch([], rules), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from benchmarks import samples
+from corpus import transcribe_corpus
+from transcribe_polish import transcribe_pl
+
+
+class TestTranscribeCorpus(unittest.TestCase):
+
+    def setUp(self):
+        sentences = [sentence + '.\n' for sentence in samples['pl'].split('. ')]
+        self.lines = [sentences[i % len(sentences)] for i in range(60)] + ['\n', '123\n', 'koniec']
+        self.expected = [transcribe_pl(line.rstrip('\n')) for line in self.lines[:60]] + ['', '', transcribe_pl('koniec')]
+
+
+    def test_in_process(self):
+        stats = {}
+        tr = list(transcribe_corpus('pl', iter(self.lines), workers=1, chunk_size=500, stats=stats))
+        self.assertEqual(tr, self.expected)
+        self.assertEqual(stats['total']['texts'], len(self.lines))
+        self.assertEqual(stats['total']['chars'], sum(len(line) for line in self.lines))
+        self.assertEqual(len(stats['workers']), 1)
+        self.assertGreater(list(stats['workers'].values())[0]['chunks'], 1)
+
+
+    def test_process_pool(self):
+        stats = {}
+        tr = list(transcribe_corpus('pl', self.lines, workers=2, chunk_size=500, stats=stats))
+        self.assertEqual(tr, self.expected)
+        self.assertEqual(stats['total']['texts'], len(self.lines))
+        self.assertEqual(sum(worker['texts'] for worker in stats['workers'].values()), len(self.lines))
+
+
+    def test_options(self):
+        tr = list(transcribe_corpus('pl', self.lines[:5], workers=1, stress=False))
+        self.assertEqual(tr, [transcribe_pl(line.rstrip('\n'), stress=False) for line in self.lines[:5]])
+
+
+    def test_unsupported_language(self):
+        #Raised on the call, before any text is read
+        with self.assertRaises(ValueError):
+            transcribe_corpus('xx', self.lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
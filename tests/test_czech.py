@@ -0,0 +1,31 @@
+import random
+import unittest
+from benchmarks import reference_cz_voice_assim, repeat_to_size, samples
+from transcribe_czech import cz_g2p, cz_obstruents, cz_voice_assim, final_devoicing, palatalize_cz
+
+
+class TestCzechVoiceAssimilation(unittest.TestCase):
+
+    def test_reference_equivalence(self):
+        text = repeat_to_size(final_devoicing(palatalize_cz(cz_g2p(samples['cz']))), 5_000)
+        self.assertEqual(cz_voice_assim(text), reference_cz_voice_assim(text))
+        rng = random.Random(0)
+        segments = cz_obstruents + ['ř', 'ɦ', 'a', 'r', ' ', '.']
+        for _ in range(2_000):
+            text = ''.join(rng.choice(segments) for _ in range(rng.randint(1, 8)))
+            self.assertEqual(cz_voice_assim(text), reference_cz_voice_assim(text), text)
+
+
+    def test_rules(self):
+        self.assertEqual(cz_voice_assim('kdo'), 'ɡdo')
+        self.assertEqual(cz_voice_assim('odtut'), 'ottut')
+        
+        #<sh> is /sx/; <v, ř> do not trigger assimilation; <ř> is devoiced after voiceless segments
+        self.assertEqual(cz_voice_assim('sɦora'), 'sxora')
+        self.assertEqual(cz_voice_assim('kfjɛt'), 'kfjɛt')
+        self.assertEqual(cz_voice_assim('tři'), 'tř̊i')
+        self.assertEqual(cz_voice_assim(''), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import itertools
+import random
+import unittest
+from benchmarks import longest_match_gr2ipa, random_greek_text, reference_front_end, repeat_to_size, samples
+from transcribe_greek import gr2ipa, transcribe_gr, transcribe_gr_stream
+
+
+class TestGreekFrontEnd(unittest.TestCase):
+
+    def test_reference_equivalence(self):
+        rng = random.Random(0)
+        texts = [random_greek_text(rng, rng.randint(1, 12)) for _ in range(5_000)]
+        texts.append(repeat_to_size(samples['gr'], 5_000))
+        for text in texts:
+            expected = reference_front_end('gr', text)
+            self.assertEqual(gr2ipa(text), expected, text)
+            self.assertEqual(longest_match_gr2ipa(text), expected, text)
+
+
+    def test_digraphs(self):
+        #The longest key of the tables is matched first, after lowercasing
+        self.assertEqual(gr2ipa('ουρανός'), 'uɾanˈos')
+        self.assertEqual(gr2ipa('μπαμπάς'), 'ᵐbaᵐbˈas')
+        self.assertEqual(gr2ipa('ΑΥΤΟ'), 'awto')
+        self.assertEqual(gr2ipa('αι'), 'e')
+
+
+
+class TestGreekStream(unittest.TestCase):
+
+    def assertSameWords(self, lines, **options):
+        #The words of the stream are transcribed as if separated by single spaces
+        expected = transcribe_gr(' '.join(' '.join(lines).split()), options.get('strong_palatalization', True)).split()
+        self.assertEqual(list(transcribe_gr_stream(iter(lines), **options)), expected, lines)
+
+
+    def test_whole_text_equivalence(self):
+        lines = [sentence + '.' for sentence in samples['gr'].split('. ')]
+        self.assertSameWords(lines)
+        self.assertSameWords(lines, strong_palatalization=False)
+
+        #Small batches put batch boundaries between articles and the words they revoice
+        rng = random.Random(0)
+        words = samples['gr'].split() + ['τον', 'την', 'των', 'δεν', 'πατέρα', 'κόσμο', 'τσάι', 'μπάλα']
+        for _ in range(500):
+            lines = [' '.join(rng.choice(words) for _ in range(rng.randint(0, 5))) for _ in range(rng.randint(1, 4))]
+            for batch_size in [1, 7, 65536]:
+                self.assertSameWords(lines, batch_size=batch_size)
+                self.assertSameWords(lines, strong_palatalization=False, batch_size=batch_size)
+
+        #Random texts of the keys of the Greek tables, not beginning with a Latin <j>
+        #(see _iter_gr_batches)
+        for _ in range(500):
+            lines = [random_greek_text(rng, rng.randint(1, 10)) for _ in range(rng.randint(1, 3))]
+            if not ''.join(lines).lstrip().lower().startswith('j'):
+                self.assertSameWords(lines, batch_size=7)
+
+
+    def test_endless_stream(self):
+        stream = transcribe_gr_stream(itertools.cycle(['τον πατέρα']), batch_size=100)
+        self.assertEqual(list(itertools.islice(stream, 4)), ['to', 'batˈeɾa', 'to', 'batˈeɾa'])
+        self.assertEqual(list(transcribe_gr_stream([])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
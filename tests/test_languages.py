@@ -0,0 +1,63 @@
+import itertools
+import unittest
+from benchmarks import repeat_to_size, samples, uk_stressed
+from languages import get_transcriber, transcribe_stream
+from serbian_cyrillic_latin_converter import convert_text
+from word_cache import TranscriptionCache
+
+
+class TestTranscribeStream(unittest.TestCase):
+
+    def test_lines(self):
+        #Each line is transcribed as by the whole-string function, without its line break
+        for lang in ['be', 'bg', 'cz', 'es', 'gr', 'pl', 'sk', 'uk']:
+            function = get_transcriber(lang)
+            text = {'sk':samples['cz'], 'uk':uk_stressed}.get(lang) or samples[lang]
+            lines = repeat_to_size(text + '\n', 3_000).split('\n')
+            lines = [line for line in lines if line]
+            expected = [function(line) for line in lines]
+            self.assertEqual(list(transcribe_stream(lang, [line + '\n' for line in lines])), expected, lang)
+            self.assertEqual(list(transcribe_stream(lang, lines, cache=TranscriptionCache())), expected, lang)
+
+        #Lines without letters give empty transcriptions
+        lines = ['Dobrý den\r\n', '\n', '', '   \t\n', '1989\n', '...\n', 'ahoj']
+        cz = get_transcriber('cz')
+        self.assertEqual(list(transcribe_stream('cz', lines)), [cz('Dobrý den'), '', '', '', '', '', cz('ahoj')])
+        self.assertEqual(list(transcribe_stream('pl', lines[1:6], stress=False)), [''] * 5)
+
+
+    def test_options(self):
+        lines = samples['pl'].split('. ')
+        pl = get_transcriber('pl')
+        self.assertEqual(list(transcribe_stream('pl', lines, stress=False, final_denasal=False)),
+                         [pl(line, stress=False, final_denasal=False) for line in lines])
+        with self.assertRaises(ValueError):
+            transcribe_stream('xx', lines)
+
+
+    def test_endless_stream(self):
+        #Transcriptions are yielded as the lines arrive
+        stream = transcribe_stream('es', itertools.cycle(['hola', 'mundo']))
+        es = get_transcriber('es')
+        self.assertEqual(list(itertools.islice(stream, 4)), [es('hola'), es('mundo')] * 2)
+
+
+    def test_serbian_script(self):
+        #The script is detected once over the stream: a Latin line at the start of a Cyrillic
+        #text is converted as Cyrillic, as are the lines held back until the script is decided
+        lines = ['Ljubav'] + [line for line in repeat_to_size(samples['sr'] + '\n', 20_000).split('\n') if line]
+        expected = [convert_text(line, source_script='cyrillic') for line in lines]
+        self.assertEqual(list(transcribe_stream('sr', lines)), expected)
+        latin = [convert_text(line, source_script='cyrillic').rstrip(' \n') for line in lines]
+        self.assertEqual(list(transcribe_stream('sr', latin)), [convert_text(line, source_script='latin') for line in latin])
+
+        #A short stream is decided by the majority of its characters, and one
+        #without letters is read as Latin
+        self.assertEqual(list(transcribe_stream('sr', ['Ljubav', 'Љубав и џеп', '123'])),
+                         ['Ljubav \n', 'Ljubav i džep \n', ''])
+        self.assertEqual(list(transcribe_stream('sr', ['123', '', '?'])), ['', '', ''])
+        self.assertEqual(list(transcribe_stream('sr', ['Ljubav'], source_script='cyrillic')), ['Ljubav \n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import pickle
+import tempfile
+import unittest
+import persistent_cache
+from benchmarks import samples
+from languages import get_transcriber
+from lexicon import Lexicon, LexiconTranscriptionCache, build_lexicon
+from tests.test_word_cache import shuffled_texts
+
+
+class TestLexicon(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'lexicon.lex')
+
+
+    def test_uncached_equivalence(self):
+        for lang in ['be', 'cz', 'es', 'gr', 'pl']:
+            function = get_transcriber(lang)
+            build_lexicon(lang, samples[lang].split(), self.path)
+            cache = LexiconTranscriptionCache(self.path)
+            texts = [samples[lang]] + shuffled_texts(lang, 100)
+            for text in texts:
+                self.assertEqual(cache.transcribe(lang, text), function(text), (lang, text))
+            self.assertGreater(cache.stats()['lexicon_hits'], 0)
+            cache.lexicon.close()
+
+
+    def test_missing_words(self):
+        #Words missing from the lexicon, and texts transcribed with other options, fall back to the rules
+        cz = get_transcriber('cz')
+        build_lexicon('cz', ['praha', 'je', 'město'], self.path, stress=False)
+        cache = LexiconTranscriptionCache(self.path)
+        text = 'Praha je hlavní město'
+        self.assertEqual(cache.transcribe('cz', text, stress=False), cz(text, stress=False))
+        self.assertEqual((cache.stats()['lexicon_hits'], cache.stats()['misses']), (3, 1))
+        self.assertEqual(cache.transcribe('cz', text), cz(text))
+        self.assertEqual((cache.stats()['lexicon_hits'], cache.stats()['misses']), (3, 5))
+        cache.lexicon.close()
+
+
+    def test_nahuatl(self):
+        #Nahuatl words are compiled both in the middle and at the end of a text
+        nahuatl = get_transcriber('nahuatl')
+        build_lexicon('nahuatl', ['nocal', 'tlacatl'], self.path)
+        cache = LexiconTranscriptionCache(self.path)
+        for text in ['nocal', 'tlacatl nocal', 'nocal tlacatl ']:
+            self.assertEqual(cache.transcribe('nahuatl', text), nahuatl(text), text)
+        self.assertEqual(cache.stats()['misses'], 0)
+        cache.lexicon.close()
+
+
+    def test_lookup(self):
+        #Words are compiled lowercased, blank words and phrases being left out
+        entries = build_lexicon('cz', ['Praha', 'praha', '', 'dva slova', 'hrad'], self.path)
+        self.assertEqual(entries, 2)
+        lexicon = Lexicon(self.path)
+        self.assertEqual(len(lexicon), 2)
+        self.assertIn('praha', lexicon)
+        self.assertNotIn('Praha', lexicon)
+        self.assertIsNone(lexicon.lookup('brno'))
+        self.assertEqual(lexicon.lookup('hrad'), get_transcriber('cz')('hrad'))
+        self.assertEqual(pickle.loads(pickle.dumps(lexicon)).lookup('hrad'), lexicon.lookup('hrad'))
+        lexicon.close()
+        with self.assertRaises(ValueError):
+            build_lexicon('sr', ['reč'], self.path)
+
+
+    def test_version(self):
+        build_lexicon('pl', samples['pl'].split(), self.path)
+        version = persistent_cache.module_version('pl')
+        persistent_cache._versions['pl'] = 'changed'
+        try:
+            with self.assertRaises(ValueError):
+                Lexicon(self.path)
+            Lexicon(self.path, check_version=False).close()
+        finally:
+            persistent_cache._versions['pl'] = version
+
+        with open(self.path, 'wb') as f:
+            f.write(b'not a lexicon')
+        with self.assertRaises(ValueError):
+            Lexicon(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import gc
+import os
+import pickle
+import sqlite3
+import tempfile
+import unittest
+import persistent_cache
+from benchmarks import samples
+from languages import get_transcriber
+from persistent_cache import PersistentTranscriptionCache
+from tests.test_word_cache import shuffled_texts
+
+
+def saved_entries(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT COUNT(*) FROM transcriptions').fetchone()[0]
+
+
+class TestPersistentCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite')
+
+
+    def test_next_run(self):
+        for lang in ['cz', 'es', 'gr', 'pl']:
+            function = get_transcriber(lang)
+            texts = [samples[lang]] + shuffled_texts(lang, 50)
+            with PersistentTranscriptionCache(self.path) as cache:
+                for text in texts:
+                    self.assertEqual(cache.transcribe(lang, text), function(text), text)
+
+            #A new cache finds every word in the file
+            with PersistentTranscriptionCache(self.path) as cache:
+                for text in texts:
+                    self.assertEqual(cache.transcribe(lang, text), function(text), text)
+                stats = cache.stats()
+                self.assertEqual(stats['misses'], 0)
+                self.assertEqual(stats['disk_hit_rate'], 1.0)
+
+
+    def test_batches(self):
+        cache = PersistentTranscriptionCache(self.path, batch_size=5)
+        cache.transcribe('pl', samples['pl'])
+        self.assertLess(cache.stats()['pending'], 5)
+        self.assertEqual(saved_entries(self.path) + cache.stats()['pending'], cache.stats()['misses'])
+        cache.close()
+        self.assertEqual(saved_entries(self.path), cache.stats()['misses'])
+
+
+    def test_unclosed_cache(self):
+        #Entries of a cache which is not closed are written when it is garbage collected
+        cache = PersistentTranscriptionCache(self.path)
+        cache.transcribe('cz', samples['cz'])
+        misses = cache.stats()['misses']
+        del cache
+        gc.collect()
+        self.assertEqual(saved_entries(self.path), misses)
+
+
+    def test_versions(self):
+        with PersistentTranscriptionCache(self.path) as cache:
+            cache.transcribe('pl', samples['pl'])
+        entries = saved_entries(self.path)
+
+        #Entries of another version of the language module are not found, and prune() deletes them
+        version = persistent_cache.module_version('pl')
+        persistent_cache._versions['pl'] = 'changed'
+        try:
+            with PersistentTranscriptionCache(self.path) as cache:
+                cache.transcribe('pl', samples['pl'])
+                self.assertEqual(cache.stats()['disk_hits'], 0)
+                self.assertEqual(cache.prune(), entries)
+            self.assertEqual(saved_entries(self.path), entries)
+        finally:
+            persistent_cache._versions['pl'] = version
+
+
+    def test_pickle(self):
+        #A copy in another process opens its own connection
+        with PersistentTranscriptionCache(self.path) as cache:
+            cache.transcribe('es', samples['es'])
+            copy = pickle.loads(pickle.dumps(cache))
+        self.assertIsNone(copy._connection)
+        self.assertEqual(copy.transcribe('es', samples['es']), get_transcriber('es')(samples['es']))
+        copy.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import phones
+from benchmarks import repeat_to_size, samples
+from phones import BOUNDARY_ID, decode, encode, iter_word_spans, segment_map, split_segments
+from transcribe_belarusian import (be2ipa, be_palatalization, be_stress, be_vowel_reduction, adjust_soft_vowels,
+                                   be_devoicing_dict, be_final_devoicing, be_final_devoicing_ids)
+from transcribe_polish import pl_finaldevoicing, pl_finaldevoicing_ids
+
+
+#Belarusian final devoicing on characters, before the segment arrays
+def reference_be_final_devoicing(text):
+    words = text.split()
+    for w in range(len(words)):
+        phones = list(words[w])
+        if phones[-1] != 'ʲ':
+            phones[-1] = be_devoicing_dict.get(phones[-1], phones[-1])
+        else:
+            phones[-2] = be_devoicing_dict.get(phones[-2], phones[-2])
+        words[w] = ''.join(phones)
+    return ' '.join(words)
+
+
+class TestSegmentArrays(unittest.TestCase):
+
+    def test_segments(self):
+        #Diacritics, modifier letters and tied characters belong to the preceding character
+        self.assertEqual(split_segments('ɖ͡ʐtʲaʁ̥ bː'), ['ɖ͡ʐ', 'tʲ', 'a', 'ʁ̥', ' ', 'bː'])
+        self.assertEqual(list(iter_word_spans(encode('ab  c'))), [(0, 2), (4, 5)])
+        self.assertEqual(encode(' ')[0], BOUNDARY_ID)
+
+
+    def test_round_trip(self):
+        rng = random.Random(0)
+        characters = 'abtsʲʷː̥̃͡ \n\t.,' + ''.join(set(samples['be'] + samples['pl']))
+        for _ in range(2_000):
+            text = ''.join(rng.choice(characters) for _ in range(rng.randint(0, 12)))
+            self.assertEqual(decode(encode(text)), text, text)
+
+
+    def test_segment_map(self):
+        #The mapping applies to the longest prefix of each segment, keeping the rest
+        devoice = segment_map({'z':'s', 'ɖ͡ʐ':'ʈ͡ʂ'})
+        for segment, expected in [('z', 's'), ('zʲ', 'sʲ'), ('ɖ͡ʐ', 'ʈ͡ʂ'), ('a', 'a')]:
+            self.assertEqual(decode([devoice[encode(segment)[0]]]), expected)
+
+
+    def test_new_segments_in_threads(self):
+        #Segments first seen in several threads at once get one ID each
+        rng = random.Random(0)
+        texts = [''.join(rng.choice('ǅǆǈǉ') + rng.choice('̀́̂̄̆̈')
+                         for _ in range(50)) for _ in range(64)]
+        with ThreadPoolExecutor(8) as pool:
+            decoded = list(pool.map(lambda text: decode(encode(text)), texts))
+        self.assertEqual(decoded, texts)
+        self.assertTrue(all(phones.segment_ids[segment] == i for i, segment in enumerate(phones.segments)))
+
+
+    def test_be_final_devoicing(self):
+        sample = adjust_soft_vowels(be_vowel_reduction(be_stress(be_palatalization(be2ipa(samples['be'])))))
+        text = repeat_to_size(sample, 5_000)
+        self.assertEqual(be_final_devoicing(text), reference_be_final_devoicing(text))
+        self.assertEqual(decode(be_final_devoicing_ids(encode(text))), be_final_devoicing(text))
+
+        #Segments of several characters are devoiced whole
+        self.assertEqual(be_final_devoicing('zʲ dub'), 'sʲ dup')
+        self.assertEqual(be_final_devoicing('ʁ'), 'ʁ̥')
+
+
+    def test_pl_finaldevoicing(self):
+        for text, expected in [('xlɛb', 'xlɛp'), ('vɔɖ͡ʐ', 'vɔʈ͡ʂ'), ('bɔɡ.', 'bɔk.'),
+                               ('z kɔt', 's kɔt'), ('v dɔm', 'v dɔm'), ('v', 'v')]:
+            self.assertEqual(pl_finaldevoicing(text), expected)
+            self.assertEqual(decode(pl_finaldevoicing_ids(encode(text))), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import random
+import unittest
+from benchmarks import repeat_to_size, samples
+from transcribe_polish import transcribe_pl, transcribe_pl_fast
+
+
+class TestPolishFast(unittest.TestCase):
+
+    def assertSameOutput(self, text):
+        for final_denasal in [True, False]:
+            for stress in [True, False]:
+                self.assertEqual(transcribe_pl_fast(text, final_denasal=final_denasal, stress=stress),
+                                 transcribe_pl(text, final_denasal=final_denasal, stress=stress), text)
+
+
+    def test_staged_equivalence(self):
+        self.assertSameOutput(repeat_to_size(samples['pl'], 5_000))
+        rng = random.Random(0)
+        letters = 'aąbcćdeęfghijklłmnńoóprsśtuwyzźżAĘŁŻ' + '  ,.-!\n\t'
+        for _ in range(1_000):
+            text = ''.join(rng.choice(letters) for _ in range(rng.randint(1, 30)))
+            #(transcribe_pl raises an IndexError on blank text)
+            if text.strip():
+                self.assertSameOutput(text)
+
+
+    def test_prepositions(self):
+        #<w, z> assimilate to the onset of the following word and keep their voicing at the end
+        self.assertEqual(transcribe_pl_fast('w domu'), 'v dˈɔmu')
+        self.assertEqual(transcribe_pl_fast('w polu'), 'f pˈɔlu')
+        self.assertEqual(transcribe_pl_fast('z tobą'), 's̪ tˈɔbɔw̃')
+        self.assertEqual(transcribe_pl_fast('z nim'), 'z̪ ɲim')
+        self.assertEqual(transcribe_pl_fast('idę z', stress=False), 'idɛ z̪')
+
+
+    def test_tie_bars_between_words(self):
+        #A tie bar next to a space is left to transcribe_pl
+        for text in ['ʦ͡ z', 'a ͡z', 'w ͡ʐ kot']:
+            self.assertSameOutput(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
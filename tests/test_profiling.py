@@ -0,0 +1,64 @@
+import json
+import os
+import pstats
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import profiling
+from benchmarks import samples
+from languages import get_transcriber
+
+
+class TestProfiling(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.disable()
+        profiling.reset()
+
+
+    def test_stage_statistics(self):
+        transcribe_pl = get_transcriber('pl')
+        expected = transcribe_pl(samples['pl'])
+        self.assertEqual(profiling.get_stats(), {})
+        with profiling.profiling() as stats:
+            self.assertEqual(transcribe_pl(samples['pl']), expected)
+        pipeline = stats['transcribe_polish.transcribe_pl']
+        self.assertEqual(pipeline['calls'], 1)
+        self.assertEqual(pipeline['chars_in'], len(samples['pl']))
+        self.assertEqual(pipeline['chars_out'], len(expected))
+        self.assertLess(pipeline['own_seconds'], pipeline['seconds'])
+
+        #Nested stages are attributed to the pipeline which called them
+        g2p = stats['transcribe_polish.polish_g2p']
+        self.assertEqual(g2p['callers'], {'transcribe_polish.transcribe_pl':1})
+
+        #Nothing is recorded once profiling is disabled
+        transcribe_pl(samples['pl'])
+        self.assertEqual(stats['transcribe_polish.transcribe_pl']['calls'], 1)
+
+
+    def test_memory_and_threads(self):
+        transcribe_es = get_transcriber('es')
+        with profiling.profiling(memory=True) as stats:
+            with ThreadPoolExecutor(4) as pool:
+                list(pool.map(transcribe_es, [samples['es']] * 8))
+        self.assertEqual(stats['transcribe_spanish.transcribe_es']['calls'], 8)
+        self.assertGreater(stats['transcribe_spanish.transcribe_es']['peak_bytes'], 0)
+
+
+    def test_exports(self):
+        with profiling.profiling():
+            get_transcriber('cz')(samples['cz'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stages.json')
+            profiling.export_json(path)
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), profiling.get_stats())
+            path = os.path.join(directory, 'stages.prof')
+            profiling.export_pstats(path)
+            functions = {key[2] for key in pstats.Stats(path).stats}
+            self.assertIn('transcribe_cz', functions)
+
+
+if __name__ == '__main__':
+    unittest.main()
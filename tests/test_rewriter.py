@@ -0,0 +1,56 @@
+import random
+import unittest
+from benchmarks import reference_front_end, repeat_to_size, samples
+from rewriter import Rewriter
+
+
+def sequential_rewrite(rules, text):
+    for pattern, replacement in rules:
+        text = text.replace(pattern, replacement)
+    return text
+
+
+class TestRewriter(unittest.TestCase):
+
+    def test_sequential_equivalence(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            rules = [(''.join(rng.choice('abcd') for _ in range(rng.choice([1, 1, 1, 2]))),
+                      ''.join(rng.choice('abcdX') for _ in range(rng.randint(0, 2))))
+                     for _ in range(rng.randint(1, 8))]
+            rewrite = Rewriter(rules)
+            #Short strings are translated, longer ones replaced rule by rule
+            for length in [1, 3, 50]:
+                text = ''.join(rng.choice('abcde ') for _ in range(length))
+                self.assertEqual(rewrite(text), sequential_rewrite(rules, text), (rules, text))
+
+
+    def test_interfering_rules(self):
+        #<a> becomes <b> before <b> becomes <c>, so both end up as <c>
+        rewrite = Rewriter([('a', 'b'), ('b', 'c'), ('c', 'a')])
+        self.assertEqual(len(rewrite.steps), 3)
+        self.assertEqual(rewrite('abc'), 'aaa')
+        self.assertEqual(Rewriter([('a', 'x'), ('b', 'y')])('ab'), 'xy')
+        with self.assertRaises(ValueError):
+            Rewriter([('', 'a')])
+
+
+    def test_front_ends(self):
+        from transcribe_czech import cz_g2p
+        from transcribe_greek import gr2ipa
+        from transcribe_slovak import sk_g2p
+        from transcribe_spanish import es2ipa
+        for lang, function, sample in [('cz', cz_g2p, samples['cz']), ('es', es2ipa, samples['es']),
+                                       ('gr', gr2ipa, samples['gr']), ('sk', sk_g2p, samples['cz'])]:
+            text = repeat_to_size(sample, 5_000)
+            self.assertEqual(function(text), reference_front_end(lang, text), lang)
+            for word in sample.split():
+                self.assertEqual(function(word), reference_front_end(lang, word), word)
+
+        #<ch> is first replaced by the placeholder X, so that it is not read as <c> + <h>
+        self.assertEqual(cz_g2p('chata'), 'xata')
+        self.assertEqual(sk_g2p('chata'), 'xata')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+from benchmarks import reference_serbian_conversion, repeat_to_size, samples
+from serbian_cyrillic_latin_converter import convert_to_cyrillic, convert_to_latin
+
+
+class TestSerbianConversion(unittest.TestCase):
+
+    def test_reference_equivalence(self):
+        cyrillic = repeat_to_size(samples['sr'], 5_000)
+        latin = convert_to_latin(cyrillic)
+        self.assertEqual(latin, reference_serbian_conversion(cyrillic, True))
+        self.assertEqual(convert_to_cyrillic(latin), reference_serbian_conversion(latin, False))
+
+
+    def test_digraphs_and_caps(self):
+        #Each line is converted word by word, ending with ' \n'
+        self.assertEqual(convert_to_latin('Љубав и џеп'), 'Ljubav i džep \n')
+        self.assertEqual(convert_to_latin('ЉУБАВ'), 'LJUBAV \n')
+        self.assertEqual(convert_to_cyrillic('Ljubav i džep'), 'Љубав и џеп \n')
+
+
+if __name__ == '__main__':
+    unittest.main()
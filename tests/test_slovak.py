@@ -0,0 +1,51 @@
+import os
+import random
+import tempfile
+import unittest
+from affix_trie import AffixTrie
+from benchmarks import reference_sk_exception, samples
+from transcribe_slovak import load_sk_exceptions, sk_g2p, transcribe_sk
+from word_cache import TranscriptionCache
+
+
+class TestSlovakExceptions(unittest.TestCase):
+
+    def test_affix_trie(self):
+        rng = random.Random(0)
+        words = sk_g2p(samples['cz']).split()
+        patterns = [rng.choice([word, word[:3] + '-', '-' + word[-3:]]) for word in words[::2]]
+        patterns += [''.join(rng.choice('abdeiklmnoprstuvz') for _ in range(4)) for _ in range(100)]
+        exceptions = AffixTrie(patterns)
+        for word in words + ['', 'a', 'ab']:
+            self.assertEqual(word in exceptions, reference_sk_exception(word, patterns), word)
+
+        #Tries of the same patterns are equal, whatever their order
+        self.assertEqual(AffixTrie(reversed(patterns)), exceptions)
+        self.assertEqual(hash(AffixTrie(reversed(patterns))), hash(exceptions))
+        self.assertEqual(AffixTrie(reversed(patterns)).checksum(), exceptions.checksum())
+
+
+    def test_default_exceptions(self):
+        #The forms of 'ten' and the inflected forms of 'jeden' and 'telefón' are not palatalized,
+        #punctuation after them included
+        for text, expected in [('ten', 'tɛn'), ('ten,', 'tɛn,'), ('tí', 'tiː'), ('tie', 'tɪ̯ɛ'), ('tej', 'tɛj'),
+                               ('jedného', 'jˈɛdnɛːɦɔ'), ('telefónom', 'tˈɛɫɛfɔːnɔm'),
+                               ('deti', 'ɟˈɛci'), ('nie', 'ɲɪ̯ɛ')]:
+            self.assertEqual(transcribe_sk(text), expected)
+
+
+    def test_exceptions_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'exceptions.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('#Slovak words which are not palatalized\n\nteta-   #teta, tety\n-tika\n')
+            exceptions = load_sk_exceptions(path)
+        self.assertEqual(sorted(exceptions.patterns), ['-tika', 'tɛta-'])
+        self.assertEqual(transcribe_sk('tetami deti', palatalization_exceptions=exceptions), 'tˈɛtami ɟˈɛci')
+        cache = TranscriptionCache()
+        self.assertEqual(cache.transcribe('sk', 'tetami deti', palatalization_exceptions=exceptions),
+                         'tˈɛtami ɟˈɛci')
+
+
+if __name__ == '__main__':
+    unittest.main()
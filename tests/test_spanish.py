@@ -0,0 +1,108 @@
+import pickle
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks import reference_es_allophony, reference_transcribe_es, reference_voicing_assimilation, repeat_to_size, samples
+from transcribe_spanish import (SpanishTranscriber, es2ipa, es_allophony, es_dialects, nasal_assimilation, nasals,
+                                transcribe_es, transcribe_es_variants, voiced_obstruent_allophones, voicing_assimilation)
+
+
+class TestSpanishTranscriber(unittest.TestCase):
+
+    def test_reference_equivalence(self):
+        sentences = [sentence + '.' for sentence in repeat_to_size(samples['es'], 5_000).split('. ')]
+        for dialect in [dict(), dict(distincion=False), dict(ceceo=True), dict(yeismo=False)]:
+            transcriber = pickle.loads(pickle.dumps(SpanishTranscriber(**dialect)))
+            expected = [reference_transcribe_es(sentence, **dialect) for sentence in sentences]
+            with ThreadPoolExecutor(4) as pool:
+                self.assertEqual(list(pool.map(transcriber, sentences)), expected)
+
+
+    def test_approximant_diacritics(self):
+        #The lowered diacritics of /β, ð, ɣ/ are added after stress marking,
+        #which places stress and chooses the form of <y> as before
+        self.assertEqual(transcribe_es('abogado'), 'aβ̞oɣ̞ˈað̞o')
+        self.assertEqual(transcribe_es('y agua'), 'ʝ ˈaɣ̞wa')
+        self.assertEqual(transcribe_es('y dedos'), 'i ð̞ˈeð̞os')
+        for word in ['abogado', 'y agua', 'y dedos', 'desde', 'los dedos']:
+            for dialect in [dict(), dict(distincion=False), dict(ceceo=True), dict(yeismo=False)]:
+                self.assertEqual(transcribe_es(word, **dialect), reference_transcribe_es(word, **dialect), word)
+
+
+    def test_fricative_runs(self):
+        #Each run of /f, θ, s/ before a voiced consonant is voiced from right to left, as far
+        #as each fricative follows another in the order /f, θ, s/: a run of the same fricative
+        #is voiced only at its end
+        self.assertEqual(voicing_assimilation('sd'), 'zd')
+        self.assertEqual(voicing_assimilation('ssd'), 'szd')
+        self.assertEqual(voicing_assimilation('sθd'), 'zðd')
+        self.assertEqual(voicing_assimilation('θsd'), 'θzd')
+        self.assertEqual(voicing_assimilation('sfb'), 'zvb')
+        self.assertEqual(voicing_assimilation('s d'), 's d')
+        self.assertEqual(transcribe_es('desde'), 'dˈezð̞e')
+        self.assertEqual(transcribe_es('hazlo', distincion=False), 'ˈazlo')
+
+        #/s̄/ of ceceo is not voiced
+        self.assertEqual(transcribe_es('mismo', ceceo=True), 'mˈis̄mo')
+
+
+class TestSpanishVariants(unittest.TestCase):
+
+    def assertSameAsSeparateCalls(self, text, variants=es_dialects):
+        self.assertEqual(transcribe_es_variants(text, variants),
+                         {dialect:transcribe_es(text, *dialect) for dialect in variants}, text)
+
+
+    def test_separate_calls(self):
+        self.assertSameAsSeparateCalls(repeat_to_size(samples['es'].replace('viento', 'viento llamado'), 2_000))
+
+        #The yeísta transcription is derived from the non-yeísta one, so random texts
+        #include <ll> after nasals, pauses and <y>, alone and with stress marks
+        rng = random.Random(0)
+        words = samples['es'].split() + ['ll', 'y', 'llave', 'con', 'un', 'llueve.', 'ˈllama', 'calle,', 'ell̩a']
+        for _ in range(500):
+            self.assertSameAsSeparateCalls(' '.join(rng.choice(words) for _ in range(rng.randint(1, 6))))
+
+
+    def test_subsets(self):
+        self.assertSameAsSeparateCalls('con llave', [(True, False, False)])
+        self.assertSameAsSeparateCalls('con llave', [(True, True, False), (False, True, False)])
+        self.assertEqual(transcribe_es_variants('con llave')[(True, True, False)], 'kon ɟ͡ʝˈaβ̞e')
+        self.assertEqual(transcribe_es_variants('con llave')[(False, True, False)], 'kon ʎˈaβ̞e')
+        self.assertEqual(len(transcribe_es_variants('casa')), 8)
+
+
+
+class TestSpanishAllophony(unittest.TestCase):
+
+    def test_reference_equivalence(self):
+        transcriber = SpanishTranscriber()
+        text = repeat_to_size(samples['es'], 5_000)
+        stage_input = es2ipa(text)
+        self.assertEqual(es_allophony(stage_input), reference_es_allophony(stage_input))
+        stage_input = transcriber.dialect_rewriter(transcriber.stressed_ipa(text))
+        self.assertEqual(voicing_assimilation(stage_input), reference_voicing_assimilation(stage_input))
+
+        #Random strings of the segments of the context rules, with pauses
+        rng = random.Random(0)
+        segments = nasals + list(voiced_obstruent_allophones) + list(nasal_assimilation) + ['l', 'a', ' ', ' ', '.', ',']
+        for _ in range(2_000):
+            text = ''.join(rng.choice(segments) for _ in range(rng.randint(1, 8))).strip(' ')
+            if text:
+                self.assertEqual(es_allophony(text), reference_es_allophony(text), text)
+        segments = list('fθsvðzbdmnlaɾ ')
+        for _ in range(2_000):
+            text = ''.join(rng.choice(segments) for _ in range(rng.randint(1, 8)))
+            self.assertEqual(voicing_assimilation(text), reference_voicing_assimilation(text), text)
+
+
+    def test_rules(self):
+        #/β, ð, ɣ, ʝ/ become stops after nasals and pauses, and /ð/ also after /l/
+        self.assertEqual(es_allophony(es2ipa('un bote')), 'un bote')
+        self.assertEqual(es_allophony(es2ipa('el dedo')), 'el deðo')
+        self.assertEqual(es_allophony(es2ipa('nosotros dos')), 'nosotɾos ðos')
+        self.assertEqual(es_allophony(es2ipa('ambos')), 'ambos')
+
+
+if __name__ == '__main__':
+    unittest.main()
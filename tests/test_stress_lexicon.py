@@ -0,0 +1,79 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+import stress_lexicon
+from benchmarks import repeat_to_size, uk_stressed
+from stress_lexicon import StressLexicon, build_stress_lexicon, stress_mark
+from transcribe_belarusian import transcribe_be
+from transcribe_bulgarian import transcribe_bg
+from transcribe_ukrainian import transcribe_uk
+from word_cache import TranscriptionCache
+
+
+class TestStressLexicon(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+
+    def build(self, words, name='stress.lex'):
+        path = os.path.join(self.directory, name)
+        build_stress_lexicon(words, path)
+        lexicon = StressLexicon(path)
+        self.addCleanup(lexicon.close)
+        return lexicon
+
+
+    def test_accentuate(self):
+        #Unaccented words are left out, and of words spelled alike the first is kept
+        lexicon = self.build(['голова́', 'Вода́', 'вода', 'во́да', 'мо́ре'])
+        self.assertEqual(len(lexicon), 3)
+        self.assertEqual(lexicon.stress('вода'), [4])
+        self.assertIsNone(lexicon.stress('невідоме'))
+
+        #Case, punctuation and whitespace are kept, as are words already accented
+        text = 'Голова, «голова»\nГОЛОВА. голо́ва  вода море! невідоме'
+        self.assertEqual(lexicon.accentuate(text), 'Голова́, «голова́»\nГОЛОВА́. голо́ва  вода́ мо́ре! невідоме')
+
+
+    def test_memo(self):
+        #The result is the same when the memo of tokens is full and forgotten
+        lexicon = self.build(uk_stressed.replace(',', '').replace('.', '').split())
+        accented = repeat_to_size(uk_stressed, 10_000).rsplit(' ', 1)[0]
+        text = accented.replace(stress_mark, '')
+        with mock.patch.object(stress_lexicon, 'memo_size', 8):
+            self.assertEqual(lexicon.accentuate(text), accented)
+        self.assertEqual(lexicon.accentuate(text), accented)
+        self.assertEqual(pickle.loads(pickle.dumps(lexicon)).accentuate(text), accented)
+
+
+    def test_transcription(self):
+        words = uk_stressed.replace(',', '').replace('.', '').split()
+        lexicon = self.build(words)
+        text = uk_stressed.replace(stress_mark, '')
+        self.assertEqual(transcribe_uk(text, stress_lexicon=lexicon), transcribe_uk(uk_stressed))
+        cache = TranscriptionCache()
+        self.assertEqual(cache.transcribe('uk', text, stress_lexicon=lexicon), transcribe_uk(uk_stressed))
+
+        #Lexicons built from the same words share the entries of the cache, other lexicons do not
+        entries = len(cache)
+        same = self.build(words, 'same.lex')
+        self.assertEqual(same, lexicon)
+        cache.transcribe('uk', text, stress_lexicon=same)
+        self.assertEqual(len(cache), entries)
+        other = self.build(['ві́тер'], 'other.lex')
+        self.assertNotEqual(other, lexicon)
+        cache.transcribe('uk', text, stress_lexicon=other)
+        self.assertGreater(len(cache), entries)
+
+        lexicon = self.build(['малако́', 'вада́', 'гра́д', 'вода́'], 'be_bg.lex')
+        self.assertEqual(transcribe_be('малако вада', stress_lexicon=lexicon), transcribe_be('малако́ вада́'))
+        self.assertEqual(transcribe_bg('град вода', stress_lexicon=lexicon), transcribe_bg('гра́д вода́'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import random
+import unittest
+from benchmarks import samples
+from languages import get_transcriber
+from word_cache import TranscriptionCache
+
+
+def shuffled_texts(lang, count, seed=0):
+    """Random sequences of the words of the sample text of a language, so that each
+    word is cached in several contexts"""
+    rng = random.Random(seed)
+    words = samples[lang].split()
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+
+class TestTranscriptionCache(unittest.TestCase):
+
+    def test_uncached_equivalence(self):
+        for lang in ['be', 'bg', 'cz', 'es', 'gr', 'pl']:
+            function = get_transcriber(lang)
+            cache = TranscriptionCache()
+            for text in [samples[lang]] + shuffled_texts(lang, 200):
+                self.assertEqual(cache.transcribe(lang, text), function(text), text)
+            self.assertGreater(cache.stats()['hit_rate'], 0.5)
+            self.assertEqual(cache.stats()['bypasses'], 0)
+
+
+    def test_options(self):
+        cache = TranscriptionCache()
+        pl, es = get_transcriber('pl'), get_transcriber('es')
+        for text in shuffled_texts('pl', 50):
+            self.assertEqual(cache.transcribe('pl', text, stress=False), pl(text, stress=False))
+            self.assertEqual(cache.transcribe('pl', text), pl(text))
+        for text in shuffled_texts('es', 50):
+            self.assertEqual(cache.transcribe('es', text, yeismo=False), es(text, yeismo=False))
+
+        #Passing the default value explicitly shares the entries of the default
+        entries = len(cache)
+        cache.transcribe('pl', samples['pl'], stress=True)
+        self.assertEqual(len(cache), entries)
+
+
+    def test_bounds(self):
+        cz = get_transcriber('cz')
+        cache = TranscriptionCache(max_entries=10, max_bytes=None)
+        for text in shuffled_texts('cz', 50):
+            self.assertEqual(cache.transcribe('cz', text), cz(text))
+            self.assertLessEqual(len(cache), 10)
+        self.assertGreater(cache.stats()['evictions'], 0)
+
+        cache = TranscriptionCache(max_entries=None, max_bytes=5_000)
+        for text in shuffled_texts('cz', 50):
+            self.assertEqual(cache.transcribe('cz', text), cz(text))
+            self.assertLessEqual(cache.stats()['bytes'], 5_000)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+
+    def test_wrap_and_bypass(self):
+        cache = TranscriptionCache()
+        transcribe_pl = cache.wrap('pl')
+        self.assertEqual(transcribe_pl.__name__, 'transcribe_pl')
+        self.assertEqual(transcribe_pl(samples['pl']), get_transcriber('pl')(samples['pl']))
+
+        #Serbian script conversion is never cached
+        self.assertEqual(cache.transcribe('sr', samples['sr']), get_transcriber('sr')(samples['sr']))
+        self.assertEqual(cache.stats()['bypasses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
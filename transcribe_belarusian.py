@@ -5,11 +5,16 @@
 
 import re
 from string import punctuation
+from profiling import stage
+from array import array
+from context_rules import ContextRule, apply_rules_batch
+from phones import PhoneInventory, decode, encode, iter_word_spans, segment_id, segment_map, segments, SegmentTable, OBSTRUENT, STRESS, VOICED, VOICELESS, VOWEL
+from stress_lexicon import add_stress
 
 #Note that Belarusian has unpredictable, mobile stress and thus stress can 
 #only be marked in the IPA transcriptions when marked orthographically 
 #using the '́' (accute accent) stress mark
-#e.g. <галава́>
+#e.g. <галава́>, or added from a stress lexicon (see stress_lexicon.py)
 stress_mark = '́'
 
 #Belarusian Cyrillic alphabet to basic IPA conversion
@@ -68,7 +73,30 @@ be_voicing_dict = {be_devoicing_dict[voiced]:voiced for voiced in be_devoicing_d
 #List of Belarusian obstruents
 be_obstruents = list(be_devoicing_dict.keys()) + list(be_voicing_dict.keys()) + ['k']
 
+#Features of the Belarusian segments (see phones.py)
+be_phones = PhoneInventory('be', {VOWEL:be_vowels,
+                                  OBSTRUENT:be_obstruents,
+                                  VOICED:list(be_devoicing_dict.keys()),
+                                  VOICELESS:list(be_voicing_dict.keys()) + ['k'],
+                                  STRESS:['ˈ']})
 
+#Set of obstruents, for constant-time membership tests
+_be_obstruent_set = be_phones.segments(OBSTRUENT)
+
+#Tables of segment IDs, for the stages working on arrays of segment IDs (see phones.py)
+_be_id_masks = be_phones.id_masks()
+_be_devoicing_ids = segment_map(be_devoicing_dict)
+_be_voicing_ids = segment_map(be_voicing_dict)
+_be_v_ids = SegmentTable(lambda segment: segment.rstrip('ʲ') == 'v')
+_be_palatalized_ids = SegmentTable(lambda segment: segment.endswith('ʲ'))
+_be_hard_ids = SegmentTable(lambda segment: segment[0] in ['ʂ', 'ʐ', 'ʧ', 'ʤ'])
+_be_palatalizing_ids = SegmentTable(lambda segment: segment_id(segment + 'ʲ'))
+
+#be_final_devoicing_ids as a rule for batches of texts (see context_rules.py)
+be_final_devoicing_rules = [ContextRule(be_devoicing_dict, after=str.isspace)]
+
+
+@stage
 def be2ipa(text):
     """Performs preliminary conversion from Belarusian Cyrillic to IPA"""
     #Lower-case the text
@@ -87,6 +115,7 @@ def be2ipa(text):
     return tr
 
 
+@stage
 def be_palatalization(text):
     """Performs palatalization of relevant consonants"""
     
@@ -155,6 +184,7 @@ def be_palatalization(text):
     return tr
 
 
+@stage
 def be_stress(text):
     """Adjusts stress marking (stress marking is required for this to work)"""
     
@@ -195,6 +225,7 @@ def be_stress(text):
     
     return text
 
+@stage
 def be_vowel_reduction(text):
     """Performs vowel reduction of /a/ to [ʌ] in pre-stressed syllables, not 
     immediately preceding the stressed syllable"""
@@ -234,6 +265,7 @@ def be_vowel_reduction(text):
     return ' '.join(words)
 
 
+@stage
 def adjust_soft_vowels(text):
     """Changes intervocalic /ʲ/ to /j/"""
     
@@ -247,7 +279,7 @@ def adjust_soft_vowels(text):
                 
                 #If the /ʲ/ appears between two vowels, change it to /j/
                 #Include stress mark in search scope, in case next vowel is stressed
-                if ((prev_ch in be_vowels) and (nxt_ch in be_vowels+['ˈ'])):
+                if be_phones.mask(prev_ch) & VOWEL and be_phones.mask(nxt_ch) & (VOWEL | STRESS):
                     tr[i] = 'j'
                 
                 
@@ -262,93 +294,75 @@ def adjust_soft_vowels(text):
     return tr
 
 
+@stage
 def be_final_devoicing(text):
     """Performs word-final obstruent devoicing"""
+    return decode(be_final_devoicing_ids(encode(' '.join(text.split()))))
+
+
+def be_final_devoicing_ids(ids):
+    """Performs word-final obstruent devoicing on an array of segment IDs"""
     
-    #Split the text into words
-    words = text.split()
+    #Devoice the final segment of each word, if possible, including palatalized /Cʲ/
+    tr = array('I', ids)
+    for start, end in iter_word_spans(tr):
+        tr[end-1] = _be_devoicing_ids[tr[end-1]]
     
-    #Iterate through the words and devoice the final sound, if possible
-    for w in range(len(words)):
-        word = words[w]
-        phones = list(word)
-        
-        #If the final character is not "ʲ", directly try to devoice this character
-        if phones[-1] != "ʲ":
-            phones[-1] = be_devoicing_dict.get(phones[-1], phones[-1])
-        
-        #Otherwise try to devoice the character precending "ʲ"
-        else:
-            phones[-2] = be_devoicing_dict.get(phones[-2], phones[-2])
-        
-        words[w] = ''.join(phones)
-    
-    return ' '.join(words)
+    return tr
 
 
+@stage
 def be_obstruent_assimilation(text):
     """Performs voicing and palatalization assimilation on obstruent sequences"""
+    return decode(be_obstruent_assimilation_ids(encode(text)))
+
+
+def be_obstruent_assimilation_ids(ids):
+    """Performs voicing and palatalization assimilation on obstruent sequences
+    on an array of segment IDs"""
     
-    #Split the text into characters
-    text = list(text)
-    
-    #Iterate backwards through the text
-    for i in range(len(text)-1,-1,-1):
-        ch = text[i]
+    #Iterate backwards through the segments, so that assimilation spreads leftwards
+    #through obstruent clusters
+    tr = array('I', ids)
+    masks = _be_id_masks
+    for i in range(len(tr)-2, -1, -1):
+        seg = tr[i]
         
-        #Check whether the current segment is an obstruent
-        if ch in be_obstruents:
-            
-            #Try to find the next segment
-            try:
-                if text[i+1] != 'ʲ':
-                    j = i+1
-                else:
-                    j = i+2
-                nxt = text[j]
+        #Check whether the current and the next segments are obstruents
+        if masks[seg] & OBSTRUENT:
+            nxt = tr[i+1]
+            nxt_mask = masks[nxt]
+            if nxt_mask & OBSTRUENT:
                 
-                #Check whether the next segment is an obstruent
-                if nxt in be_obstruents:
-                    
-                    #/v/ does not trigger voice assimilation
-                    if nxt != 'v':
-                    
-                        #If so, check whether it is voiced or voiceless
-                        voiced = nxt in be_devoicing_dict.keys()
-                        
-                        #Assimilate voicing of current obstruent to next obstruent's voicing
-                        if voiced == True:
-                            text[i] = be_voicing_dict.get(ch, ch)
-                        else:
-                            text[i] = be_devoicing_dict.get(ch, ch)
-                    
-                    #Then check whether it is palatalized
-                    try:
-                        nxtnxt = text[j+1]
-                        palatalized = nxtnxt == 'ʲ'
-                        
-                        #If the next segment is palatalized but the current segment is not,
-                        #palatalize also the current segment
-                        if palatalized == True:
-                            if j == i+1:
-                                
-                                #But never palatalize the "hard" consonants
-                                if ch not in ['ʂ', 'ʐ', 'ʧ', 'ʤ']:
-                                    text.insert(j, 'ʲ')
-                        
-                    except IndexError:
-                        pass
-            
-                    
-            #If there is no following segment, change nothing
-            except IndexError:
-                pass
+                #/v/ does not trigger voice assimilation
+                #Otherwise assimilate voicing of current obstruent to next obstruent's voicing
+                if not _be_v_ids[nxt]:
+                    if nxt_mask & VOICED:
+                        seg = _be_voicing_ids[seg]
+                    else:
+                        seg = _be_devoicing_ids[seg]
+                
+                #If the next segment is palatalized but the current segment is not,
+                #palatalize also the current segment
+                #But never palatalize the "hard" consonants
+                if _be_palatalized_ids[nxt] and not _be_palatalized_ids[seg] and not _be_hard_ids[seg]:
+                    seg = _be_palatalizing_ids[seg]
+                tr[i] = seg
     
-    return ''.join(text)
+    return tr
     
 
 
-def transcribe_be(text):
+@stage
+def transcribe_be(text, stress_lexicon=None, backend=None):
+    """If a StressLexicon is given as stress_lexicon, the stress of words
+    not marked in the orthography is taken from it.
+    With backend='numpy' or 'python', final devoicing is applied as context rules
+    by that backend of context_rules.apply_rules_batch, with the same result"""
+    #Mark stress from the stress lexicon
+    if stress_lexicon is not None:
+        text = add_stress(text, stress_lexicon)
+    
     #Convert Belarusian Cyrillic into preliminary IPA
     step1 = be2ipa(text)
     
@@ -363,14 +377,18 @@ def transcribe_be(text):
     
     #Adjust representation of palatalizing vowels
     step5 = adjust_soft_vowels(step4)
-
-    #Perform final obstruent devoicing
-    step6 = be_final_devoicing(step5)
+    
+    #Continue on the array of segment IDs, in which palatalized consonants are single segments,
+    #performing final obstruent devoicing
+    if backend is None:
+        ids = be_final_devoicing_ids(encode(' '.join(step5.split())))
+    else:
+        ids = encode(apply_rules_batch([step5], be_final_devoicing_rules, backend=backend)[0])
     
     #Perform obstruent voicing/palatalization assimilation
-    step7 = be_obstruent_assimilation(step6)
+    ids = be_obstruent_assimilation_ids(ids)
     
-    return step7
+    return decode(ids)
 
 
 
@@ -8,7 +8,8 @@
 #Notes about limitations:
 # 1) Bulgarian exhibits both variable stress and vowel reduction in unstressed syllables.
 #   In order to yield the correct transcriptions, the orthographic form must be
-#   annotated with stress, using the accute accent '́'.
+#   annotated with stress, using the accute accent '́', or the stress must be
+#   added from a stress lexicon (see stress_lexicon.py).
 #
 # 2) Bulgarian verbs ending in stressed <a, я> are pronounced with the vowel
 #   /ɤ/ instead of /a/, as if spelled with <ъ>. This G2P tool operates only 
@@ -18,6 +19,9 @@
 
 import re
 from string import punctuation
+from profiling import stage
+from phones import PhoneInventory, CONSONANT, OBSTRUENT, VOICED, VOICELESS
+from stress_lexicon import add_stress
 stress_mark = '́'
 
 #Bulgarian Cyrillic alphabet to basic IPA conversion
@@ -74,10 +78,20 @@ bg_voicing_dict = {bg_devoicing_dict[seg]:seg for seg in bg_devoicing_dict}
 bg_voiced_obstruents = list(bg_devoicing_dict.keys())
 bg_voiceless_obstruents = list(bg_devoicing_dict.values())
 
+#Features of the Bulgarian segments (see phones.py)
+bg_phones = PhoneInventory('bg', {CONSONANT:bg_consonants,
+                                  OBSTRUENT:bg_obstruents,
+                                  VOICED:bg_voiced_obstruents,
+                                  VOICELESS:bg_voiceless_obstruents})
+
+#Set of obstruents, for constant-time membership tests
+_bg_obstruent_set = bg_phones.segments(OBSTRUENT)
+
 #Dictionary of vowels and their reduced equivalents
 bg_vowel_reduction_dict = {'a':'ɐ', 'ɤ':'ɐ', 'ɔ':'o'}
 
 
+@stage
 def bg2ipa(text):
     """Performs preliminary conversion from Bulgarian Cyrillic to IPA"""
     #Lower-case the text
@@ -102,6 +116,7 @@ def bg2ipa(text):
 
 
 
+@stage
 def bg_vowel_reduction(text):
     """Marks stress in IPA and performs vowel reduction of 
     /a, ɤ, ɔ/ in unstressed syllables"""
@@ -134,62 +149,64 @@ def bg_vowel_reduction(text):
     return ' '.join(tr)
     
 
+def bg_assimilate_word(word, nxt_word=None):
+    """Devoices the final obstruent of a word and regressively assimilates its obstruent
+    sequences, given the following word (None at the end of the text)"""
+    word_tr = list(word)
+    
+    #Iterate backwards through the segments of the word
+    for i in range(len(word_tr)-1,-1,-1):
+        ch = word_tr[i]
+        if ch in _bg_obstruent_set:
+            
+            #Within the word, assimilate to the following (already assimilated) segment,
+            #and at the end of the word to the first segment of the following word
+            if i+1 < len(word_tr):
+                nxt_ch = word_tr[i+1]
+            elif nxt_word is not None:
+                nxt_ch = nxt_word[0]
+            
+            #If there is no following word in the text, then devoice,
+            #unless the word is <в> /v/, then leave voiced in citation form
+            else:
+                if word != 'v':
+                    word_tr[i] = bg_devoicing_dict.get(ch, ch)
+                else:
+                    word_tr[i] = 'v'
+                continue
+            
+            #Obstruents are devoiced before obstruents which are not voiced (/v/ included);
+            #before voiced obstruents they are left unchanged
+            if bg_phones.mask(nxt_ch) & (OBSTRUENT | VOICED) == OBSTRUENT:
+                word_tr[i] = bg_devoicing_dict.get(ch, ch)
+    
+    return ''.join(word_tr)
+
+
+def iter_bg_voicing_assimilation(words):
+    """Performs voicing assimilation on an iterable of words, reading one word ahead and
+    yielding each assimilated word as soon as the following word has been read,
+    so that arbitrarily long texts are processed in constant memory"""
+    words = iter(words)
+    word = next(words, None)
+    while word is not None:
+        nxt_word = next(words, None)
+        yield bg_assimilate_word(word, nxt_word)
+        word = nxt_word
+
+
+@stage
 def bg_voicing_assimilation(text):
     """Devoices word-final obstruents and then regressively assimilates 
     sequences of obstruents according to the voicing of the final obstruent
     (except when the final obstruent is /v/)"""
     
-    #First split the text into words
-    words = text.split()
-    
-    #Iterate backwards through words of text and perform final devoicing 
-    #and voicing assimilation on each, with voicing assimilation across word boundaries
-    tr = []
-    for j in range(len(words)-1,-1,-1):
-        word = words[j]
-        word_tr = list(word) 
-        for i in range(len(word_tr)-1,-1,-1): 
-            ch = word_tr[i] 
-            if ch in bg_obstruents: 
-                try:
-                    nxt_ch = word_tr[i+1]
-                    if nxt_ch in bg_obstruents:
-                        if nxt_ch != 'v':
-                            voicing = nxt_ch in bg_voiced_obstruents
-                            if voicing == True:
-                                word_tr[i] == bg_voicing_dict.get(ch, ch)
-                            else:
-                                word_tr[i] = bg_devoicing_dict.get(ch, ch)
-                                
-                #If the final segment of the word, try to assimilate voicing
-                #with the first segment of the following word. 
-                
-                except IndexError:
-                    try: 
-                        nxt_word = words[j+1]
-                        nxt_word_seg1 = nxt_word[0]
-                        if nxt_word_seg1 in bg_obstruents:
-                            if nxt_word_seg1 != 'v':
-                                voicing = nxt_word_seg1 in bg_voiced_obstruents
-                                if voicing == True:
-                                    word_tr[i] == bg_voicing_dict.get(ch, ch)
-                                else:
-                                    word_tr[i] = bg_devoicing_dict.get(ch, ch)
-                            
-                    #If there is no following word in the text, then devoice.
-                    except IndexError:
-                        
-                        #Unless the word is <в> /v/, then leaved voiced in citation form
-                        if word != 'v':
-                            word_tr[i] = bg_devoicing_dict.get(ch, ch)
-                        else:
-                            word_tr[i] = 'v'
-                        
-        tr.insert(0, ''.join(word_tr))
-        
-    return ' '.join(tr)
+    #Perform final devoicing and voicing assimilation on each word,
+    #with voicing assimilation across word boundaries
+    return ' '.join(iter_bg_voicing_assimilation(text.split()))
 
 
+@stage
 def bg_palatalization(text):
     """Performs palatalization of all consonants preceding /j/, /Cj/ --> /Cʲ/,
     and also of velar stops preceding the front vowels /i, ɛ/"""
@@ -217,10 +234,17 @@ def bg_palatalization(text):
     
     
 
-def transcribe_bg(text, palatalization=True):
+@stage
+def transcribe_bg(text, palatalization=True, stress_lexicon=None):
     """If palatalization is set to True, /Cj/ sequences will be transcribed as
     palatalized rather than as sequences of a consonant followed by /j/;
-    the velar stops /k/ and /ɡ/ will also be palatalized before front vowels"""
+    the velar stops /k/ and /ɡ/ will also be palatalized before front vowels.
+    If a StressLexicon is given as stress_lexicon, the stress of words
+    not marked in the orthography is taken from it"""
+    
+    #Mark stress from the stress lexicon
+    if stress_lexicon is not None:
+        text = add_stress(text, stress_lexicon)
     
     #Step 1: Convert Bulgarian Cyrillic to basic IPA
     step1 = bg2ipa(text)
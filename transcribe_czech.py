@@ -2,6 +2,10 @@
 #Written by Philip Georgis (2021)
 
 import re
+from rewriter import Rewriter
+from profiling import stage
+from context_rules import ContextRule, apply_rules_batch
+from phones import PhoneInventory, CONSONANT, OBSTRUENT, PALATALIZABLE, SYLLABIC_MARK, VOICED, VOICELESS, VOWEL
 
 #Mapping of Czech orthographic characters to IPA symbols
 #Any characters not included here have identical IPA representation,
@@ -38,6 +42,9 @@ cz_digraphs = {'au':'au̯',
                'nk':'ŋk',
                'qu':'kv'}
 
+#Basic IPA conversion applied by cz_g2p: digraphs, then single characters, then <X> --> /x/
+cz_rewriter = Rewriter(list(cz_digraphs.items()) + list(czech_ipa.items()) + [('X', 'x')])
+
 #Characters which undergo palatalization before <i>, <í>, <ě>
 cz_palatal_dict = {'d':'ɟ',
                    't':'c',
@@ -74,43 +81,43 @@ cz_voiceless = list(cz_voicing_dict.keys())
 
 cz_vowels = ['a', 'i', 'ɛ', 'ɪ', 'o', 'u']
 
+#Features of the Czech segments (see phones.py)
+cz_phones = PhoneInventory('cz', {VOWEL:cz_vowels,
+                                  CONSONANT:cz_consonants,
+                                  OBSTRUENT:cz_obstruents,
+                                  VOICED:list(cz_devoicing_dict.keys()),
+                                  VOICELESS:cz_voiceless,
+                                  PALATALIZABLE:list(cz_palatal_dict.keys()),
+                                  SYLLABIC_MARK:['̩']})
+
+#Sets of segments, for constant-time membership tests
+#inside the character loops of voicing assimilation and syllable counting
+_cz_obstruent_set = cz_phones.segments(OBSTRUENT)
+_cz_voiceless_set = cz_phones.segments(VOICELESS)
+_cz_syllabic_set = cz_phones.segments(VOWEL | SYLLABIC_MARK)
+
 #Characters (spaces, punctuation, etc.) which mark the end of a word
 ending = [' ', '.', ',', ';', ':', '!', '?', '[', ']', '(', ')', "'", '"']
 
 
+@stage
 def cz_g2p(text):
     """Converts an orthographic text to a basic IPA representation"""
     
-    #Lowercase the text and split it into a list of words
-    text = text.lower().split()
-
-    #Iterate through words in the text and store their basic transcriptions in a list
-    tr = []
-    for word in text:
-        tr_word = word[:]
-        
-        #Convert two-character sequences to IPA first
-        for digraph in cz_digraphs:
-            tr_word = re.sub(digraph, cz_digraphs[digraph], tr_word)
-        
-        #Then convert remaining single characters to IPA
-        for ch in czech_ipa:
-            tr_word = re.sub(ch, czech_ipa[ch], tr_word)
-        
-        #Treat digraph <ch> /x/ separately
-        #If initially converted to /x/, it would be mistaken for orthographic <x>
-        #and be transcribed as /ks/ in second step
-        #Convert at first to <X> with cz_digraphs, then convert <X> to /x/
-        #<ch> --> <X> --> /x/
-        tr_word = re.sub('X', 'x', tr_word)
-        
-        #Add transcribed word to list of transcribed words
-        tr.append(tr_word)
-        
-    return ' '.join(tr)
+    #Lowercase the text and separate its words by single spaces
+    text = ' '.join(text.lower().split())
+    
+    #Convert two-character sequences to IPA first, then remaining single characters
+    #Treat digraph <ch> /x/ separately
+    #If initially converted to /x/, it would be mistaken for orthographic <x>
+    #and be transcribed as /ks/ in second step
+    #Convert at first to <X> with cz_digraphs, then convert <X> to /x/
+    #<ch> --> <X> --> /x/
+    return cz_rewriter(text)
 
 
 
+@stage
 def palatalize_cz(text):
     """Carries out palatalization of consonants in the relevant context"""
     tr = []
@@ -174,6 +181,7 @@ def palatalize_cz(text):
 
 
 
+@stage
 def final_devoicing(text):
     """Carries out word-final devoicing"""
     
@@ -191,7 +199,7 @@ def final_devoicing(text):
         i = 0
         w = []
         j = len(word) - 1
-        while word[j] in ending:
+        while j >= 0 and word[j] in ending:
             j -= 1
             
         #Iterate forward through characters until character at index j
@@ -213,6 +221,13 @@ def final_devoicing(text):
 
 
 
+#final_devoicing as a rule on arrays of segment IDs (see context_rules.py), for word-final
+#segments followed at most by punctuation
+cz_final_devoicing_rules = [ContextRule(cz_devoicing_dict, after=str.isspace,
+                                        skip=lambda segment: segment in ending and segment != ' ')]
+
+
+@stage
 def syllabify(text):
     """Adds syllabic diacritics to /r, l, m, n/ if one of the following conditions is met:
         (1) at beginning of word and next character is a consonant
@@ -304,96 +319,66 @@ def syllabify(text):
 
 
 
+@stage
 def cz_voice_assim(text):
     "Performs forward and backward voicing assimilation of obstruents"
 
-    tr = []
-    
     #Backward voicing assimilation (from following to preceding consonant)
-    #Iterate backwards through characters in the text
-    for i in range(len(text)-1,-1,-1):
-    
-        ch = text[i]
+    #Iterate backwards through characters in the text, appending each segment
+    #to a reversed list so that the following segment is always tr[-1];
+    #the list is reversed once at the end, keeping the pass linear in the length of the text
+    tr = []
+    for ch in reversed(text):
         
         #Perform voicing assimilation if the character is an obstruent
         #(and if the following character is also an obstruent)
-        if ch in cz_obstruents:
+        #Do not change anything if it is the final character of the text
+        if tr and ch in _cz_obstruent_set:
+            nxt = tr[-1]
             
-            #Check for a following character, which will be the first character 
-            #of the transcribed list constructed in reverse order
-            try:
-                nxt = tr[0]
-                
-                #Exception to regressive voicing assimilation is sequence <sh>
-                #Underlyingly /sɦ/, but pronounced /sx/ rather than /zɦ/ (Bohemia, not Moravia)
-                #Note: some words do use /zɦ/, e.g. <shora>, <shluk> but this detail is ignored here
-                #No need to mark the case where /ɦ/ has been devoiced to /x/ word-finally
-                #as no voicing assimilation will occur in that case
-                if (ch, nxt) == ('s', 'ɦ'):
-                    tr[0] = 'x'
-                    tr.insert(0, ch)
-                    continue
+            #Exception to regressive voicing assimilation is sequence <sh>
+            #Underlyingly /sɦ/, but pronounced /sx/ rather than /zɦ/ (Bohemia, not Moravia)
+            #Note: some words do use /zɦ/, e.g. <shora>, <shluk> but this detail is ignored here
+            #No need to mark the case where /ɦ/ has been devoiced to /x/ word-finally
+            #as no voicing assimilation will occur in that case
+            if ch == 's' and nxt == 'ɦ':
+                tr[-1] = 'x'
+            
+            #Check if the following character is an obstruent
+            #<v, ř> /v, r̝/ do not trigger voicing assimilation of preceding consonant
+            elif nxt in _cz_obstruent_set and nxt not in ['v', 'ř']:
                 
-                #Check if the following character is an obstruent
-                if nxt in cz_obstruents:
-                    
-                    #<v, ř> /v, r̝/ do not trigger voicing assimilation of preceding consonant
-                    if nxt not in ['v', 'ř']:
-                        
-                        #Check whether the following segment is voiced or voiceless
-                        voice = nxt not in cz_voiceless
-                        
-                        #Devoice or voice the present segment according to 
-                        #the voicing of the following segment
-                        if voice == False:
-                            tr.insert(0, cz_devoicing_dict.get(ch, ch))
-                        else:
-                            tr.insert(0, cz_voicing_dict.get(ch, ch))
-                    
-                    #Change nothing if the following consonant was one of <v, ř> /v, r̝/
-                    else:
-                        tr.insert(0, ch)
+                #Devoice or voice the present segment according to 
+                #the voicing of the following segment
+                if nxt in _cz_voiceless_set:
+                    ch = cz_devoicing_dict.get(ch, ch)
                 else:
-                    tr.insert(0, ch)
-                    
-            #Do not change anything if it is the final character of the text
-            except IndexError:
-                tr.insert(0, ch)
+                    ch = cz_voicing_dict.get(ch, ch)
         
-        #Otherwise change nothing
-        else:
-            tr.insert(0, ch)
+        tr.append(ch)
+    tr.reverse()
  
     #Forward voicing assimilation: only affects <ř> (from preceding to following consonant)
-    new_tr = [tr[0]]
+    #If the preceding segment was voiceless, devoice <ř> to <ř̊>
+    #Otherwise leave <ř> as is; don't change segments other than <ř>
+    new_tr = tr[:1]
     for i in range(1, len(tr)):
         ch = tr[i]
-        if ch == 'ř':
-            
-            #Check what the preceding segment was
-            prev = tr[i-1]
-            
-            #If the preceding segment was voiceless, devoice <ř> to <ř̊>
-            if prev in cz_voiceless:
-                new_tr.append(cz_devoicing_dict[ch])
-            
-            #Otherwise leave <ř> as is
-            else:
-                new_tr.append(ch)
-        
-        #Don't change segments other than <ř>
+        if ch == 'ř' and tr[i-1] in _cz_voiceless_set:
+            new_tr.append(cz_devoicing_dict[ch])
         else:
             new_tr.append(ch)
             
-            
     return ''.join(new_tr)
 
 
 def count_syllables(word, vowels=cz_vowels):
     """Counts syllables in word"""
-    return len([ch for ch in word if ch in vowels+['̩']]) - word.count('̯')
+    syllabic = _cz_syllabic_set if vowels is cz_vowels else set(vowels + ['̩'])
+    return len([ch for ch in word if ch in syllabic]) - word.count('̯')
 
 
+@stage
 def add_stress(text):
     """Adds stress marking to the first syllabic segment of each word in the text"""
     #Store transcriptions in list
@@ -453,7 +438,10 @@ def add_stress(text):
             
             
 
-def transcribe_cz(text, stress=True):
+@stage
+def transcribe_cz(text, stress=True, backend=None):
+    """With backend='numpy' or 'python', final devoicing is applied as context rules
+    by that backend of context_rules.apply_rules_batch, with the same result"""
     #Get basic IPA transcription
     step1 = cz_g2p(text)
     
@@ -461,7 +449,10 @@ def transcribe_cz(text, stress=True):
     step2 = palatalize_cz(step1)
     
     #Perform final devoicing
-    step3 = final_devoicing(step2)
+    if backend is None:
+        step3 = final_devoicing(step2)
+    else:
+        step3 = apply_rules_batch([step2], cz_final_devoicing_rules, backend=backend)[0]
     
     #Perform voicing assimilation
     step4 = cz_voice_assim(step3)
@@ -2,6 +2,9 @@
 #Written by Philip Georgis, 2021
 
 import re
+from rewriter import Rewriter
+from profiling import stage
+from phones import PhoneInventory, PALATALIZABLE, STRESS, VOICELESS, VOWEL
 
 greek_ipa = {'α':'a',
              'β':'v',
@@ -65,6 +68,12 @@ greek_digraphs = {'αι':'e',
                   'τσ':'ʦ',
                   'τζ':'ʣ'}
 
+#Basic IPA conversion applied by gr2ipa: digraphs, then single letters
+#No digraph starts with the second letter of an earlier one, and no replacement contains
+#a Greek letter other than θ, so this gives the same result as a longest-match scan of
+#the tables (checked against both by the gr2ipa benchmark)
+gr_rewriter = Rewriter(list(greek_digraphs.items()) + list(greek_ipa.items()))
+
 gr_palatalization_dict = {#Phonemes palatalized before all front vowels 
                           'k':'c',
                           'ɡ':'ɟ',
@@ -83,29 +92,48 @@ gr_voicing_dict = {'p':'b',
                    'ʦ':'ʣ'}
 
 
-greek_phones = set(p for tr in list(greek_ipa.values()) + list(greek_digraphs.values()) + list(gr_palatalization_dict.values())
-                   for p in tr)
 gr_vowels = ['a', 'e', 'i', 'o', 'u']
-gr_consonants = [p for p in greek_phones if p not in gr_vowels+['ˈ']]
+
+#The inventories of Greek phones and consonants (greek_phones, gr_consonants)
+#are only built when first used
+_gr_tables = {}
+
+def gr_tables():
+    """Returns the set of Greek phones and the list of Greek consonants, building them on first use"""
+    if not _gr_tables:
+        greek_phones = set(p for tr in list(greek_ipa.values()) + list(greek_digraphs.values()) + list(gr_palatalization_dict.values())
+                           for p in tr)
+        _gr_tables['greek_phones'] = greek_phones
+        _gr_tables['gr_consonants'] = [p for p in greek_phones if p not in gr_vowels+['ˈ']]
+    return _gr_tables['greek_phones'], _gr_tables['gr_consonants']
+
+
+def __getattr__(name):
+    if name in ['greek_phones', 'gr_consonants']:
+        gr_tables()
+        return _gr_tables[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 gr_voiceless = ['p', 't', 'c', 'k', 'ʦ', 'f', 'θ', 's', 'ç', 'x']
 
+#Features of the Greek segments (see phones.py)
+gr_phones = PhoneInventory('gr', {VOWEL:gr_vowels,
+                                  VOICELESS:gr_voiceless,
+                                  PALATALIZABLE:list(gr_palatalization_dict.keys()),
+                                  STRESS:['ˈ']})
+_gr_voiceless_set = gr_phones.segments(VOICELESS)
+
 
+@stage
 def gr2ipa(text):
     #Lowercase the text
     text = text.lower()
     
-    #Convert digraphs to IPA first
-    for digraph in greek_digraphs:
-        text = re.sub(digraph, greek_digraphs[digraph], text)
-    
-    #Then convert remaining single letters to IPA
-    for letter in greek_ipa:
-        text = re.sub(letter, greek_ipa[letter], text)
-    
-    return text
+    #Convert digraphs to IPA first, then remaining single letters
+    return gr_rewriter(text)
 
 
+@stage
 def greek_glides(text):
     #Convert /iV/ to /jV/
     text = list(text)
@@ -116,7 +144,7 @@ def greek_glides(text):
                 nxt = text[i+1]
                 
                 #Check if the next character is a vowel or stress marker (which indicates the following sound is a vowel)
-                if nxt in gr_vowels + ["ˈ"]:
+                if gr_phones.mask(nxt) & (VOWEL | STRESS):
                     
                     #Check that the /i/ is not stressed and not word-initial
                     if i > 0:
@@ -132,7 +160,9 @@ def greek_glides(text):
     return ''.join(text)
         
 
+@stage
 def greek_palatalization(text, strong_palatalization=True):
+    gr_consonants = gr_tables()[1]
     text = list(text)
     
     for i in range(len(text)):
@@ -186,7 +216,7 @@ def greek_palatalization(text, strong_palatalization=True):
         
         if ch == 'j':
             prev_ch = text[i-1]
-            if prev_ch in gr_voiceless:
+            if prev_ch in _gr_voiceless_set:
                 text[i] = 'ç'
                 
             #Exception */CɾjV/ --> /CɾiV/
@@ -207,7 +237,9 @@ def greek_palatalization(text, strong_palatalization=True):
     return text
             
             
+@stage
 def voicing_assimilation(text):
+    gr_consonants = gr_tables()[1]
     text = list(text)
     
     for i in range(len(text)):
@@ -217,7 +249,7 @@ def voicing_assimilation(text):
         if ch == 'w':
             try:
                 nxt = text[i+1]
-                if nxt in gr_voiceless:
+                if nxt in _gr_voiceless_set:
                     text[i] = 'f'
                 
                 else:
@@ -233,7 +265,7 @@ def voicing_assimilation(text):
             try:
                 nxt = text[i+1]
                 if nxt in gr_consonants:
-                    if nxt not in gr_voiceless:
+                    if nxt not in _gr_voiceless_set:
                         text[i] = 'z'
             
             except IndexError:
@@ -242,7 +274,9 @@ def voicing_assimilation(text):
     return ''.join(text)
 
 
+@stage
 def gemination_reduction(text):
+    gr_consonants = gr_tables()[1]
     if len(text) > 0:
         reduced_text = [text[0]]
         for i in range(1, len(text)):
@@ -258,45 +292,73 @@ def gemination_reduction(text):
         return text
     
 
+#Grammatical words after which word-initial plosives are voiced
+gr_articles = ['tin', 'ton', 
+               'stin', 'ston',
+               'aftˈin', 'aftˈon',
+               'ðen', 'min']
+
+
+def denasalize_word(word):
+    """Removes the prenasalization of a word-initial voiced plosive"""
+    if word[0] in ['ᵐ', 'ⁿ', 'ᵑ']:
+        return word[1:]
+    return word
+
+
+def voice_after_article(word):
+    """Voices the initial plosive of a word following one of gr_articles"""
+    word = list(word)
+    word[0] = gr_voicing_dict[word[0]]
+    
+    #Revoice <ξ, ψ> to /ɡz, bz/
+    if len(word) > 1:
+        if word[0] in ['b', 'ɡ']:
+            if word[1] == 's':
+                word[1] = 'z'
+    return ''.join(word)
+
+
+def iter_word_boundary_voicing(words):
+    """Carries out word_boundary_voicing on a stream of words, keeping one word of lookbehind"""
+    prev_word = prev_tr = None
+    for word in words:
+        tr = word
+        if prev_word in gr_articles and word[0] in gr_voicing_dict:
+            tr = voice_after_article(word)
+            prev_tr = prev_tr[:-1]
+        if prev_tr is not None:
+            yield prev_tr
+        prev_word, prev_tr = word, tr
+    if prev_tr is not None:
+        yield prev_tr
+
+
+def iter_word_boundaries(words):
+    """Carries out denasalize_plosives and word_boundary_voicing on a stream of words"""
+    return iter_word_boundary_voicing(word for word in map(denasalize_word, words) if word)
+
+
+@stage
 def denasalize_plosives(text):
     #Split text into words
-    words = text.split()
-    
-    for i in range(len(words)):
-        word = words[i]
-        if word[0] in ['ᵐ', 'ⁿ', 'ᵑ']:
-            words[i] = word[1:]
-    text = ' '.join(words)
-    return text
+    return ' '.join([denasalize_word(word) for word in text.split()])
 
 
+@stage
 def word_boundary_voicing(text):
-    #Split text into words
-    words = text.split()
-    
-    for i in range(len(words)-1, 0, -1):
-        word = words[i]
-        prev_word = words[i-1]
-        if prev_word in ['tin', 'ton', 
-                         'stin', 'ston',
-                         'aftˈin', 'aftˈon',
-                         'ðen', 'min']:
-            if word[0] in gr_voicing_dict:
-                word = list(word)
-                word[0] = gr_voicing_dict[word[0]]
-                
-                #Revoice <ξ, ψ> to /ɡz, bz/
-                if len(word) > 1:
-                    if word[0] in ['b', 'ɡ']:
-                        if word[1] == 's':
-                            word[1] = 'z'
-                
-                words[i] = ''.join(word)
-                words[i-1] = prev_word[:-1]
-    
-    return ' '.join(words)
+    #Voice plosives following articles, which lose their final consonant
+    return ' '.join(iter_word_boundary_voicing(text.split()))
+
+
+@stage
+def gr_word_boundaries(text):
+    """Denasalizes word-initial voiced plosives and revoices plosives across word boundaries
+    in one pass over the words of the text"""
+    return ' '.join(iter_word_boundaries(text.split()))
                 
         
+@stage
 def transcribe_gr(text, strong_palatalization=True):
     #Step 1: Basic conversion to IPA
     text = gr2ipa(text)
@@ -315,10 +377,8 @@ def transcribe_gr(text, strong_palatalization=True):
     text = greek_palatalization(text, strong_palatalization)
     
     #Step 6: Denasalization of word-initial voiced plosives
-    text = denasalize_plosives(text)
-    
     #Step 7: Revoice plosives across word boundaries following certain grammatical words
-    text = word_boundary_voicing(text)
+    text = gr_word_boundaries(text)
     
     #Retract all /s, z/ sounds
     text = re.sub('s', 's̠', text)
@@ -326,4 +386,45 @@ def transcribe_gr(text, strong_palatalization=True):
     
     return text
 
+
+def transcribe_gr_stream(texts, strong_palatalization=True, batch_size=65536):
+    """Transcribes a stream of Greek texts (e.g. the lines of a file) in constant memory,
+    yielding the transcription of each word. The words are transcribed as if separated by single
+    spaces, the same as transcribe_gr(' '.join(texts)).split(), in batches of about batch_size characters
+    (see _iter_gr_batches for the only exception)."""
+    return (word.replace('s', 's̠').replace('z', 'z̠')
+            for word in iter_word_boundaries(_iter_gr_batches(texts, strong_palatalization, batch_size)))
+
+
+def _iter_gr_batches(texts, strong_palatalization, batch_size):
+    """Carries out steps 1-5 of transcribe_gr on batches of words of a stream of texts, yielding the resulting words.
+    Each batch but the first starts with a space and each batch but the last ends with one,
+    so that the rules looking at neighbouring characters see the same context as in the whole text
+    (except that a Latin <j> beginning a stream of several batches is treated as following a space,
+    whereas transcribe_gr looks at the last character of the text)"""
+    batch = []
+    size = 0
+    first = True
+    for text in texts:
+        for word in text.split():
+            if size >= batch_size:
+                yield from _gr_batch(batch, strong_palatalization, first, True)
+                batch = []
+                size = 0
+                first = False
+            batch.append(word)
+            size += len(word) + 1
+    if batch:
+        yield from _gr_batch(batch, strong_palatalization, first, False)
+
+
+def _gr_batch(words, strong_palatalization, first, more):
+    text = ('' if first else ' ') + ' '.join(words) + (' ' if more else '')
+    text = gr2ipa(text)
+    text = greek_glides(text)
+    text = voicing_assimilation(text)
+    text = gemination_reduction(text)
+    text = greek_palatalization(text, strong_palatalization)
+    return text.split()
+
     
\ No newline at end of file
@@ -6,6 +6,9 @@ Created on Sat Aug 15 08:41:27 2020
 @author: phgeorgis
 """
 
+from profiling import stage
+from phones import PhoneInventory, VOICELESS
+
 nahuatl_ipa = {'ā':'aː',
                'ē':'eː',
                'ī':'iː',
@@ -36,12 +39,16 @@ nahuatl_digraphs = {'cu':'kʷ',
 
 nahuatl_voiceless_consonants = ['p', 't', 'k', 'ʔ', 's', 'ʃ', 'ʧ', 'ʦ', 'h', 't͡ɬ']
 
+#Features of the Nāhuatl segments (see phones.py)
+nahuatl_phones = PhoneInventory('nahuatl', {VOICELESS:nahuatl_voiceless_consonants})
+
 nahuatl_devoicing = {'m':'m̥',
                      'n':'n̥',
                      'l':'ɬ',
                      'j':'ʃ',
                      'w':'ʍ'}
 
+@stage
 def transcribe_nahuatl(text):
     text = text.lower()
     tr = []
@@ -66,7 +73,7 @@ def transcribe_nahuatl(text):
         if ch in nahuatl_devoicing:
             try:
                 nxt = tr[i+1]
-                if nxt in nahuatl_voiceless_consonants:
+                if nahuatl_phones.mask(nxt) & VOICELESS:
                     devoiced_tr.append(nahuatl_devoicing[ch])
                 else:
                     devoiced_tr.append(ch)
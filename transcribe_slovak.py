@@ -2,6 +2,11 @@
 #Written by Philip Georgis (2020-21)
 
 import re
+from affix_trie import AffixTrie
+from rewriter import Rewriter
+from profiling import stage
+from context_rules import ContextRule, apply_rules_batch
+from phones import PhoneInventory, BOUNDARY, CONSONANT, OBSTRUENT, PALATALIZABLE, SYLLABIC_MARK, VOICED, VOICELESS, VOWEL
 
 #Dictionary of Slovak orthographic characters and their IPA equivalents
 slovak_ipa = {'á':'aː',
@@ -46,12 +51,21 @@ sk_digraphs = {'ia':'ɪ̯a',
                #'mv':'ɱv'
                }
 
+#Basic IPA conversion applied by sk_g2p: digraphs, then single characters
+sk_rewriter = Rewriter(list(sk_digraphs.items()) + list(slovak_ipa.items()))
+
 #Dictionary of consonants with their palatalized forms
 sk_palatal_dict = {'d':'ɟ',
                    't':'c',
                    'n':'ɲ', 
                    'l':'ʎ'}
 
+#Words which are not palatalized, in broad IPA, with their inflected forms: stems end with
+#'-' (see affix_trie.py)
+sk_palatalization_exceptions = AffixTrie(['jɛdɛn-', 'jɛdn-',                #jeden, jedna, jedného, jedenásť
+                                          'tɛn', 'tɛj', 'tɪ̯ɛ', 'tiː',       #ten, tej, tie, tí
+                                          'tɛɫɛfɔːn-', 'tɛɫɛfɔn-'])        #telefón, telefónom, telefonovať
+
 #Lists of Slovak obstruents and consonants
 sk_obstruents = ['b', 'c', 'd', 'f', 'ɡ', 'k', 'p', 's', 't', 'v', 
                  'x', 'z', 'ɟ', 'ɦ', 'ʃ', 'ʒ', 'ʦ', 'ʧ', 'ʣ', 'ʤ']
@@ -82,21 +96,32 @@ sk_vowels = ['a', 'i', 'ɛ', 'æ', 'ɔ', 'u', 'ʊ', 'ɪ']
 
 #List of characters to consider as punctuation marking the end of a word
 ending = [' ', '.', ',', ';', ':', '!', '?', '[', ']', '(', ')', "'", '"']
+_sk_word_edges = ''.join(ending)
+
+#Features of the Slovak segments (see phones.py)
+sk_phones = PhoneInventory('sk', {VOWEL:sk_vowels,
+                                  CONSONANT:sk_consonants,
+                                  OBSTRUENT:sk_obstruents,
+                                  VOICED:list(sk_devoicing_dict.keys()),
+                                  VOICELESS:sk_voiceless,
+                                  PALATALIZABLE:list(sk_palatal_dict.keys()),
+                                  SYLLABIC_MARK:['̩'],
+                                  BOUNDARY:[' ']})
+
+#Sets of segments, for constant-time membership tests inside character loops
+_sk_obstruent_set = sk_phones.segments(OBSTRUENT)
+_sk_syllabic_set = sk_phones.segments(VOWEL | SYLLABIC_MARK)
 
 
+@stage
 def sk_g2p(text):
     """Converts an orthographic text into basic IPA"""
     
     #Lowercase the text
     text = text.lower()
     
-    #Convert digraphs to IPA
-    for digr in sk_digraphs:
-        text = re.sub(digr, sk_digraphs[digr], text)
-    
-    #Convert remaining single characters to IPA
-    for ch in slovak_ipa:
-        text = re.sub(ch, slovak_ipa[ch], text)
+    #Convert digraphs to IPA, then remaining single characters
+    text = sk_rewriter(text)
     
     #Lowercase the text again (<ch> --> /X/ --> /x/)
     text = text.lower()
@@ -104,17 +129,27 @@ def sk_g2p(text):
     return text
 
 
+def load_sk_exceptions(path, orthographic=True):
+    """Reads the palatalization exceptions of a file (see AffixTrie.from_file),
+    converting them from Slovak orthography to broad IPA if orthographic is True"""
+    return AffixTrie.from_file(path, convert=sk_g2p if orthographic else None)
+
+
+@stage
 def palatalize_sk(text, 
-                  exceptions = ['jɛdɛn', 'tɛn', 'tɛlɛfɔːn']):
+                  exceptions = sk_palatalization_exceptions):
     """Performs palatalization on broad IPA transcribed text
     text : string
-    exceptions : list of strings, words which don't follow palatalization rule"""
+    exceptions : AffixTrie or list of word patterns, words which don't follow palatalization rule"""
+    if not isinstance(exceptions, AffixTrie):
+        exceptions = AffixTrie(exceptions)
     
-    #Split the text into words, and palatalize each word individually, skipping exceptions 
+    #Split the text into words, and palatalize each word individually, skipping exceptions
+    #(looked up without the punctuation around them)
     tr = []
     text = text.split()
     for word in text:
-        if word not in exceptions: #what about inflections of these words?
+        if word.strip(_sk_word_edges) not in exceptions:
         
             #Palatalize all palatalizable consonants before all front vowels
             for ch in sk_palatal_dict:
@@ -135,6 +170,7 @@ def palatalize_sk(text,
     return tr
 
 
+@stage
 def final_devoicing(text):
     """Devoices word-final obstruents"""
     
@@ -146,7 +182,7 @@ def final_devoicing(text):
         #Search for last segment of word, which might be masked by punctuation
         #Last segment is at index j
         j = len(word) - 1
-        while word[j] in ending:
+        while j >= 0 and word[j] in ending:
             j -= 1
         word = list(word)
         
@@ -174,6 +210,22 @@ def final_devoicing(text):
     return ' '.join(tr)    
 
 
+#final_devoicing as rules on arrays of segment IDs (see context_rules.py), for word-final
+#segments followed at most by punctuation; as in final_devoicing, the first rule leaves the
+#word <v> unchanged (but not <v> with punctuation attached), and /v/ after punctuation is not
+#preceded by a consonant
+def _sk_punctuation(segment):
+    return segment in ending and segment != ' '
+
+sk_final_devoicing_rules = [ContextRule({}, target=lambda segment: segment == 'v',
+                                        before=str.isspace, after=str.isspace),
+                            ContextRule({'v':'ʋ'}, before=lambda segment: segment in sk_consonants,
+                                        after=str.isspace, skip=_sk_punctuation, skip_before=False),
+                            ContextRule({'v':'ʊ̯'}, after=str.isspace, skip=_sk_punctuation),
+                            ContextRule(sk_devoicing_dict, after=str.isspace, skip=_sk_punctuation)]
+
+
+@stage
 def syllabify(text):
     """Adds syllabic diacritics to /r/ and /ɫ/ in certain contexts"""
     
@@ -226,6 +278,7 @@ def syllabify(text):
     return ' '.join(tr)
 
 
+@stage
 def sk_voice_assim(text):
     """Performs voicing assimilation on obstruent clusters"""
     
@@ -236,15 +289,15 @@ def sk_voice_assim(text):
         ch = text[i]
         
         #Check whether current character is an obstruent
-        if ch in sk_obstruents:
+        if ch in _sk_obstruent_set:
             try:
                 
                 #Identify the following segment and its voicing status
                 nxt = text[i+1]
-                voice = nxt not in sk_voiceless
+                voice = not sk_phones.mask(nxt) & VOICELESS
                 
                 #If the following segment is an obstruent, prepare to assimilate voicing
-                if nxt in sk_obstruents:
+                if nxt in _sk_obstruent_set:
                     
                     #/v/ does not trigger voicing assimilation
                     #otherwise assimilate to voicing of following obstruent
@@ -264,6 +317,18 @@ def sk_voice_assim(text):
     return ''.join(tr)
 
 
+#sk_voice_assim as rules on arrays of segment IDs (see context_rules.py)
+sk_voice_assim_rules = [ContextRule(sk_devoicing_dict,
+                                    target=lambda segment: segment in _sk_obstruent_set,
+                                    after=lambda segment: segment[0] in _sk_obstruent_set
+                                                          and sk_phones.has(segment[0], VOICELESS)),
+                        ContextRule(sk_voicing_dict,
+                                    target=lambda segment: segment in _sk_obstruent_set,
+                                    after=lambda segment: segment[0] in _sk_obstruent_set and segment[0] != 'v'
+                                                          and not sk_phones.has(segment[0], VOICELESS))]
+
+
+@stage
 def fix_chs(text):
     """Corrects specific character sequences involving /t/ and /v/"""
     
@@ -278,7 +343,7 @@ def fix_chs(text):
         if ch == 'v':
             try:
                 nxt = text[i+1]
-                if nxt in sk_obstruents + [' ']:
+                if sk_phones.mask(nxt) & (OBSTRUENT | BOUNDARY):
                     tr.append('v')
                 else:
                     tr.append('ʋ')
@@ -292,9 +357,11 @@ def fix_chs(text):
 
 def count_syllables(word, vowels=sk_vowels):
     """Counts syllables in word"""
-    return len([ch for ch in word if ch in vowels+['̩']]) - word.count('̯')
+    syllabic = _sk_syllabic_set if vowels is sk_vowels else set(vowels + ['̩'])
+    return len([ch for ch in word if ch in syllabic]) - word.count('̯')
         
 
+@stage
 def add_stress(text):
     """Adds stress marking to words with >1 syllable"""
     
@@ -333,19 +400,28 @@ def add_stress(text):
     return ' '.join(tr)
             
 
-def transcribe_sk(text, stress=True):
+@stage
+def transcribe_sk(text, stress=True, palatalization_exceptions=None, backend=None):
+    """palatalization_exceptions is an AffixTrie of words which are not palatalized,
+    e.g. read by load_sk_exceptions (by default sk_palatalization_exceptions).
+    With backend='numpy' or 'python', final devoicing and voicing assimilation are applied
+    as context rules by that backend of context_rules.apply_rules_batch, with the same result"""
     
     #Convert from Slovak orthography to basic IPA
     step1 = sk_g2p(text)
     
     #Perform palatalization
-    step2 = palatalize_sk(step1)
-    
-    #Perform final devoicing
-    step3 = final_devoicing(step2)
+    if palatalization_exceptions is None:
+        palatalization_exceptions = sk_palatalization_exceptions
+    step2 = palatalize_sk(step1, palatalization_exceptions)
     
-    #Perform voicing assimilation
-    step4 = sk_voice_assim(step3)
+    #Perform final devoicing and voicing assimilation; both collapse whitespace to single spaces
+    if backend is None:
+        step3 = final_devoicing(step2)
+        step4 = sk_voice_assim(step3)
+    else:
+        step3 = apply_rules_batch([step2], sk_final_devoicing_rules, backend=backend)
+        step4 = apply_rules_batch(step3, sk_voice_assim_rules, backend=backend)[0]
     
     #Syllabify consonsants in relevant contexts
     step5 = syllabify(step4)
@@ -2,7 +2,10 @@
 #Written by Philip Georgis (2021)
 
 import re
+from rewriter import Rewriter
 from string import punctuation
+from profiling import stage
+from phones import PhoneInventory, CONSONANT, NASAL, SYLLABIC_MARK, VOICED, VOWEL
 
 #Add Spanish punctuation marks
 punctuation += '¡¿«»'
@@ -58,6 +61,14 @@ spanish_digraphs = {#True digraphs
                     'u(?=[a|á|e|é|i|í|o|ó])':'w'
                     }
 
+#Precompiled trigraph and digraph rules, applied in order to the whole text by es2ipa;
+#the rules match within single words, except for word-initial <r>, which is adapted
+#to match at the beginning of any word: <(^|\W+)r> --> <(^|(?<=\s)|[^\w\s]+)r>
+#Single characters are then converted with es_rewriter
+spanish_context_rules = [(re.compile(pattern.replace(r'(^|\W+)', r'(^|(?<=\s)|[^\w\s]+)')), replacement)
+                         for pattern, replacement in list(spanish_trigraphs.items()) + list(spanish_digraphs.items())]
+es_rewriter = Rewriter(spanish_ipa.items())
+
 pause_punctuation = ['.', ',', '!', '¡', '?', '¿', ':', ';', '—']
 
 nasals = ['m', 'n', 'ɲ', 'ŋ']
@@ -85,95 +96,82 @@ voiced_consonants = {'b', 'β', 'd', 'ð', 'ɡ', 'ɣ', 'ɟ', 'ʝ',
                      'l', 'ʎ', 'r', 'ɾ', 
                      'v', 'z'}
 
+es_vowels = ['a', 'e', 'i', 'o', 'u']
+
+#Features of the Spanish segments (see phones.py)
+es_phones = PhoneInventory('es', {VOWEL:es_vowels,
+                                  NASAL:nasals,
+                                  VOICED | CONSONANT:sorted(voiced_consonants),
+                                  SYLLABIC_MARK:['̩']})
+_es_syllabic_set = es_phones.segments(VOWEL | SYLLABIC_MARK)
+
 
 #%%
-def es2ipa(text):
-    """Converts an orthographic text to basic IPA"""
+@stage
+def es2ipa(text, rewriter=es_rewriter):
+    """Converts an orthographic text to basic IPA, converting single characters
+    with the given rewriter (by default es_rewriter)"""
     
-    text = text.lower()
-    text = text.split()
+    #Lowercase the text and separate its words by single spaces
+    text = ' '.join(text.lower().split())
     
-    tr_text = []
+    #Transcription of trigraphs, then digraphs
+    for regex, replacement in spanish_context_rules:
+        text = regex.sub(replacement, text)
     
-    for word in text:
-        #Transcription of trigraphs
-        for trigraph in spanish_trigraphs:
-            word = re.sub(trigraph, spanish_trigraphs[trigraph], word)
-            
-        #Transcription of digraphs
-        for digraph in spanish_digraphs:
-            word = re.sub(digraph, spanish_digraphs[digraph], word)
-        
-        #Transcription via single character replacement
-        for ch in spanish_ipa:
-            word = re.sub(ch, spanish_ipa[ch], word)
-        
-        #Lowercase everything again
-        word = word.lower()
-        
-        #Add to list of transcribed words
-        tr_text.append(word)
+    #Transcription via single character replacement
+    text = rewriter(text)
     
-    text = ' '.join(tr_text)
-    
-    return text
+    #Lowercase everything again
+    return text.lower()
+
 
+#Context rules of es_allophony, applied in one pass by allophony_regex to text with words
+#separated by single spaces, with the replacement of each possible match:
+#   fricatives /β, ð, ɣ, ʝ/ are strengthened after nasals (also across a word boundary),
+#   nasals assimilate to the place of articulation of a following obstruent,
+#   /ð/ is also strengthened after /l/, and /l/ becomes /lʲ/ before /ʧ/
+allophony_replacements = {}
+for nasal in nasals:
+    for fricative, allophone in voiced_obstruent_allophones.items():
+        allophony_replacements[nasal+fricative] = nasal_assimilation[allophone[0]] + allophone
+        allophony_replacements[f'{nasal} {fricative}'] = f'{nasal} {allophone}'
+    for obstruent, assimilated in nasal_assimilation.items():
+        allophony_replacements[nasal+obstruent] = assimilated + obstruent
+allophony_replacements.update({'lð':'ld', 'l ð':'l d', 'lʧ':'lʲʧ'})
 
+#Fricatives at the beginning of the text or of a word following pause-triggering punctuation
+#are also strengthened
+allophony_replacements.update(voiced_obstruent_allophones)
+
+_nasals = ''.join(nasals)
+_fricatives = ''.join(voiced_obstruent_allophones)
+allophony_regex = re.compile(f'[{_nasals}](?:[{_fricatives}{"".join(nasal_assimilation)}]| [{_fricatives}])'
+                             f'|l(?:ʧ| ?ð)'
+                             f'|(?:^|(?<=[{re.escape("".join(pause_punctuation))}] ))[{_fricatives}]')
+
+
+@stage
 def es_allophony(text):
     """Carries out several allophonic alternations"""
     
-    #Convert fricatives back to stops (or affricate, in the case of /ɟ͡ʝ/)
-    #when following nasals
-    for fricative in voiced_obstruent_allophones:
-        allophone = voiced_obstruent_allophones[fricative]
-        for nasal in nasals:
-            text = re.sub(f'{nasal}{fricative}', f'{nasal}{allophone}', text)
-            text = re.sub(f'{nasal}\s+{fricative}', f'{nasal} {allophone}', text)
-    
-    #<d> is also /d/ following /l/
-    text = re.sub('lð', 'ld', text)
-    text = re.sub('l\s+ð', 'l d', text)
-    
-    #Do the same when appearing after a pause
-    #Split the text into words
-    text = text.split()
-    for i in range(len(text)):
-        word = list(text[i])
-        if word[0] in voiced_obstruent_allophones:
-            
-            #If it is not the first word of the text, check whether the previous
-            #word ends with pause-triggering punctuation
-            #If so, change the fricative to its corresponding stop/affricate
-            if i > 0:
-                if text[i-1][-1] in pause_punctuation:
-                    word[0] = voiced_obstruent_allophones[word[0]]
-            
-            #If it is the first word, no further checking is necessary,
-            #change fricative to stop/affricate
-            else:
-                word[0] = voiced_obstruent_allophones[word[0]]
-        text[i] = ''.join(word)
-    text = ' '.join(text)
+    #Separate the words of the text by single spaces
+    text = ' '.join(text.split())
     
+    #Convert fricatives back to stops (or affricate, in the case of /ɟ͡ʝ/)
+    #when following nasals or pauses, and <d> also following /l/
     #Assimilate nasals to place of articulation of following obstruents
-    text = list(text)
-    for i in range(len(text)-1):
-        if text[i] in nasals:
-            if text[i+1] in nasal_assimilation:
-                text[i] = nasal_assimilation[text[i+1]]
-    text = ''.join(text)
-    
     #Assimilate /l/ to /lʲ/ preceding post-alveolar /ʧ/
-    text = re.sub('l(?=ʧ)', 'lʲ', text)
-    
-    return text
+    return allophony_regex.sub(lambda match: allophony_replacements[match.group()], text)
         
     
-def count_syllables(word, vowels=['a', 'e', 'i', 'o', 'u']):
+def count_syllables(word, vowels=es_vowels):
     """Counts syllables in word"""
-    return len([ch for ch in word if ch in vowels+['̩']]) - word.count('̯')    
+    syllabic = _es_syllabic_set if vowels is es_vowels else set(vowels + ['̩'])
+    return len([ch for ch in word if ch in syllabic]) - word.count('̯')    
     
 
+@stage
 def mark_stress(text):
     """Adds stress marking for polysyllabic words"""
     
@@ -252,6 +250,28 @@ def has_punctuation(text, punctuation=punctuation):
     return False
 
 
+def fix_y_word(word, nxt_word=None):
+    """Transcribes the Spanish word <y> 'and' (see fix_y) given the following word
+    (None at the end of the text); other words are returned unchanged"""
+    
+    if strip_punctuation(word).strip() in ['ʝ', 'ɟ͡ʝ']:
+        if has_punctuation(word) == True:
+            return re.sub('[ɟ͡]*ʝ', 'i', word)
+        elif nxt_word is not None:
+            nxt_word = strip_punctuation(nxt_word)
+            try:
+                if nxt_word[0] not in {'a', 'e', 'i', 'o', 'u', 'ˈ'}:
+                    return re.sub('[ɟ͡]*ʝ', 'i', word)
+                else:
+                    return re.sub('[ɟ͡]*ʝ', 'ʝ', word)
+            except IndexError:
+                return re.sub('[ɟ͡]*ʝ', 'i', word)
+        else:
+            return re.sub('[ɟ͡]*ʝ', 'i', word)
+    return word
+
+
+@stage
 def fix_y(text):
     """Handles the idiosyncratic behavior of the Spanish word <y> 'and':
         /i/ before pauses and consonantal onsets
@@ -259,75 +279,189 @@ def fix_y(text):
     
     text = text.split()
     for i in range(len(text)):
-        word = text[i]
-        if strip_punctuation(word).strip() in ['ʝ', 'ɟ͡ʝ']:
-            if has_punctuation(word) == True:
-                text[i] = re.sub('[ɟ͡]*ʝ', 'i', word)
-            else:
-                try:
-                    nxt_word = strip_punctuation(text[i+1])
-                    try:
-                        if nxt_word[0] not in {'a', 'e', 'i', 'o', 'u', 'ˈ'}:
-                            text[i] = re.sub('[ɟ͡]*ʝ', 'i', word)
-                        else:
-                            text[i] = re.sub('[ɟ͡]*ʝ', 'ʝ', word)
-                    except IndexError:
-                        text[i] = re.sub('[ɟ͡]*ʝ', 'i', word)
-                            
-                except IndexError:
-                    text[i] = re.sub('[ɟ͡]*ʝ', 'i', word)
+        text[i] = fix_y_word(text[i], text[i+1] if i+1 < len(text) else None)
                     
     return ' '.join(text)
         
 
+#Voiced counterparts of the voiceless fricatives, in the order in which they are voiced
+fricative_voicing = {'f':'v', 'θ':'ð', 's':'z'}
+
+#Runs of voiceless fricatives preceding a voiced consonant
+fricative_run_regex = re.compile(f'[{"".join(fricative_voicing)}]+(?=[{"".join(sorted(voiced_consonants))}])')
+
+
+def voice_fricative_run(match):
+    """Voices a run of voiceless fricatives preceding a voiced consonant from right to left,
+    as far as each fricative precedes one voiced before it in the order of fricative_voicing"""
+    run = match.group()
+    if len(run) == 1:
+        return fricative_voicing[run]
+    order = list(fricative_voicing)
+    voiced = list(run)
+    voiced[-1] = fricative_voicing[run[-1]]
+    for i in range(len(run)-2, -1, -1):
+        if order.index(run[i]) <= order.index(run[i+1]):
+            break
+        voiced[i] = fricative_voicing[run[i]]
+    return ''.join(voiced)
+
+
+@stage
 def voicing_assimilation(text):
     """Voices /f, θ, s/ to /v, ð, z/ when preceding a voiced consonant"""
+    return fricative_run_regex.sub(voice_fricative_run, text)
     
-    for voiceless, voiced in zip(['f', 'θ', 's'], ['v', 'ð', 'z']):
-        for voiced_consonant in voiced_consonants:
-            text = re.sub(f'{voiceless}(?={voiced_consonant})', f'{voiced}', text)
+
+class SpanishTranscriber:
+    """Spanish transcriber for one combination of the dialect features yeismo, distincion
+    and ceceo (see transcribe_es), with the rules of that dialect compiled once:
+        transcribe = SpanishTranscriber(distincion=False)
+        transcribe(text)
+    Transcribers are not modified after construction, so they can be shared between
+    threads, and they are pickled as their arguments for use in worker processes."""
+    
+    def __init__(self, yeismo=True, distincion=True, ceceo=False):
+        self.yeismo = yeismo == True
+        self.distincion = distincion != False
+        self.ceceo = ceceo == True
+        
+        #Yeísmo (/ʎ/ --> /ʝ/) is applied together with the single character conversion
+        #of es2ipa, as /ʎ/ and /ʝ/ are not affected by lowercasing
+        ipa_rules = list(spanish_ipa.items())
+        if self.yeismo:
+            ipa_rules.append(('ʎ', 'ʝ'))
+        self.ipa_rewriter = Rewriter(ipa_rules)
+        
+        #The lowered diacritics of the approximants /β, ð, ɣ/ do not affect fix_y and mark_stress,
+        #so they are added after stress marking, together with distinción, seseo or ceceo
+        dialect_rules = [('β', 'β̞'), ('ð', 'ð̞'), ('ɣ', 'ɣ̞')]
+        if not self.distincion:
+            dialect_rules.append(('θ', 's'))
+        if self.ceceo:
+            dialect_rules += [('s', 's̄'), ('θ', 's̄')]
+        self.dialect_rewriter = Rewriter(dialect_rules)
+    
+    @stage
+    def __call__(self, text):
+        """Produces a phonetic transcription of Spanish text"""
+        return self.apply_dialect(self.stressed_ipa(text))
     
-    return text
+    def stressed_ipa(self, text):
+        """Carries out the stages up to stress marking, which depend only on yeismo"""
+        text = es2ipa(text, self.ipa_rewriter)
+        text = es_allophony(text)
+        text = fix_y(text)
+        return mark_stress(text)
     
+    def apply_dialect(self, text):
+        """Carries out the stages following stress marking"""
+        text = self.dialect_rewriter(text)
+        return voicing_assimilation(text)
+    
+    def __reduce__(self):
+        return (SpanishTranscriber, (self.yeismo, self.distincion, self.ceceo))
+    
+    def __repr__(self):
+        return f'SpanishTranscriber(yeismo={self.yeismo}, distincion={self.distincion}, ceceo={self.ceceo})'
+
+
+#Transcribers used by transcribe_es, by (yeismo, distincion, ceceo)
+_es_transcribers = {}
+
+def get_spanish_transcriber(yeismo=True, distincion=True, ceceo=False):
+    """Returns the shared SpanishTranscriber for the given dialect features,
+    creating it on first use"""
+    key = (yeismo == True, distincion != False, ceceo == True)
+    transcriber = _es_transcribers.get(key)
+    if transcriber is None:
+        transcriber = _es_transcribers.setdefault(key, SpanishTranscriber(*key))
+    return transcriber
+
+
+#/ʎ/ of a non-yeísta transcription, with the contexts in which the /ʝ/ of a yeísta
+#transcription is strengthened to /ɟ͡ʝ/ by es_allophony: directly after a nasal
+#(which then assimilates to /ɲ/), or word-initially after a nasal, a pause or at the beginning of the text
+yeismo_regex = re.compile(f'(?P<nasal>[{"".join(nasals)}])ʎ|(?P<initial>(?:^|(?<=[{"".join(nasals)}{re.escape("".join(pause_punctuation))}] )))ʎ|ʎ')
+yeismo_replacements = {'nasal':'ɲɟ͡ʝ', 'initial':'ɟ͡ʝ', None:'ʝ'}
+
+#Words consisting only of /ʎ/ and punctuation, which become <y> 'and' with yeísmo
+lone_palatal_lateral_regex = re.compile(f'(?:^| )[{re.escape(punctuation)}]*ʎ[{re.escape(punctuation)}]*(?= |$)')
+
+
+@stage
+def yeismo_variant(text, allophonic):
+    """Converts a non-yeísta transcription up to stress marking (SpanishTranscriber.stressed_ipa)
+    to the yeísta transcription of the same text, given the non-yeísta transcription before
+    fix_y and mark_stress, which keep the words of the text in place"""
+    tr = yeismo_regex.sub(lambda match: yeismo_replacements[match.lastgroup], text)
+    
+    #Words of only /ʎ/ are handled like <y> by fix_y, according to the following word before fix_y
+    if lone_palatal_lateral_regex.search(text):
+        words = text.split()
+        tr = tr.split()
+        following = allophonic.split()[1:] + [None]
+        for i in range(len(words)):
+            if strip_punctuation(words[i]).strip() == 'ʎ':
+                tr[i] = fix_y_word(tr[i], following[i])
+        tr = ' '.join(tr)
+    return tr
+
 
+#All combinations of (yeismo, distincion, ceceo)
+es_dialects = [(yeismo, distincion, ceceo) for yeismo in [True, False]
+               for distincion in [True, False] for ceceo in [False, True]]
+
+
+@stage
+def transcribe_es_variants(text, variants=es_dialects):
+    """Transcribes Spanish text in several dialects at once, given as (yeismo, distincion, ceceo) tuples
+    (by default all combinations), carrying out the stages shared by the dialects only once.
+    Returns a dictionary of the transcription of each variant, identical to transcribe_es."""
+    transcribers = {variant:get_spanish_transcriber(*variant) for variant in variants}
+    
+    #Transcriptions up to stress marking, by yeismo
+    #The yeísta transcription is derived from the non-yeísta one when both are needed,
+    #except in texts with stress marks or syllabic diacritics, which may shift stress marks
+    #onto the contexts of yeismo_regex
+    yeismo_values = set(transcriber.yeismo for transcriber in transcribers.values())
+    stressed = {}
+    if len(yeismo_values) == 2 and 'ˈ' not in text and '̩' not in text:
+        allophonic = es_allophony(es2ipa(text))
+        stressed[False] = mark_stress(fix_y(allophonic))
+        stressed[True] = yeismo_variant(stressed[False], allophonic)
+    else:
+        for yeismo in yeismo_values:
+            stressed[yeismo] = get_spanish_transcriber(yeismo=yeismo).stressed_ipa(text)
+    
+    #Ceceo gives the same transcription with or without distinción
+    transcriptions = {}
+    results = {}
+    for variant, transcriber in transcribers.items():
+        key = (transcriber.yeismo, transcriber.distincion or transcriber.ceceo, transcriber.ceceo)
+        if key not in transcriptions:
+            transcriptions[key] = transcriber.apply_dialect(stressed[transcriber.yeismo])
+        results[variant] = transcriptions[key]
+    return results
+
+
+@stage
 def transcribe_es(text, yeismo=True, distincion=True, ceceo=False):
     """Produces a phonetic transcription of  Spanish text.
     Arguments yeismo, distincion, and ceceo control dialect-specific features.
     Default is Standard Peninsular Spanish.
     For Latin American Spanish, set distincion = False."""
     
-    text = es2ipa(text)
-    
-    #Yeísmo: /ʎ/ --> /ʝ/
-    if yeismo == True:
-        text = re.sub('ʎ', 'ʝ', text)
-    
+    #Steps (carried out by SpanishTranscriber):
+    #Basic IPA conversion, with yeísmo: /ʎ/ --> /ʝ/
     #Strengthen fricatives /β, ð, ʝ, ɣ/ into stops/affricates after nasals and pauses
-    text = es_allophony(text)
-    
-    #Add lowered diacritics to /β, ð, ɣ/ to mark them as approximants
-    text = re.sub('β', 'β̞', text)
-    text = re.sub('ð', 'ð̞', text)
-    text = re.sub('ɣ', 'ɣ̞', text)
-    
     #Convert <y> "and" to /i/, or /ʝ/ when preceding vowels
-    text = fix_y(text)
-
     #Add stress marking
-    text = mark_stress(text)
-    
+    #Add lowered diacritics to /β, ð, ɣ/ to mark them as approximants
     #Distinción (both /s/ and /θ/)
     #Seseo (all /s/), ceceo (all /s̄/, similar to /θ/)
-    if distincion == False:
-        text = re.sub('θ', 's', text)
-    if ceceo == True:
-        text = re.sub('s', 's̄', text)
-        text = re.sub('θ', 's̄', text)
-    
     #Fricative voicing assimilation: /f, θ, s/ --> /v, ð, z/
-    text = voicing_assimilation(text)
-    
-    return text
+    return get_spanish_transcriber(yeismo, distincion, ceceo)(text)
 
 
 #%%
@@ -7,10 +7,13 @@
 
 import re
 from string import punctuation
+from profiling import stage
+from phones import PhoneInventory, STRESS, VOICELESS, VOWEL
+from stress_lexicon import add_stress
 
 #Note that due to stress-dependent vowel reduction in Ukrainian, this G2P conversion
 #yields the correct transcriptions only when stress is marked in the orthographic form
-#e.g. <голова́>, <язи́к>
+#e.g. <голова́>, <язи́к>, or added from a stress lexicon (see stress_lexicon.py)
 stress_mark = '́'
 
 #Ukrainian Cyrillic alphabet to basic IPA conversion
@@ -63,7 +66,13 @@ vowel_reduction_dict = {'ɑ':'ɐ',
 
 uk_voiceless = ['k', 'p', 's', 't', 'f', 'x', 'ʦ', 'ʧ', 'ʃ']
 
+#Features of the Ukrainian segments (see phones.py)
+uk_phones = PhoneInventory('uk', {VOWEL:uk_vowels,
+                                  VOICELESS:uk_voiceless,
+                                  STRESS:['ˈ']})
 
+
+@stage
 def uk2ipa(text):
     """Performs preliminary conversion from Ukrainian Cyrillic to IPA"""
     #Lower-case the text
@@ -82,6 +91,7 @@ def uk2ipa(text):
     return tr
 
 
+@stage
 def uk_palatalization(text):
     """Performs palatalization of relevant consonants"""
     
@@ -144,6 +154,7 @@ def uk_palatalization(text):
     return tr
 
 
+@stage
 def uk_allophony(text):
     """Carries out allophonic changes to phonemes <в> /ʋ/, <й> /j/, and г /ɦ/"""
     
@@ -160,7 +171,7 @@ def uk_allophony(text):
             if ((i == 0) or (text[i-1] not in uk_vowels)):
                 try:
                     nxt = text[i+1]
-                    if nxt in uk_voiceless:
+                    if uk_phones.mask(nxt) & VOICELESS:
                         text[i] = 'ʍ'         
                 except IndexError:
                     pass
@@ -182,6 +193,7 @@ def uk_allophony(text):
     
 
 
+@stage
 def uk_vowel_reduction(text):
     """Performs first vowel reduction on vowels /ɑ, u/
     and adjusts stress marking (stress marking is required)"""
@@ -257,6 +269,7 @@ def uk_vowel_reduction(text):
     return text
 
 
+@stage
 def adjust_soft_vowels(text):
     """Changes intervocalic /ʲ/ to /j/"""
     
@@ -270,7 +283,7 @@ def adjust_soft_vowels(text):
                 
                 #If the /ʲ/ appears between two vowels, change it to /j/
                 #In case the next vowel is stressed, include the stress marker as a search criterion
-                if ((prev_ch in uk_vowels) and (nxt_ch in uk_vowels+['ˈ'])):
+                if uk_phones.mask(prev_ch) & VOWEL and uk_phones.mask(nxt_ch) & (VOWEL | STRESS):
                     tr[i] = 'j'
                 
                 #Or if the /ʲ/ appears after an apostrophe (marking non-palatalization of preceding consonant),
@@ -285,13 +298,21 @@ def adjust_soft_vowels(text):
     return tr
 
 
+@stage
 def remove_apostrophe(text):
     """Remove apostrophes ("ʼ"), which mark that the preceding consonant is not palatalized"""
     
     return ''.join([ch for ch in text if ch not in apostrophes])
 
 
-def transcribe_uk(text):
+@stage
+def transcribe_uk(text, stress_lexicon=None):
+    """If a StressLexicon is given as stress_lexicon, the stress of words
+    not marked in the orthography is taken from it"""
+    #Mark stress from the stress lexicon
+    if stress_lexicon is not None:
+        text = add_stress(text, stress_lexicon)
+    
     #Convert Ukrainian Cyrillic into preliminary IPA
     step1 = uk2ipa(text)
     
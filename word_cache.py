@@ -0,0 +1,377 @@
+#WORD-LEVEL MEMOIZATION OF TRANSCRIPTIONS
+#Real text is Zipfian: a few thousand distinct words make up most of any corpus,
+#so transcribing each distinct word once and reusing the result saves most of the work.
+#Some rules cross word boundaries, so each word is cached together with a summary
+#of its neighbours: a short representative prefix and suffix which trigger exactly the
+#same cross-word rules. On a cache miss, prefix + word + suffix is transcribed with the
+#language's own transcribe_* function, so cached output is identical to uncached output.
+#Usage:
+#   cache = TranscriptionCache(max_entries=100000, max_bytes=64*2**20)
+#   cache.transcribe('pl', text, stress=False)
+#   transcribe_pl = cache.wrap('pl')
+#   cache.stats()
+#Like the language registry (see languages.py), the context functions only import the
+#module of a language when the language is first used.
+
+import importlib
+import inspect
+import re
+import sys
+from collections import OrderedDict
+from functools import lru_cache
+from languages import get_transcriber
+
+#Size of the per-word helper caches used to compute boundary contexts
+helper_cache_size = 2**16
+
+#Approximate memory taken by one cache entry besides its strings
+#(ordered dictionary node, key tuple and hash table slot), in bytes
+entry_overhead = 200
+
+
+#%%
+#Boundary contexts of each language
+#Each function takes the list of lowercased words of the text, the whitespace preceding
+#each word (plus the trailing whitespace) and the transcription options, and returns
+#a (prefix, suffix) pair for each word (None for words which produce no output),
+#or None if the whole text must be transcribed without the cache
+
+def _no_contexts(words, gaps, options):
+    """Languages without rules crossing word boundaries"""
+    return [('', '')] * len(words)
+
+
+def _pl_contexts(words, gaps, options):
+    """Polish: <w, z> stay voiced unless the next word begins with a voiceless sound,
+    and /ɲ/ is never lenited at the very start of the text"""
+    contexts = []
+    last = len(words) - 1
+    for k, word in enumerate(words):
+        prefix = suffix = ''
+        if k > 0 and word[:1] in ['n', 'ń']:
+            prefix = 'a '
+        if word in ['w', 'v', 'z'] and k < last:
+            from transcribe_polish import pl_voiceless_onset
+            if pl_voiceless_onset(words[k+1], options['final_denasal']):
+                suffix = ' p'
+        contexts.append((prefix, suffix))
+    return contexts
+
+
+@lru_cache(maxsize=helper_cache_size)
+def _es_word(word, yeismo):
+    """Basic IPA of a single Spanish word, with yeísmo if specified"""
+    import transcribe_spanish
+    tr = transcribe_spanish.es2ipa(word)
+    if yeismo == True:
+        tr = tr.replace('ʎ', 'ʝ')
+    return tr
+
+
+def _es_contexts(words, gaps, options):
+    """Spanish: fricatives are strengthened after nasals, /l/ (only /ð/) and pauses,
+    and <y> 'and' depends on the onset of the next word; words consisting only of <h>
+    produce no output"""
+    import transcribe_spanish
+    tr = [_es_word(word, options['yeismo']) for word in words]
+    spoken = [k for k in range(len(words)) if tr[k]]
+    if not spoken:
+        return None
+    contexts = [None] * len(words)
+    for n, k in enumerate(spoken):
+        prefix = suffix = ''
+        if n > 0 and tr[k][0] in transcribe_spanish.voiced_obstruent_allophones:
+            prev_end = tr[spoken[n-1]][-1]
+            if prev_end == 'l':
+                prefix = 'l '
+            elif prev_end not in transcribe_spanish.nasals and prev_end not in transcribe_spanish.pause_punctuation:
+                prefix = 'a '
+        if 'ʝ' in tr[k] and transcribe_spanish.strip_punctuation(tr[k]) == 'ʝ' and n+1 < len(spoken):
+            if transcribe_spanish.strip_punctuation(tr[spoken[n+1]])[:1] in ['a', 'e', 'i', 'o', 'u', 'ˈ']:
+                suffix = ' a'
+        contexts[k] = (prefix, suffix)
+    return contexts
+
+
+gr_articles = {'tin', 'ton', 'stin', 'ston', 'aftˈin', 'aftˈon', 'ðen', 'min'}
+
+
+@lru_cache(maxsize=helper_cache_size)
+def _gr_word(word, strong_palatalization):
+    """Basic IPA of a single Greek word, and its form before word boundary voicing"""
+    import transcribe_greek
+    ipa = transcribe_greek.gr2ipa(word)
+    tr = transcribe_greek.greek_glides(ipa)
+    tr = transcribe_greek.voicing_assimilation(tr)
+    tr = transcribe_greek.gemination_reduction(tr)
+    tr = transcribe_greek.greek_palatalization(tr, strong_palatalization)
+    tr = transcribe_greek.denasalize_plosives(tr)
+    return ipa, tr
+
+
+def _gr_contexts(words, gaps, options):
+    """Greek: plosives are voiced after articles, which then lose their final /n/;
+    word-final <αυ, ευ> is /f/ only at the very end of the text; word-initial /i/
+    before vowels becomes a glide unless preceded by a space"""
+    import transcribe_greek
+    tr = [_gr_word(word, options['strong_palatalization']) for word in words]
+    contexts = []
+    last = len(words) - 1
+    for k in range(len(words)):
+        ipa, form = tr[k]
+        prefix = suffix = ''
+        if k > 0 and form[:1] in transcribe_greek.gr_voicing_dict and tr[k-1][1] in gr_articles:
+            prefix = 'τον'
+
+        #Glide hardening looks at the character preceding /j/, which for the
+        #first character of the text is the last character of the text
+        if ipa[:1] == 'j' and not gaps[k]:
+            return None
+        if ipa[:1] == 'i' and ipa[1:2] in transcribe_greek.gr_vowels + ['ˈ'] and gaps[k][-1:] not in ['', ' ']:
+            prefix += '\n'
+        elif prefix or ipa[:1] == 'j':
+            prefix = (prefix or 'α') + ' '
+
+        if form in gr_articles:
+            if k < last and tr[k+1][1][:1] in transcribe_greek.gr_voicing_dict:
+                suffix = ' π'
+        elif ipa[-1:] == 'w' and (k < last or gaps[-1]):
+            suffix = ' α'
+        contexts.append((prefix, suffix))
+    return contexts
+
+
+def _uk_contexts(words, gaps, options):
+    """Ukrainian: word-final /ʲ/ after an apostrophe becomes /j/ unless it ends the text"""
+    contexts = [('', '')] * len(words)
+    for k in range(len(words) - 1):
+        if words[k][-1] in ['ь', 'ʲ']:
+            contexts[k] = ('', ' а')
+    return contexts
+
+
+@lru_cache(maxsize=None)
+def _palatal_initials(module_name, ipa_dict_name):
+    """Returns a regex pattern matching a doubled whitespace character before a letter
+    transcribed with an initial /ʲ/ (by the IPA dictionary of the language module), where
+    the palatalization stage doubles the /ʲ/ across the word boundary"""
+    ipa_dict = getattr(importlib.import_module(module_name), ipa_dict_name)
+    letters = [ch for ch in ipa_dict if ipa_dict[ch][:1] == 'ʲ'] + ['ʲ']
+    letters += [ch.upper() for ch in letters]
+    return re.compile(r'(\s)\1(?=[' + ''.join(letters) + '])')
+
+
+@lru_cache(maxsize=helper_cache_size)
+def _bg_word(word):
+    """Form of a single Bulgarian word before voicing assimilation"""
+    import transcribe_bulgarian
+    return transcribe_bulgarian.bg_vowel_reduction(transcribe_bulgarian.bg2ipa(word))
+
+
+@lru_cache(maxsize=None)
+def _bg_devoicing_onsets():
+    """Bulgarian obstruents devoicing a preceding word-final obstruent"""
+    import transcribe_bulgarian
+    return set(transcribe_bulgarian.bg_obstruents) - set(transcribe_bulgarian.bg_voiced_obstruents) - {'v'}
+
+
+def _bg_contexts(words, gaps, options):
+    """Bulgarian: word-final obstruents are devoiced at the end of the text and before
+    voiceless obstruents, and otherwise keep their voicing; words consisting only
+    of a stress mark produce no output"""
+    import transcribe_bulgarian
+    tr = [_bg_word(word) for word in words]
+    spoken = [k for k in range(len(words)) if tr[k]]
+    if not spoken:
+        return None
+    contexts = [None] * len(words)
+    for n, k in enumerate(spoken):
+        suffix = ''
+        if tr[k][-1] in transcribe_bulgarian.bg_obstruents and n+1 < len(spoken):
+            suffix = ' п' if tr[spoken[n+1]][0] in _bg_devoicing_onsets() else ' а'
+        contexts[k] = ('', suffix)
+    return contexts
+
+
+def _nahuatl_contexts(words, gaps, options):
+    """Nahuatl: word-final sonorants are devoiced only at the very end of the text"""
+    contexts = [('', ' ')] * len(words)
+    if not gaps[-1]:
+        contexts[-1] = ('', '')
+    return contexts
+
+
+def _strip_punctuation(module_name, ipa_dict_name=None):
+    """Returns a function removing the punctuation of the language module from the text
+    before it is split into words, as done by the first stage of the language, or returning
+    None if the text is affected by the doubling of /ʲ/ across word boundaries (for the
+    languages of which the name of the IPA dictionary is given)"""
+    def prepare(text):
+        punctuation = importlib.import_module(module_name).punctuation
+        text = ''.join([ch for ch in text if ch not in punctuation])
+        if ipa_dict_name is not None and _palatal_initials(module_name, ipa_dict_name).search(text):
+            return None
+        return text
+    return prepare
+
+
+#Context function, text preparation function (or None) and whether the language
+#preserves whitespace (otherwise words are joined by single spaces) for each language
+language_contexts = {'be':(_no_contexts, _strip_punctuation('transcribe_belarusian', 'be_ipa_dict'), False),
+                     'bg':(_bg_contexts, _strip_punctuation('transcribe_bulgarian'), False),
+                     'cz':(_no_contexts, None, False),
+                     'es':(_es_contexts, None, False),
+                     'gr':(_gr_contexts, None, False),
+                     'nahuatl':(_nahuatl_contexts, None, True),
+                     'pl':(_pl_contexts, None, False),
+                     'sk':(_no_contexts, None, False),
+                     'uk':(_uk_contexts, _strip_punctuation('transcribe_ukrainian', 'uk_ipa_dict'), False)}
+
+
+def _split_words(text):
+    """Splits text into words and the whitespace preceding each word (plus the trailing whitespace)"""
+    parts = re.split(r'(\S+)', text)
+    return parts[1::2], parts[0::2]
+
+
+def transcribe_in_context(function, word, context, options, keep_whitespace):
+    """Transcribes a word within its (prefix, suffix) context with the transcription
+    function and options of its language, returning the transcription of the word alone"""
+    prefix, suffix = context
+    tr = function(prefix + word + suffix, **options)
+    if keep_whitespace:
+        return tr[:len(tr) - len(suffix)]
+    return tr.split(' ')[len(prefix.split())]
+
+
+def bind_options(function, options):
+    """Returns the options of a transcription function with the defaults filled in,
+    so that equivalent calls share entries"""
+    bound = inspect.signature(function).bind('', **options)
+    bound.apply_defaults()
+    return dict(list(bound.arguments.items())[1:])
+
+
+#%%
+class TranscriptionCache:
+    """Bounded LRU cache of word transcriptions, keyed on language, options,
+    lowercased word and boundary context. The least recently used words are evicted
+    when there are more than max_entries words or the approximate memory taken by
+    the cache exceeds max_bytes (either limit may be None)."""
+
+    def __init__(self, max_entries=100000, max_bytes=64*2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypasses = 0
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def clear(self):
+        """Removes all entries and resets the statistics"""
+        self.entries.clear()
+        self.size = 0
+        self.hits = self.misses = self.evictions = self.bypasses = 0
+
+
+    def stats(self):
+        """Returns a dictionary of cache statistics"""
+        lookups = self.hits + self.misses
+        return {'hits':self.hits,
+                'misses':self.misses,
+                'hit_rate':self.hits / lookups if lookups else 0.0,
+                'evictions':self.evictions,
+                'bypasses':self.bypasses,
+                'entries':len(self.entries),
+                'bytes':self.size}
+
+
+    def _add(self, key, tr):
+        """Stores a new entry, evicting the least recently used ones if needed"""
+        size = entry_overhead + sys.getsizeof(tr) + sum(sys.getsizeof(part) for part in key[2:])
+        self.entries[key] = (tr, size)
+        self.size += size
+        while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries)
+                                or (self.max_bytes is not None and self.size > self.max_bytes)):
+            old_tr, old_size = self.entries.popitem(last=False)[1]
+            self.size -= old_size
+            self.evictions += 1
+
+
+    def _load(self, key):
+        """Returns the transcription of a key missing from memory from the backing store
+        of the cache, or None (the in-memory cache has no backing store)"""
+        return None
+
+
+    def _store(self, key, tr):
+        """Saves a new transcription to the backing store of the cache"""
+        pass
+
+
+    def transcribe(self, lang, text, **options):
+        """Transcribes text with the transcription function of language lang and
+        the given options, giving the same output as calling the function directly"""
+        function = get_transcriber(lang)
+
+        #Serbian script conversion depends on the script detected for the whole text
+        if lang not in language_contexts:
+            self.bypasses += 1
+            return function(text, **options)
+        contexts, prepare, keep_whitespace = language_contexts[lang]
+
+        options = bind_options(function, options)
+        options_key = tuple(options.items())
+
+        prepared = text if prepare is None else prepare(text)
+        if prepared is not None:
+            words, gaps = _split_words(prepared)
+            word_contexts = contexts([word.lower() for word in words], gaps, options) if words else None
+        if prepared is None or word_contexts is None:
+            self.bypasses += 1
+            return function(text, **options)
+
+        entries = self.entries
+        tr = []
+        for word, context in zip(words, word_contexts):
+            if context is None:
+                continue
+            word = word.lower()
+            key = (lang, options_key, word, context[0], context[1])
+            entry = entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                entries.move_to_end(key)
+                tr.append(entry[0])
+                continue
+
+            #Transcribe the word within its representative context and extract it,
+            #unless it is found in the backing store of a subclass
+            tr_word = self._load(key)
+            if tr_word is None:
+                self.misses += 1
+                tr_word = transcribe_in_context(function, word, context, options, keep_whitespace)
+                self._store(key, tr_word)
+            self._add(key, tr_word)
+            tr.append(tr_word)
+
+        if keep_whitespace:
+            return ''.join(gap + tr_word for gap, tr_word in zip(gaps, tr)) + gaps[-1]
+        return ' '.join(tr)
+
+
+    def wrap(self, lang):
+        """Returns a cached drop-in replacement for the transcription function of language lang"""
+        def transcribe(text, **options):
+            return self.transcribe(lang, text, **options)
+        function = get_transcriber(lang)
+        transcribe.__name__ = function.__name__
+        transcribe.__doc__ = function.__doc__
+        return transcribe